@@ -0,0 +1,196 @@
+"""Adaptive concurrency limit for requests to a rate limited server.
+
+The limit follows AIMD (additive increase, multiplicative decrease) as known from TCP congestion control:
+every successful response raises it by about one per full window of requests, an HTTP 429 cuts it by a
+constant factor. Bulk operations thus settle just below the parallelism the server tolerates. The learned
+limit can be stored in a file, so the next run starts where the last one left off.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+class _Pacer:
+    """The spacing of the requests sent within one `AdaptiveLimit.paced` block."""
+
+    __slots__ = ('interval', 'next_start')
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_start = 0.0
+
+# The pacer of the current context; worker threads started with a copy of the context share it
+_pacer = contextvars.ContextVar('adaptive_limit_pacer', default=None)
+# Whether the requests of the current context are background work, see AdaptiveLimit.background
+_background = contextvars.ContextVar('adaptive_limit_background', default=False)
+
+class AdaptiveLimit:
+    """A thread-safe semaphore whose size adapts to the responses of the server.
+
+    Attributes:
+        limit (float): The current number of requests allowed in flight. Only its integer part is used.
+        min_limit (int): The lower bound of `limit`.
+        max_limit (int): The upper bound of `limit`.
+        decrease (float): The factor `limit` is multiplied with on HTTP 429.
+        max_retries (int): How often a rate limited request is retried before its response is returned.
+        backoff (float): Seconds waited before the first retry. Doubled for every further retry.
+        path (str): The file the limit is persisted to. None if it is not persisted.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=64, decrease=0.5, max_retries=5, backoff=0.25, path=None):
+        """Initialize the limit, loading a persisted one from `path` if there is any.
+
+        Args:
+            initial (int, optional): The limit used if none was persisted. Defaults to 8.
+            min_limit (int, optional): The lower bound of the limit. Defaults to 1.
+            max_limit (int, optional): The upper bound of the limit. Defaults to 64.
+            decrease (float, optional): The factor the limit is multiplied with on HTTP 429. Defaults to 0.5.
+            max_retries (int, optional): How often a rate limited request is retried. Defaults to 5.
+            backoff (float, optional): Seconds waited before the first retry. Defaults to 0.25.
+            path (str, optional): The file the limit is persisted to. Defaults to None.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.path = path
+        self.limit = float(max(min_limit, min(max_limit, self.__load(initial))))
+        self._saved_limit = self.limit
+        self._in_flight = 0
+        self._epoch = 0
+        self._cond = threading.Condition()
+        self.throttled = 0
+
+    def __load(self, default):
+        if self.path is None or not os.path.exists(self.path):
+            return default
+        try:
+            with open(self.path) as f:
+                return float(json.load(f)['limit'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return default
+
+    def save(self):
+        """Writes the current limit to `path`, if it changed since it was loaded or last saved."""
+        if self.path is None or int(self.limit) == int(self._saved_limit):
+            return
+        with self._cond:
+            limit = self.limit
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'limit': limit}, f)
+        os.replace(tmp, self.path)  # never leave a half written file behind
+        self._saved_limit = limit
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """Blocks until a request may be sent. Within `paced`, also until the interval since the previous request passed.
+
+        Returns:
+            int: The epoch the request was admitted in. To be passed to `release`.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+            epoch = self._epoch
+            now = start = time.monotonic()
+            pacer = _pacer.get()
+            if pacer is not None:
+                start = max(now, pacer.next_start)
+                pacer.next_start = start + pacer.interval
+        if start > now:
+            time.sleep(start - now)
+        return epoch
+
+    def release(self, epoch, status, increase=True):
+        """Frees the slot of a finished request and adapts the limit to its response.
+
+        Args:
+            epoch (int): The epoch returned by `acquire`.
+            status (int): The HTTP status of the response, or None if the request failed without one.
+            increase (bool, optional): Whether a successful response may raise the limit. Defaults to True.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if status == 429:
+                self.throttled += 1
+                # Requests admitted before the last decrease were sent at the old limit; their 429s must not cut it again
+                if epoch == self._epoch:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._epoch += 1
+            elif increase and status is not None and status < 400:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Context manager holding a slot while a request is in flight.
+
+        The status of the response has to be reported by calling the yielded function, otherwise the request
+        counts as failed and leaves the limit unchanged.
+        """
+        status = None
+        increase = not _background.get()
+
+        def report(code):
+            nonlocal status
+            status = code
+
+        epoch = self.acquire()
+        try:
+            yield report
+        finally:
+            self.release(epoch, status, increase)
+
+    @contextlib.contextmanager
+    def paced(self, interval):
+        """Context manager that spreads the starts of the requests sent within it at least `interval` seconds apart.
+
+        Only requests sent from the current context (and threads started with a copy of it) are paced; other
+        requests sharing the limit, e.g. of a chart command during a slow reset, start without delay.
+        """
+        token = _pacer.set(_Pacer(interval) if interval else None)
+        try:
+            yield self
+        finally:
+            _pacer.reset(token)
+
+    @contextlib.contextmanager
+    def background(self):
+        """Context manager for requests of background work, e.g. prefetching.
+
+        They hold slots like any request and an HTTP 429 still cuts the limit, but their successes do not
+        raise it: a steady trickle of background requests would otherwise grow the limit beyond what a burst
+        of bulk requests was ever shown to get through.
+        """
+        token = _background.set(True)
+        try:
+            yield self
+        finally:
+            _background.reset(token)
+
+    def retry_delay(self, attempt, retry_after=None):
+        """Returns the seconds to wait before retrying a rate limited request.
+
+        Args:
+            attempt (int): The number of the retry, starting at 0.
+            retry_after (str, optional): The Retry-After header of the response. Defaults to None.
+        """
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass    # an HTTP date, fall back to exponential backoff
+        # Jitter keeps the throttled requests from all retrying at the same moment
+        return self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    def __repr__(self):
+        return f'<AdaptiveLimit limit={self.limit:.1f} in_flight={self._in_flight} throttled={self.throttled}>'
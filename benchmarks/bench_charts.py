@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import charts
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = [{'date': f'2023/10/{day:02d}', 'yes_count': day % 5, 'no_count': 3, 'maybe_count': day % 3, 'question_count': 2} for day in range(1, 8)]
+
+@pytest.mark.parametrize('renderer', list(charts.RENDERERS))
+def bench_render_chart(benchmark, renderer):
+    charts.render_chart(CHUNK, renderer)  # warm up imports and fonts
+    buf = benchmark(charts.render_chart, CHUNK, renderer)
+    assert buf.getvalue().startswith(b'\x89PNG')
+
+@pytest.mark.parametrize('renderer', list(charts.RENDERERS))
+def bench_render_chart_memory(benchmark, renderer):
+    """Peak resident memory of a fresh interpreter rendering 20 charts, including the imports of the renderer."""
+    code = (
+        'import resource, charts\n'
+        f'for _ in range(20): charts.render_chart({CHUNK!r}, {renderer!r})\n'
+        'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+    )
+    
+    def run():
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        return int(result.stdout)
+    
+    max_rss_kb = benchmark.pedantic(run, rounds=3)
+    benchmark.extra_info['max_rss_mb'] = round(max_rss_kb / 1024, 1)
+
+def bench_render_chart_cached(benchmark):
+    cache = charts.ChartCache()
+    rendered = charts.render_chart(CHUNK, 'pillow', cache)
+    buf = benchmark(charts.render_chart, CHUNK, 'pillow', cache)
+    assert buf.getvalue() == rendered.getvalue()
+    assert cache.misses == 1
+
+def bench_chart_cache_budget(benchmark):
+    """A year of distinct weekly charts through a cache too small for all of them: the budget is never exceeded."""
+    png_size = len(charts.render_chart(CHUNK, 'pillow').getvalue())
+    cache = charts.ChartCache(max_bytes=png_size * 10)
+    chunks = [[dict(vote, yes_count=week) for vote in CHUNK] for week in range(52)]
+    
+    def render_all():
+        for chunk in chunks:
+            charts.render_chart(chunk, 'pillow', cache)
+            assert cache.nbytes <= cache.max_bytes
+    
+    benchmark.pedantic(render_all, rounds=1)
+    benchmark.extra_info.update(cached_charts=len(cache), cached_bytes=cache.nbytes)
+    assert 0 < len(cache) < len(chunks)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import time
+
+from loop_monitor import LoopMonitor
+
+def _block_loop(seconds):
+    time.sleep(seconds)    # a blocking call made on the loop, like a request without asyncio.to_thread
+
+async def _monitored(monitor, block=None):
+    monitor.start()
+    await asyncio.sleep(0.05)
+    if block is not None:
+        _block_loop(block)
+    await asyncio.sleep(0.05)
+    monitor.stop()
+    return monitor
+
+def bench_stall_reported_with_stack(benchmark, caplog):
+    caplog.set_level(logging.WARNING, logger='loop_monitor')
+    monitor = benchmark.pedantic(lambda: asyncio.run(_monitored(LoopMonitor(interval=0.01, threshold=0.05, debug=True), block=0.3)), rounds=3)
+
+    assert monitor.stall_count == 1
+    stall, = monitor.stalls
+    assert 0.3 <= stall.duration < 0.5
+    assert monitor.max_lag == stall.duration
+    # The watchdog caught the loop thread inside the blocking call
+    assert '_block_loop' in stall.stack and 'time.sleep(seconds)' in stall.stack
+    record = caplog.records[-1]
+    assert record.getMessage().startswith('Event loop was blocked for ')
+    assert '_block_loop' in record.getMessage()
+    assert monitor.metrics()['stalls'] == 1
+
+def bench_stall_without_debug(benchmark):
+    monitor = benchmark.pedantic(lambda: asyncio.run(_monitored(LoopMonitor(interval=0.01, threshold=0.05), block=0.2)), rounds=3)
+    stall, = monitor.stalls
+    assert stall.duration >= 0.2
+    assert stall.stack == ''
+
+def bench_no_stall_below_threshold(benchmark):
+    monitor = benchmark.pedantic(lambda: asyncio.run(_monitored(LoopMonitor(interval=0.01, threshold=0.05, debug=True))), rounds=3)
+    assert monitor.samples >= 5
+    assert monitor.stall_count == 0 and not monitor.stalls
@@ -0,0 +1,109 @@
+import asyncio
+
+from poll_locks import PollLocks, ReadWriteLock
+
+def bench_readers_overlap(benchmark):
+    """Readers hold the lock at the same time."""
+    async def scenario():
+        lock = ReadWriteLock()
+        peak = 0
+
+        async def reader():
+            nonlocal peak
+            async with lock.read():
+                peak = max(peak, lock.readers)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(reader() for _ in range(20)))
+        return peak
+
+    assert benchmark(lambda: asyncio.run(scenario())) == 20
+
+def bench_writer_preferred(benchmark):
+    """A waiting writer goes before readers that arrive after it, and excludes the readers that came before."""
+    async def scenario():
+        lock = ReadWriteLock()
+        events = []
+
+        async def reader(name, hold=0.0):
+            async with lock.read():
+                events.append(f'{name} start')
+                await asyncio.sleep(hold)
+                events.append(f'{name} end')
+
+        async def writer():
+            async with lock.write():
+                events.append('writer start')
+                await asyncio.sleep(0.001)
+                events.append('writer end')
+
+        first = asyncio.ensure_future(reader('first', hold=0.005))
+        await asyncio.sleep(0)
+        pending_writer = asyncio.ensure_future(writer())
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(reader('late'))
+        await asyncio.gather(first, pending_writer, late)
+        return events
+
+    events = benchmark(lambda: asyncio.run(scenario()))
+    assert events == ['first start', 'first end', 'writer start', 'writer end', 'late start', 'late end']
+
+def bench_identical_writes_coalesced(benchmark):
+    """Identical writes requested while one is pending run once; other writes run one after another."""
+    async def scenario():
+        locks = PollLocks()
+        calls = []
+        running = 0
+        overlap = False
+
+        async def write(name):
+            nonlocal running, overlap
+            running += 1
+            overlap = overlap or running > 1
+            calls.append(name)
+            await asyncio.sleep(0.001)
+            running -= 1
+            return name
+
+        results = await asyncio.gather(
+            *(locks.write('poll', ('reset_poll', 'a'), write, 'a') for _ in range(5)),
+            locks.write('poll', ('reset_poll', 'b'), write, 'b'),
+            locks.write('poll', ('set_url', 'c'), write, 'c'),
+        )
+        return results, calls, overlap, locks.pending_writes()
+
+    results, calls, overlap, pending = benchmark(lambda: asyncio.run(scenario()))
+    assert sorted(calls) == ['a', 'b', 'c']
+    assert [result for result, _ in results] == ['a'] * 5 + ['b', 'c']
+    assert [shared for _, shared in results] == [False] + [True] * 4 + [False, False]
+    assert not overlap
+    assert pending == 0
+
+def bench_writes_serialized_across_set_url(benchmark, tmp_path):
+    """Locks keyed on the poll object keep serializing writes while one of them changes the poll's ID."""
+    import xoyondo_wrapper as xyw
+
+    client = xyw.open_poll(f'sqlite:///{tmp_path}/polls.db#first', print_messages=False, collect_messages=False)
+
+    async def scenario():
+        locks = PollLocks()
+        running = 0
+        overlap = False
+
+        async def write(url=None):
+            nonlocal running, overlap
+            running += 1
+            overlap = overlap or running > 1
+            if url is not None:
+                await asyncio.to_thread(client.set_url, url)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+        await asyncio.gather(
+            locks.write(client, ('set_url', 'second'), write, f'sqlite:///{tmp_path}/polls.db#second'),
+            *(locks.write(client, ('reset_poll', n), write) for n in range(5)),
+        )
+        return overlap
+
+    assert not benchmark.pedantic(lambda: asyncio.run(scenario()), rounds=5)
+    assert client.id == 'second'
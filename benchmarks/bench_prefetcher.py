@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+
+from adaptive_limit import AdaptiveLimit
+from fake_xoyondo import FakePoll, FakeXoyondoServer
+from prefetcher import Prefetcher, next_occurrence
+import xoyondo_wrapper as xyw
+
+TUESDAY, THURSDAY, AT = 1, 3, datetime.time(18, 0)
+
+def bench_next_window(benchmark):
+    prefetch = Prefetcher(schedule=[(TUESDAY, AT), (THURSDAY, AT)])
+    wednesday = datetime.datetime(2026, 10, 14, 12, 0)
+    thursday = datetime.datetime(2026, 10, 15, 18, 0)
+
+    assert benchmark(prefetch.next_window, wednesday) == thursday
+    # A window that opens right now is over for this week
+    assert prefetch.next_window(thursday) == datetime.datetime(2026, 10, 20, 18, 0)
+    assert prefetch.next_window(datetime.datetime(2026, 10, 13, 17, 59)) == datetime.datetime(2026, 10, 13, 18, 0)
+    assert next_occurrence(THURSDAY, AT, thursday - datetime.timedelta(minutes=1)) == thursday
+    assert Prefetcher().next_window(wednesday) is None
+
+def bench_trigger_window(benchmark):
+    prefetch = Prefetcher(window=60)
+    assert not prefetch.active and prefetch.remaining() == 0
+
+    benchmark(prefetch.trigger)
+    assert prefetch.active
+    assert 59 < prefetch.remaining() <= 60
+    # Triggering again does not shorten the open window
+    prefetch.trigger(5)
+    assert prefetch.remaining() > 59
+    prefetch.trigger(600)
+    assert prefetch.remaining() > 599
+
+def bench_refresh_while_window_open(benchmark):
+    """Refreshes right away and every interval while the window is open, then idles until stopped."""
+    async def scenario():
+        prefetch = Prefetcher(interval=0.02, window=0.1)
+        calls = 0
+
+        async def warm():
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise RuntimeError('poll unreachable')
+
+        prefetch.start(warm)
+        prefetch.start(warm)    # already running
+        assert prefetch.running and len(prefetch._tasks) == 1
+        await asyncio.sleep(0.05)
+        assert calls == 0    # no window open yet
+        prefetch.trigger()
+        await asyncio.sleep(0.2)
+        after_window = calls
+        await asyncio.sleep(0.1)
+        idle = calls == after_window
+        prefetch.stop()
+        await asyncio.sleep(0)
+        return prefetch, after_window, idle
+
+    prefetch, calls, idle = benchmark.pedantic(lambda: asyncio.run(scenario()), rounds=3)
+    # 0.1 s window refreshed every 0.02 s
+    assert 3 <= calls <= 7
+    assert idle
+    assert (prefetch.runs, prefetch.failures) == (calls - 1, 1)
+    assert prefetch.last_error is None
+    assert not prefetch.running
+
+def bench_trigger_before_start(benchmark):
+    """A window opened before the loop runs, e.g. by a reset on start, is refreshed once the prefetcher starts."""
+    async def scenario(prefetch):
+        refreshed = asyncio.Event()
+
+        async def warm():
+            refreshed.set()
+
+        prefetch.start(warm)
+        await asyncio.wait_for(refreshed.wait(), 1)
+        prefetch.stop()
+        return prefetch.runs
+
+    def setup():
+        prefetch = Prefetcher(interval=10, window=10)
+        prefetch.trigger()
+        return (prefetch,), {}
+
+    assert benchmark.pedantic(lambda prefetch: asyncio.run(scenario(prefetch)), setup=setup, rounds=3) == 1
+
+def bench_prefetch_keeps_limit(benchmark):
+    """The requests of a prefetch hold slots of the limit but do not raise it."""
+    with FakeXoyondoServer(FakePoll.generate(31, 50)) as server:
+        limit = AdaptiveLimit(initial=4)
+        client = xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, collect_messages=False, base_url=server.base_url, concurrency=limit)
+        count, _ = benchmark.pedantic(client.prefetch, setup=server.reset_counts, rounds=5)
+        assert count == 0    # no chart cache
+        assert sum(server.request_counts.values()) == 1
+        assert limit.limit == 4
+        # The same read for a command counts
+        client.get_snapshot(max_age=0)
+        assert limit.limit > 4
+
+def bench_background_requests_cut_limit(benchmark):
+    """HTTP 429 of a background request still cuts the limit, its successes leave it unchanged."""
+    def requests():
+        limit = AdaptiveLimit(initial=8)
+        with limit.background():
+            for _ in range(20):
+                with limit.slot() as report:
+                    report(200)
+            unchanged = limit.limit
+            with limit.slot() as report:
+                report(429)
+        return unchanged, limit.limit
+
+    assert benchmark(requests) == (8, 4)
@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import json
+
+from reset_scheduler import ResetScheduler
+
+SUNDAY, AT = 6, datetime.time(3, 0)
+WEDNESDAY_NOON = datetime.datetime(2026, 10, 14, 12, 0)
+LAST_SUNDAY = datetime.datetime(2026, 10, 11, 3, 0)
+NEXT_SUNDAY = datetime.datetime(2026, 10, 18, 3, 0)
+
+class FakeClock:
+    """A clock that only moves when the scheduler sleeps, so a week passes in an instant."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += datetime.timedelta(seconds=seconds)
+        await asyncio.sleep(0)
+
+def new_scheduler(path, clock, last_run=None, plan=None):
+    """A scheduler for Sunday 03:00, resuming the given state if there is any."""
+    if last_run is not None:
+        with open(path, 'w') as f:
+            json.dump({'last_run': last_run.isoformat(), 'plan': plan}, f)
+    return ResetScheduler(SUNDAY, AT, path=str(path), clock=clock, sleep=clock.sleep)
+
+def run_until_reset(scheduler, clock, failures=0, planned='planned'):
+    """Runs the scheduler until a reset succeeded, the first `failures` attempts fail.
+
+    Returns:
+        tuple: The (run, time) of each make_plan call, the (run, plan, time) of each execute call and the (run, attempt, last_error) of each on_error call.
+    """
+    plans, executions, errors = [], [], []
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def make_plan(run):
+            plans.append((run, clock()))
+            if planned is None:
+                raise RuntimeError('poll unreachable')
+            return planned
+
+        async def execute(run, plan):
+            executions.append((run, plan, clock()))
+            if len(executions) <= failures:
+                raise RuntimeError('HTTP 503')
+            done.set()
+
+        async def on_error(run, error, attempt):
+            errors.append((run, attempt, scheduler.last_error))
+
+        scheduler.start(make_plan, execute, on_error)
+        await done.wait()
+        scheduler.stop()
+
+    asyncio.run(scenario())
+    return plans, executions, errors
+
+def bench_next_run(benchmark, tmp_path):
+    def scenario():
+        clock = FakeClock(WEDNESDAY_NOON)
+        first_start = new_scheduler(tmp_path / 'first.json', clock)
+        due = [first_start.next_run()]
+        clock.now = NEXT_SUNDAY
+        due.append(first_start.next_run())
+        # After a restart a week later, the run missed in the meantime is due at once
+        clock.now = NEXT_SUNDAY + datetime.timedelta(days=7, hours=9)
+        due.append(new_scheduler(tmp_path / 'first.json', clock).next_run())
+        return first_start.last_run, due
+
+    last_run, due = benchmark(scenario)
+    # Nothing is caught up when the schedule is used for the first time
+    assert last_run == LAST_SUNDAY
+    assert due == [NEXT_SUNDAY, NEXT_SUNDAY, NEXT_SUNDAY + datetime.timedelta(days=7)]
+
+def bench_catch_up_missed_reset(benchmark, tmp_path):
+    path = tmp_path / 'auto_reset.json'
+
+    def scenario():
+        clock = FakeClock(WEDNESDAY_NOON)
+        # Offline for three weeks
+        scheduler = new_scheduler(path, clock, last_run=LAST_SUNDAY - datetime.timedelta(days=21))
+        return run_until_reset(scheduler, clock), scheduler
+
+    (plans, executions, errors), scheduler = benchmark.pedantic(scenario, rounds=5)
+    # Only the latest missed reset is caught up, and right away
+    assert plans == [(LAST_SUNDAY, WEDNESDAY_NOON)]
+    assert executions == [(LAST_SUNDAY, 'planned', WEDNESDAY_NOON)]
+    assert errors == []
+    assert scheduler.last_run == LAST_SUNDAY
+    with open(path) as f:
+        assert json.load(f) == {'last_run': LAST_SUNDAY.isoformat(), 'plan': None}
+
+def bench_reset_on_schedule(benchmark, tmp_path):
+    def scenario():
+        clock = FakeClock(WEDNESDAY_NOON)
+        return run_until_reset(new_scheduler(tmp_path / 'auto_reset.json', clock, last_run=LAST_SUNDAY), clock)
+
+    plans, executions, errors = benchmark.pedantic(scenario, rounds=5)
+    assert plans == [(NEXT_SUNDAY, NEXT_SUNDAY - datetime.timedelta(hours=1))]
+    assert executions == [(NEXT_SUNDAY, 'planned', NEXT_SUNDAY)]
+    assert errors == []
+
+def bench_retry_failed_reset(benchmark, tmp_path):
+    path = tmp_path / 'auto_reset.json'
+
+    def scenario():
+        clock = FakeClock(NEXT_SUNDAY - datetime.timedelta(minutes=5))
+        scheduler = new_scheduler(path, clock, last_run=LAST_SUNDAY)
+        return run_until_reset(scheduler, clock, failures=2), scheduler
+
+    (plans, executions, errors), scheduler = benchmark.pedantic(scenario, rounds=5)
+    retry = datetime.timedelta(minutes=15)
+    # Planned once, retried with the same plan
+    assert len(plans) == 1
+    assert executions == [(NEXT_SUNDAY, 'planned', NEXT_SUNDAY + n * retry) for n in range(3)]
+    assert errors == [(NEXT_SUNDAY, 1, 'HTTP 503'), (NEXT_SUNDAY, 2, 'HTTP 503')]
+    assert scheduler.last_run == NEXT_SUNDAY
+    assert scheduler.last_error is None
+    with open(path) as f:
+        assert json.load(f)['last_run'] == NEXT_SUNDAY.isoformat()
+
+def bench_stale_plan_replaced(benchmark, tmp_path):
+    """A plan persisted for an earlier run is made anew, one for the coming run is reused after a restart."""
+    def scenario(plan_run):
+        clock = FakeClock(NEXT_SUNDAY - datetime.timedelta(minutes=30))
+        plan = {'run': plan_run.isoformat(), 'plan': 'persisted'}
+        return run_until_reset(new_scheduler(tmp_path / 'auto_reset.json', clock, last_run=LAST_SUNDAY, plan=plan), clock)
+
+    plans, executions, _ = benchmark.pedantic(scenario, args=(LAST_SUNDAY,), rounds=5)
+    assert [run for run, _ in plans] == [NEXT_SUNDAY]
+    assert executions == [(NEXT_SUNDAY, 'planned', NEXT_SUNDAY)]
+
+    plans, executions, _ = scenario(NEXT_SUNDAY)
+    assert plans == []
+    assert executions == [(NEXT_SUNDAY, 'persisted', NEXT_SUNDAY)]
+
+def bench_failed_planning_resets_anyway(benchmark, tmp_path):
+    def scenario():
+        clock = FakeClock(WEDNESDAY_NOON)
+        return run_until_reset(new_scheduler(tmp_path / 'auto_reset.json', clock, last_run=LAST_SUNDAY), clock, planned=None)
+
+    plans, executions, errors = benchmark.pedantic(scenario, rounds=5)
+    assert len(plans) == 1
+    assert executions == [(NEXT_SUNDAY, None, NEXT_SUNDAY)]
+    assert errors == []
+
+def bench_corrupt_state_starts_anew(benchmark, tmp_path, caplog):
+    """A truncated or invalid state file is logged and replaced as if the schedule were new."""
+    path = tmp_path / 'auto_reset.json'
+    contents = ['{"last_run": "2026-10-', '{"last_run": "last sunday"}', '[]', '']
+
+    def scenario(content):
+        path.write_text(content)
+        return new_scheduler(path, FakeClock(WEDNESDAY_NOON))
+
+    scheduler = benchmark.pedantic(scenario, args=(contents[0],), rounds=5)
+    for content in contents[1:]:
+        scheduler = scenario(content)
+        assert (scheduler.last_run, scheduler.plan) == (LAST_SUNDAY, None)
+    assert scheduler.last_run == LAST_SUNDAY
+    with open(path) as f:
+        assert json.load(f) == {'last_run': LAST_SUNDAY.isoformat(), 'plan': None}
+    assert not (tmp_path / 'auto_reset.json.tmp').exists()
+    assert sum('Could not load the state of the automatic reset' in record.getMessage() for record in caplog.records) >= len(contents)
@@ -0,0 +1,43 @@
+import asyncio
+
+import simulate
+
+def bench_simulated_load(benchmark):
+    result = benchmark.pedantic(simulate.run, kwargs={'invocations': 60, 'concurrency': 20, 'poll_size': (7, 20), 'discord_latency': 0.01, 'xoyondo_latency': 0.005}, rounds=1)
+    benchmark.extra_info.update(throughput=result['throughput'], loop_lag_p99=result['loop_lag']['p99'],
+                                **{f'{name}_p99': stats['p99'] for name, stats in result['latency'].items()})
+    assert result['errors'] == []
+
+def bench_simulated_load_slash(benchmark):
+    result = benchmark.pedantic(simulate.run, kwargs={'invocations': 60, 'concurrency': 20, 'slash': True, 'poll_size': (7, 20), 'discord_latency': 0.01, 'xoyondo_latency': 0.005}, rounds=1)
+    benchmark.extra_info.update(throughput=result['throughput'], loop_lag_p99=result['loop_lag']['p99'])
+    assert result['errors'] == []
+
+def bench_soak_memory(benchmark):
+    """2500 commands on one bot: after warm-up the RSS stays flat, the caches stay within their budgets."""
+    result = benchmark.pedantic(simulate.soak, kwargs={'rounds': 10, 'invocations': 250, 'poll_size': (7, 20)}, rounds=1)
+    rss = result['rss']
+    growth = rss[-1] - rss[2]    # the first rounds import modules and fill the caches
+    benchmark.extra_info.update(commands=result['commands'], rss_mb=[round(value / 2**20, 1) for value in rss], growth_mb=round(growth / 2**20, 2))
+    assert result['errors'] == []
+    assert growth < 2**20
+    usage = result['cache_usage']
+    assert usage['snapshot'] <= usage['snapshot_budget'] and usage['charts_bytes'] <= usage['charts_budget']
+
+def bench_progress_reporter_exit(benchmark, tmp_path):
+    """Leaving the reporter waits for its task, so an edit still in flight cannot overwrite the final response."""
+    bot = simulate.load_bot(str(tmp_path))
+
+    async def scenario():
+        interaction = simulate.FakeInteraction(simulate.FakeChannel(latency=0.02))
+        async with bot.ProgressReporter(interaction, interval=0) as progress:
+            progress.update('user_delete', 1, 2)
+            await asyncio.sleep(0.005)    # the edit is on its way
+        stopped = progress.task.done()
+        interaction.sent.append('done')
+        await asyncio.sleep(0.05)
+        return stopped, interaction.sent
+
+    stopped, sent = benchmark.pedantic(lambda: asyncio.run(scenario()), rounds=5)
+    assert stopped
+    assert sent == ['done']
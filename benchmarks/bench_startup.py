@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['matplotlib', 'numpy', 'PIL', 'bs4', 'requests', 'fuzzywuzzy']
+
+def _import_in_fresh_interpreter(module, **environ):
+    """Imports `module` in a new interpreter and returns the heavy modules that got loaded along with it."""
+    return _run_in_fresh_interpreter(f'import {module}', **environ)
+
+def _run_in_fresh_interpreter(statements, **environ):
+    """Runs `statements` in a new interpreter and returns the heavy modules that got loaded by them."""
+    code = f'import sys; {statements}; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    env = dict(os.environ, DISCORD_TOKEN='token', XOYONDO_URL='https://xoyondo.com/dp/BenchPoll/secret', **environ)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return [m for m in result.stdout.strip().split(',') if m]
+
+def bench_import_xoyondo_wrapper(benchmark):
+    loaded = benchmark.pedantic(_import_in_fresh_interpreter, args=('xoyondo_wrapper',), rounds=5)
+    assert loaded == []
+
+def bench_import_bot(benchmark, tmp_path):
+    archive = tmp_path / 'vote_archive.db'
+    loaded = benchmark.pedantic(_import_in_fresh_interpreter, args=('bot',), kwargs={'VOTE_ARCHIVE': str(archive)}, rounds=5)
+    assert loaded == []
+    # The archive is opened once the bot is online, not on import
+    assert not archive.exists()
+
+def bench_warm_up_renderer(benchmark):
+    """Warming up loads the modules of the configured renderer only."""
+    loaded = benchmark.pedantic(_run_in_fresh_interpreter, args=('import charts; charts.warm_up()',), rounds=3)
+    assert loaded == ['PIL']
+    assert _run_in_fresh_interpreter('import charts; charts.warm_up("matplotlib")') == ['matplotlib', 'numpy', 'PIL']
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+
+import tracing
+from tracing import Tracer
+
+def _command(tracer):
+    """Traces a command that awaits a request in a worker thread and renders two charts."""
+    @tracer.traced('!tf_chart')
+    async def command():
+        await asyncio.to_thread(request)
+        for _ in range(2):
+            with tracer.span('chart.render', renderer='pil'):
+                pass
+
+    @tracer.traced('http.get')
+    def request():
+        return threading.get_ident()
+
+    asyncio.run(command())
+    return tracer.last()
+
+def _set_times(trace, times_ms):
+    """Gives the spans of a trace fixed (start, end) times in milliseconds, in the order of `walk`."""
+    for span, (start, end) in zip(trace.walk(), times_ms):
+        span.start, span.end = int(start * 1e6), int(end * 1e6)
+
+def bench_trace_summary(benchmark):
+    tracer = Tracer(enabled=True)
+    trace = _command(tracer)
+    assert [span.name for span in trace.walk()] == ['!tf_chart', 'http.get', 'chart.render', 'chart.render']
+    _set_times(trace, [(0, 100), (0, 30), (30, 60), (60, 100)])
+
+    assert benchmark(tracer.summary) == [
+        '!tf_chart: 100.0 ms',
+        'chart.render: 2x, 70.0 ms total, 40.0 ms max',
+        'http.get: 1x, 30.0 ms total, 30.0 ms max',
+    ]
+    assert Tracer(enabled=True).summary() == []
+
+def bench_export_chrome_trace(benchmark, tmp_path):
+    tracer = Tracer(enabled=True)
+    trace = _command(tracer)
+    _set_times(trace, [(1000, 1100), (1000, 1030), (1030, 1060), (1060, 1100)])
+    path = tmp_path / 'trace.json'
+
+    assert benchmark(tracer.export_chrome_trace, str(path)) == 4
+    with open(path) as f:
+        exported = json.load(f)
+    assert exported['displayTimeUnit'] == 'ms'
+    events = exported['traceEvents']
+    assert {tuple(sorted(event)) for event in events} == {('args', 'dur', 'name', 'ph', 'pid', 'tid', 'ts')}
+    assert all(event['ph'] == 'X' for event in events)
+    # Complete events in microseconds
+    assert [(event['name'], event['ts'], event['dur']) for event in events] == [
+        ('!tf_chart', 1_000_000, 100_000), ('http.get', 1_000_000, 30_000),
+        ('chart.render', 1_030_000, 30_000), ('chart.render', 1_060_000, 40_000),
+    ]
+    assert events[2]['args'] == {'renderer': 'pil'}
+    # The request ran in a worker thread, still nested in the command
+    assert events[1]['tid'] != events[0]['tid'] == events[2]['tid']
+
+def bench_prefetch_not_last_trace(benchmark, tmp_path):
+    """Prefetching in the background leaves the trace of the last command in place."""
+    import xoyondo_wrapper as xyw
+
+    client = xyw.open_poll(f'sqlite:///{tmp_path}/polls.db#bench', print_messages=False, collect_messages=False)
+    client.add_dates('2024/01/01:2024/01/07')
+    tracer = tracing.tracer
+    enabled = tracer.enabled
+    tracer.enabled = True
+    try:
+        tracer.traces.clear()
+        tracer.background_traces.clear()
+        with tracer.span('!tf_best'):
+            client.get_best_dates()
+        benchmark(client.prefetch)
+
+        assert tracer.last().name == '!tf_best'
+        assert len(tracer.traces) == 1
+        assert {trace.name for trace in tracer.background_traces} == {'PollWrapper.prefetch'}
+        # Exported along with the commands
+        assert tracer.export_chrome_trace(str(tmp_path / 'trace.json')) == sum(
+            len(list(trace.walk())) for trace in [*tracer.traces, *tracer.background_traces])
+    finally:
+        tracer.enabled = enabled
+        tracer.traces.clear()
+        tracer.background_traces.clear()
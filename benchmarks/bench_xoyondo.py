@@ -0,0 +1,544 @@
+import asyncio
+import itertools
+import pathlib
+import sys
+import threading
+import time
+
+from adaptive_limit import AdaptiveLimit
+from conftest import fill_local_poll, rounds_for
+from fake_xoyondo import FakePoll, FakeXoyondoServer
+from prefetcher import Prefetcher
+from vote_archive import VoteArchive
+import xoyondo as xy
+import xoyondo_wrapper as xyw
+
+# A poll page whose user rows are not all written like the rendered pages of FakePoll
+POLL_PAGE = pathlib.Path(__file__).parent / 'fixtures' / 'poll_page.html'
+
+def _restore(server, poll_size):
+    """Returns a pedantic setup function that puts a fresh poll on the server before every round."""
+    def setup():
+        server.poll = FakePoll.generate(*poll_size)
+    return setup
+
+def bench_get_votes_by_date(benchmark, client, poll_size):
+    votes, _ = benchmark.pedantic(client.get_votes_by_date, setup=client.invalidate_snapshot, rounds=rounds_for(poll_size))
+    assert len(votes) == poll_size[0]
+
+def bench_get_votes_by_date_range(benchmark, client, server, poll_size):
+    first, last = server.poll.dates[0][0], server.poll.dates[min(6, poll_size[0] - 1)][0]
+    def setup():
+        client.invalidate_snapshot()
+        return (f'{first}:{last}',), {}
+    votes, _ = benchmark.pedantic(client.get_votes_by_date, setup=setup, rounds=rounds_for(poll_size))
+    assert [vote['date'] for vote in votes] == [date for date, _ in server.poll.dates[:len(votes)]]
+
+def bench_create_plot(benchmark, client, poll_size):
+    plots, _ = benchmark.pedantic(client.create_plot, rounds=rounds_for(poll_size))
+    assert len(plots) == -(-poll_size[0] // 7)
+
+def bench_delete_dates(benchmark, client, server, poll_size):
+    benchmark.pedantic(client.delete_dates, setup=_restore(server, poll_size), rounds=rounds_for(poll_size))
+    assert len(server.poll.dates) == 1
+
+def bench_delete_all_users(benchmark, client, server, poll_size):
+    benchmark.pedantic(client.delete_users, setup=_restore(server, poll_size), rounds=rounds_for(poll_size))
+    assert server.poll.users == []
+
+def bench_find_user_ids_poll_page(benchmark):
+    from bs4 import BeautifulSoup
+    from poll_snapshot import PollSnapshot
+    
+    page = POLL_PAGE.read_text(encoding='utf-8')
+    user_ids = benchmark(xy.find_user_ids, page)
+    assert user_ids == list(PollSnapshot.from_html(BeautifulSoup(page, 'html.parser')).user_ids)
+    assert len(user_ids) == 3
+
+def bench_delete_all_users_poll_page(benchmark):
+    """Clearing the poll deletes every user of the page, also those the fast search misses."""
+    page = POLL_PAGE.read_text(encoding='utf-8')
+    with FakeXoyondoServer(FakePoll(), recorded_html=page) as server:
+        client = xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, collect_messages=False, base_url=server.base_url)
+        benchmark.pedantic(client.delete_users, setup=server.reset_counts, rounds=5)
+        assert server.request_counts[('POST', '/pc/poll-change-poll-ajax')] == len(xy.find_user_ids(page))
+
+def bench_delete_named_users(benchmark, client, server, poll_size):
+    def setup():
+        server.poll = FakePoll.generate(*poll_size)
+        return (",".join(name for _, name, _ in server.poll.users[::2]),), {}
+    benchmark.pedantic(client.delete_users, setup=setup, rounds=rounds_for(poll_size))
+    assert len(server.poll.users) == poll_size[1] // 2
+
+def bench_reset_poll(benchmark, client, server, poll_size):
+    # Keep half of the dates and move the poll forward by the other half
+    dates = [date for date, _ in FakePoll.generate(poll_size[0] + poll_size[0] // 2, 0).dates[poll_size[0] // 2:]]
+    benchmark.pedantic(client.reset_poll, args=(",".join(dates),), setup=_restore(server, poll_size), rounds=rounds_for(poll_size))
+    assert [date for date, _ in server.poll.dates] == dates
+    assert server.poll.users == []
+
+def bench_reset_poll_with_latency(benchmark):
+    with FakeXoyondoServer(FakePoll.generate(7, 20), latency=0.05) as server:
+        client = xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, collect_messages=False, base_url=server.base_url)
+        benchmark.pedantic(client.reset_poll, args=('2023/10/02:2023/10/08',), setup=_restore(server, (7, 20)), rounds=5)
+        assert server.poll.users == []
+
+def bench_delete_users_rate_limited(benchmark):
+    """Deleting users against a server that answers HTTP 429 above 4 parallel requests still deletes every user."""
+    with FakeXoyondoServer(FakePoll.generate(7, 50), max_concurrent=4, latency=0.005) as server:
+        client = xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, base_url=server.base_url)
+        
+        def setup():
+            server.poll = FakePoll.generate(7, 50)
+            server.reset_counts()
+            # Starts above what the server tolerates, so every round runs into its rate limit
+            client.concurrency = AdaptiveLimit(initial=32, backoff=0.01)
+        
+        messages = benchmark.pedantic(client.delete_users, setup=setup, rounds=5)
+        benchmark.extra_info['rejected_requests'] = server.rejected
+        assert len(messages) > 0
+        assert server.poll.users == []
+        assert server.rejected > 0
+        assert client.concurrency.limit < 32
+
+def bench_concurrent_reads(benchmark, client, server, poll_size):
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def read_concurrently():
+        with ThreadPoolExecutor(8) as pool:
+            return list(pool.map(lambda _: client.get_votes_by_date(), range(8)))
+    
+    def setup():
+        client.invalidate_snapshot()
+        server.reset_counts()
+    results = benchmark.pedantic(read_concurrently, setup=setup, rounds=rounds_for(poll_size))
+    benchmark.extra_info['page_requests'] = server.request_counts.get(('GET', f'/dp/{server.poll.id}/{server.poll.password}'), 0)
+    assert all(votes == results[0][0] for votes, _ in results)
+
+def bench_concurrent_async_reads(benchmark, client, server, poll_size):
+    """Coroutines that read the poll at the same time share one request."""
+    import asyncio
+    
+    async def read_concurrently():
+        return await asyncio.gather(*(client.get_snapshot_async() for _ in range(8)))
+    
+    def setup():
+        client.invalidate_snapshot()
+        server.reset_counts()
+    results = benchmark.pedantic(lambda: asyncio.run(read_concurrently()), setup=setup, rounds=rounds_for(poll_size))
+    assert server.request_counts == {('GET', f'/dp/{server.poll.id}/{server.poll.password}'): 1}
+    assert all(snapshot is results[0][0] for snapshot, _ in results)
+
+def bench_user_stats(benchmark, client, poll_size):
+    import poll_stats
+    
+    snapshot, _ = client.get_snapshot()
+    stats = benchmark(poll_stats.compute_user_stats, snapshot)
+    assert len(stats.rates) == poll_size[1]
+    assert len(stats.best_dates) == poll_size[0]
+
+def _with_changed_votes(snapshot, n_changes, seed=0):
+    """Returns a copy of `snapshot` with `n_changes` random vote cells changed."""
+    import random
+    from poll_snapshot import PollSnapshot
+    
+    rng = random.Random(seed)
+    votes = [bytearray(row) for row in snapshot.votes]
+    for _ in range(n_changes):
+        row = votes[rng.randrange(len(votes))]
+        date = rng.randrange(len(row))
+        row[date] = (row[date] + 1) % 4
+    return PollSnapshot(snapshot.dates, snapshot.date_ids, snapshot.users, snapshot.user_ids, votes)
+
+def bench_best_dates_full(benchmark, client, poll_size):
+    import recommender
+    
+    snapshot, _ = client.get_snapshot()
+    
+    def score():
+        engine = recommender.DateRecommender(quorum=1)
+        engine.update(snapshot)
+        return engine.ranking()
+    
+    assert len(benchmark(score)) == poll_size[0]
+
+def bench_best_dates_incremental(benchmark, client, poll_size):
+    import recommender
+    
+    snapshot, _ = client.get_snapshot()
+    changed = _with_changed_votes(snapshot, 3)
+    engine = recommender.DateRecommender(quorum=1)
+    
+    def rescore():
+        engine.update(snapshot)
+        engine.update(changed)
+        return engine.ranking()
+    
+    ranking = benchmark(rescore)
+    expected = recommender.DateRecommender(quorum=1)
+    expected.update(changed)
+    assert [(rec.date, rec.score) for rec in ranking] == [(rec.date, rec.score) for rec in expected.ranking()]
+    assert engine.full_updates == 1
+
+def bench_diff_snapshots(benchmark, client, poll_size):
+    import poll_diff
+    
+    snapshot, _ = client.get_snapshot()
+    changed = _with_changed_votes(snapshot, 3)
+    diff = benchmark(poll_diff.diff_snapshots, snapshot, changed)
+    assert 1 <= len(diff.changed_votes) <= 3
+    assert not diff.structure_changed
+
+def bench_diff_unchanged_snapshots(benchmark, client, poll_size):
+    import poll_diff
+    from poll_snapshot import PollSnapshot
+    
+    snapshot, _ = client.get_snapshot()
+    
+    def diff_copy():
+        # A fresh copy every round, so the digest is not cached
+        copy = PollSnapshot(snapshot.dates, snapshot.date_ids, snapshot.users, snapshot.user_ids, snapshot.votes)
+        return poll_diff.diff_snapshots(snapshot, copy)
+    
+    assert not benchmark(diff_copy)
+
+def _with_changed_users(snapshot):
+    """Returns a copy of `snapshot` without its first user and with a new one, who has no Xoyondo ID yet."""
+    from poll_snapshot import PollSnapshot
+    
+    new_row = bytearray(date % 4 for date in range(len(snapshot.dates)))
+    return PollSnapshot(snapshot.dates, snapshot.date_ids, snapshot.users[1:] + ('Neu',), snapshot.user_ids[1:] + (None,), list(snapshot.votes[1:]) + [new_row])
+
+def _with_changed_dates(snapshot):
+    """Returns a copy of `snapshot` without its first date and with a new last date, on which nobody voted yet."""
+    from poll_snapshot import PollSnapshot, VOTE_CODES
+    
+    return PollSnapshot(snapshot.dates[1:] + ('2030/01/01',), snapshot.date_ids[1:] + (None,), snapshot.users, snapshot.user_ids,
+                        [row[1:] + bytes([VOTE_CODES['question']]) for row in snapshot.votes])
+
+def _scores(engine):
+    return [(rec.date, rec.score, rec.counts) for rec in engine.ranking()]
+
+def bench_best_dates_concurrent_updates(benchmark, client, poll_size):
+    """Commands updating the shared recommender at the same time leave it with the counts of a full rescore."""
+    import recommender
+    
+    snapshot, _ = client.get_snapshot()
+    changed = _with_changed_users(_with_changed_votes(snapshot, 1))
+    expected = recommender.DateRecommender(quorum=1)
+    expected.update(changed)
+    
+    def concurrent_updates(trials=20, threads=4):
+        wrong = 0
+        for _ in range(trials):
+            engine = recommender.DateRecommender(quorum=1)
+            engine.update(snapshot)
+            barrier = threading.Barrier(threads)
+            
+            def update():
+                barrier.wait()
+                engine.recommend(changed)
+            
+            workers = [threading.Thread(target=update) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            wrong += _scores(engine) != _scores(expected)
+        return wrong
+    
+    # Switch threads often, so the updates interleave like on a busy bot
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        assert benchmark.pedantic(concurrent_updates, rounds=rounds_for(poll_size)) == 0
+    finally:
+        sys.setswitchinterval(interval)
+
+def bench_diff_changed_structure(benchmark, client, poll_size):
+    import poll_diff
+    
+    snapshot, _ = client.get_snapshot()
+    changed = _with_changed_dates(_with_changed_users(snapshot))
+    diff = benchmark(poll_diff.diff_snapshots, snapshot, changed)
+    assert diff.added_dates == ['2030/01/01']
+    assert diff.removed_dates == [snapshot.dates[0]]
+    assert diff.added_users == ['Neu']
+    assert diff.removed_users == [snapshot.users[0]]
+    # Votes on the dates in both snapshots are unchanged
+    assert diff.changed_votes == []
+
+def bench_best_dates_changed_users(benchmark, client, poll_size):
+    """Added and removed users are applied to the kept vote counts, with the same result as scoring everything again."""
+    import recommender
+    
+    snapshot, _ = client.get_snapshot()
+    changed = _with_changed_users(snapshot)
+    
+    def rescore():
+        engine = recommender.DateRecommender(quorum=1)
+        engine.update(snapshot)
+        return engine.update(changed), engine
+    
+    incremental, engine = benchmark(rescore)
+    expected = recommender.DateRecommender(quorum=1)
+    expected.update(changed)
+    assert incremental
+    assert (engine.full_updates, engine.incremental_updates) == (1, 1)
+    assert _scores(engine) == _scores(expected)
+
+def bench_best_dates_changed_dates(benchmark, client, poll_size):
+    """Added and removed dates change the columns of the vote counts, so they are scored again."""
+    import recommender
+    
+    snapshot, _ = client.get_snapshot()
+    changed = _with_changed_dates(snapshot)
+    
+    def rescore():
+        engine = recommender.DateRecommender(quorum=1)
+        engine.update(snapshot)
+        return engine.update(changed), engine
+    
+    incremental, engine = benchmark(rescore)
+    expected = recommender.DateRecommender(quorum=1)
+    expected.update(changed)
+    assert not incremental
+    assert (engine.full_updates, engine.incremental_updates) == (2, 0)
+    assert _scores(engine) == _scores(expected)
+    assert '2030/01/01' in [date for date, _, _ in _scores(engine)]
+
+def bench_time_to_first_chart(benchmark, client, poll_size):
+    def first_chart():
+        plots, _ = client.iter_plots()
+        return next(plots)
+    
+    assert benchmark.pedantic(first_chart, rounds=rounds_for(poll_size)).getvalue().startswith(b'\x89PNG')
+
+def bench_stream_plots(benchmark, client, poll_size):
+    import asyncio
+    
+    async def consume():
+        plots, _ = await client.stream_plots()
+        count = 0
+        async for chart in plots:
+            count += 1
+        return count
+    
+    assert benchmark.pedantic(lambda: asyncio.run(consume()), rounds=rounds_for(poll_size)) == -(-poll_size[0] // 7)
+
+def bench_add_dates_adaptive_concurrency(benchmark, tmp_path):
+    with FakeXoyondoServer(FakePoll.generate(1, 0), max_concurrent=4, latency=0.01) as server:
+        limit = AdaptiveLimit(initial=32, backoff=0.01, path=str(tmp_path / 'concurrency.json'))
+        client = xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, collect_messages=False, base_url=server.base_url, concurrency=limit)
+        benchmark.pedantic(client.add_dates, args=('2023/10/02:2023/12/31',), setup=_restore(server, (1, 0)), rounds=3)
+        benchmark.extra_info['rejected_requests'] = server.rejected
+        benchmark.extra_info['learned_limit'] = limit.limit
+        assert len(server.poll.dates) == 1 + 91
+        assert AdaptiveLimit(path=limit.path).limit <= 8
+
+def bench_reads_during_paced_reset(benchmark):
+    """The pacing of a reset spread over a window does not hold up the reads of other commands."""
+    with FakeXoyondoServer(FakePoll.generate(7, 5)) as server:
+        client = xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, collect_messages=False, base_url=server.base_url)
+
+        def read_during_reset():
+            # 7 dates to add, 7 to delete and 5 users: 19 requests, started 0.1 s apart
+            reset = threading.Thread(target=client.reset_poll, args=('2023/10/09:2023/10/15',), kwargs={'window': 1.9})
+            reset.start()
+            read_times = []
+            while reset.is_alive():
+                start = time.perf_counter()
+                client.get_snapshot(max_age=0)
+                read_times.append(time.perf_counter() - start)
+            reset.join()
+            return read_times
+
+        read_times = benchmark.pedantic(read_during_reset, setup=_restore(server, (7, 5)), rounds=1)
+        benchmark.extra_info['slowest_read'] = max(read_times)
+        assert len(read_times) > 5
+        assert max(read_times) < 0.1
+        assert [date for date, _ in server.poll.dates] == [f'2023/10/{day:02}' for day in range(9, 16)]
+
+def _admin_workflow(client):
+    # set_url, chart, best, reset_poll, chart: the commands admins usually chain
+    client.set_url(client.url)
+    client.create_plot()
+    client.get_best_dates()
+    client.reset_poll('2023/10/02:2023/10/08')
+    client.create_plot()
+
+def bench_admin_workflow_batched(benchmark, client, server, poll_size):
+    def batched():
+        with client.batch():
+            _admin_workflow(client)
+    
+    server.reset_counts()
+    _admin_workflow(client)
+    sequential_gets = sum(count for (method, _), count in server.request_counts.items() if method == 'GET')
+    
+    def setup():
+        server.poll = FakePoll.generate(*poll_size)
+        server.reset_counts()
+    benchmark.pedantic(batched, setup=setup, rounds=rounds_for(poll_size))
+    batched_gets = sum(count for (method, _), count in server.request_counts.items() if method == 'GET')
+    benchmark.extra_info.update(sequential_gets=sequential_gets, batched_gets=batched_gets)
+    assert batched_gets * 2 <= sequential_gets
+
+def bench_chart_burst_after_prefetch(benchmark, client, server, poll_size):
+    """Charts right after a prefetch are served from the caches: no request, nothing rendered."""
+    import charts
+    
+    client.chart_cache = charts.ChartCache()
+    client.warm_window = Prefetcher(window=600)
+    client.warm_window.trigger()    # as after a reset was announced
+    expected, _ = client.create_plot()
+    client.prefetch()
+    server.reset_counts()
+    misses = client.chart_cache.misses
+    
+    def burst():
+        return [client.create_plot()[0] for _ in range(10)]
+    
+    bursts = benchmark.pedantic(burst, rounds=rounds_for(poll_size))
+    benchmark.extra_info.update(requests=sum(server.request_counts.values()), renders=client.chart_cache.misses - misses)
+    assert sum(server.request_counts.values()) == 0
+    assert client.chart_cache.misses == misses
+    assert [buf.getvalue() for buf in bursts[0]] == [buf.getvalue() for buf in expected]
+
+def bench_chart_shows_vote_after_read(benchmark, client, server, poll_size):
+    """A vote entered right after a chart is in the next chart; only while a prefetch window is open may charts lag behind."""
+    def vote_between_charts():
+        before, _ = client.get_votes_by_date()
+        server.poll.add_user('Late voter', {date_id: 'yes' for _, date_id in server.poll.dates})
+        after, _ = client.get_votes_by_date()
+        streamed, _ = asyncio.run(client.get_snapshot_async())
+        return before, after, client._count_votes(streamed)
+    
+    before, after, streamed = benchmark.pedantic(vote_between_charts, setup=_restore(server, poll_size), rounds=rounds_for(poll_size))
+    assert [vote['yes_count'] + 1 for vote in before] == [vote['yes_count'] for vote in after]
+    assert streamed == after
+    
+    client.warm_window = Prefetcher(window=600)
+    client.warm_window.trigger()
+    server.poll = FakePoll.generate(*poll_size)
+    client.invalidate_snapshot()
+    before, after, streamed = vote_between_charts()
+    assert after == streamed == before
+
+def bench_local_get_votes_by_date(benchmark, client, local_client, poll_size):
+    """A local poll answers like the same poll on Xoyondo."""
+    votes, _ = benchmark.pedantic(local_client.get_votes_by_date, setup=local_client.invalidate_snapshot, rounds=rounds_for(poll_size))
+    assert votes == client.get_votes_by_date()[0]
+
+def bench_local_reset_poll(benchmark, local_client, poll_size):
+    dates = [date for date, _ in FakePoll.generate(poll_size[0] + poll_size[0] // 2, 0).dates[poll_size[0] // 2:]]
+    polls = itertools.count()
+    
+    def setup():
+        # A fresh poll in the same database for every round
+        local_client.set_url(local_client.url.split('#')[0] + f'#round{next(polls)}')
+        fill_local_poll(local_client, FakePoll.generate(*poll_size))
+    
+    benchmark.pedantic(local_client.reset_poll, args=(",".join(dates),), setup=setup, rounds=rounds_for(poll_size))
+    snapshot, _ = local_client.get_snapshot(max_age=0)
+    assert list(snapshot.dates) == dates
+    assert snapshot.users == ()
+
+def bench_local_admin_workflow(benchmark, local_client, poll_size):
+    def batched():
+        with local_client.batch():
+            _admin_workflow(local_client)
+    
+    benchmark.pedantic(batched, setup=lambda: fill_local_poll(local_client, FakePoll.generate(*poll_size)), rounds=rounds_for(poll_size))
+    snapshot, _ = local_client.get_snapshot(max_age=0)
+    assert snapshot.users == ()
+
+def bench_local_resets_in_batch(benchmark, tmp_path):
+    """Back-to-back resets in one batch keep the shared snapshot in line with the poll."""
+    client = xyw.open_poll(f'sqlite:///{tmp_path}/polls.db#bench', print_messages=False, collect_messages=False)
+    polls = itertools.count()
+    
+    def setup():
+        client.set_url(client.url.split('#')[0] + f'#round{next(polls)}')
+        client.add_dates('2024/01/01')
+    
+    def resets():
+        with client.batch():
+            client.reset_poll('2024/01/01:2024/01/07')
+            client.reset_poll('2024/01/03:2024/01/10')
+            snapshot, _ = client.get_snapshot()
+            return snapshot.dates
+    
+    dates = benchmark.pedantic(resets, setup=setup, rounds=5)
+    expected = tuple(f'2024/01/{day:02}' for day in range(3, 11))
+    assert dates == expected
+    assert client.get_snapshot(max_age=0)[0].dates == expected
+
+def bench_reset_plan_survives_votes(benchmark, tmp_path):
+    """Votes between planning and resetting keep the plan and are still archived; changed dates outdate it."""
+    client = xyw.open_poll(f'sqlite:///{tmp_path}/polls.db#bench', print_messages=False)
+    polls = itertools.count()
+    
+    def setup():
+        # A fresh poll and archive for every round, planned before the last vote
+        n = next(polls)
+        client.set_url(client.url.split('#')[0] + f'#round{n}')
+        client.add_dates('2023/10/02:2023/10/08')
+        client.vote('Adrian', {'2023/10/04': 'yes'})
+        client.archive = VoteArchive(str(tmp_path / f'archive{n}.db'))
+        plan, _ = client.plan_reset('2023/10/09:2023/10/15')
+        return (plan,), {}
+    
+    def vote_then_reset(plan):
+        client.vote('Bea', {'2023/10/04': 'maybe'})
+        return list(client.reset_poll('2023/10/09:2023/10/15', plan=plan))
+    
+    messages = benchmark.pedantic(vote_then_reset, setup=setup, rounds=3)
+    assert 'Using the precomputed plan' in messages
+    assert dict(client.archive.vote_counts('2023/10/04', '2023/10/04')) == {'2023/10/04': {'question': 0, 'no': 0, 'maybe': 1, 'yes': 1}}
+    assert client.get_snapshot(max_age=0)[0].dates == tuple(client.get_date_list('2023/10/09', '2023/10/15')[0])
+    
+    (plan,), _ = setup()
+    client.add_dates('2023/10/16')
+    assert 'Using the precomputed plan' not in list(client.reset_poll('2023/10/09:2023/10/15', plan=plan))
+    assert client.get_snapshot(max_age=0)[0].dates == tuple(client.get_date_list('2023/10/09', '2023/10/15')[0])
+
+def bench_archived_resets_history(benchmark, tmp_path):
+    """Two resets archive the votes of two weeks; the history shows the best date of each."""
+    # The votes of a week, then the reset to the following one
+    weeks = [
+        ({'Adrian': {'2023/10/02': 'yes', '2023/10/04': 'yes'},
+          'Bea': {'2023/10/02': 'yes', '2023/10/04': 'yes'},
+          'Chris': {'2023/10/02': 'maybe', '2023/10/04': 'yes'}}, '2023/10/09:2023/10/15'),
+        ({'Adrian': {'2023/10/10': 'yes', '2023/10/12': 'yes'},
+          'Bea': {'2023/10/10': 'maybe', '2023/10/12': 'maybe'},
+          'Chris': {'2023/10/10': 'maybe', '2023/10/12': 'no'}}, '2023/10/16:2023/10/22'),
+    ]
+    client = xyw.open_poll(f'sqlite:///{tmp_path}/polls.db#bench', print_messages=False, collect_messages=False)
+    polls = itertools.count()
+    
+    def setup():
+        # A fresh poll and archive for every round
+        n = next(polls)
+        client.set_url(client.url.split('#')[0] + f'#round{n}')
+        client.add_dates('2023/10/02:2023/10/08')
+        client.archive = VoteArchive(str(tmp_path / f'archive{n}.db'))
+    
+    def two_weeks():
+        for votes, next_week in weeks:
+            for user, user_votes in votes.items():
+                client.vote(user, user_votes)
+            client.reset_poll(next_week)
+        return client.archive.weekly_attendance()
+    
+    attendance = benchmark.pedantic(two_weeks, setup=setup, rounds=3)
+    assert len(client.archive.snapshots()) == 2
+    assert attendance == [
+        ('2023/40', '2023/10/04', {'question': 0, 'no': 0, 'maybe': 0, 'yes': 3}),
+        # Tuesday and Thursday got one 'yes' each, Tuesday more 'maybe'
+        ('2023/41', '2023/10/10', {'question': 0, 'no': 0, 'maybe': 2, 'yes': 1}),
+    ]
+    assert dict(client.archive.vote_counts('2023/10/12', '2023/10/12')) == {'2023/10/12': {'question': 0, 'no': 1, 'maybe': 1, 'yes': 1}}
+    assert client.archive.weekly_attendance('2023/10/09') == attendance[1:]
+    buf, _ = client.create_history_plot()
+    assert buf.getvalue().startswith(b'\x89PNG')
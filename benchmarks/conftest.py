@@ -0,0 +1,38 @@
+import pytest
+
+from fake_xoyondo import FakePoll, FakeXoyondoServer
+import xoyondo_wrapper as xyw
+
+# (number of dates, number of users)
+POLL_SIZES = [(7, 5), (31, 50), (92, 200), (365, 500)]
+
+@pytest.fixture(params=POLL_SIZES, ids=lambda size: f'{size[0]}dates-{size[1]}users')
+def poll_size(request):
+    return request.param
+
+@pytest.fixture
+def server(poll_size):
+    with FakeXoyondoServer(FakePoll.generate(*poll_size)) as server:
+        yield server
+
+@pytest.fixture
+def client(server):
+    return xyw.Xoyondo_Wrapper(server.poll_url, print_messages=False, collect_messages=False, base_url=server.base_url)
+
+def fill_local_poll(client, poll):
+    """Copies the dates and votes of a FakePoll into a local poll."""
+    client.add_dates(",".join(date for date, _ in poll.dates))
+    for _, name, votes in poll.users:
+        client.vote(name, {date: votes[date_id] for date, date_id in poll.dates})
+
+@pytest.fixture
+def local_client(poll_size, tmp_path):
+    """The same poll as `server`, kept in a local SQLite poll instead."""
+    client = xyw.open_poll(f'sqlite:///{tmp_path}/polls.db#bench', print_messages=False, collect_messages=False)
+    fill_local_poll(client, FakePoll.generate(*poll_size))
+    return client
+
+def rounds_for(poll_size):
+    """Keeps the slow, large polls from dominating the run time of the suite."""
+    n_dates, n_users = poll_size
+    return 10 if n_dates * n_users <= 2000 else 3
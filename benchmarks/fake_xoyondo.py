@@ -0,0 +1,249 @@
+"""A local stand-in for xoyondo.com.
+
+The server renders poll pages with the same markup the `Xoyondo` client scrapes and understands the
+`poll-change-poll` and `poll-change-poll-ajax` form posts. Latency and HTTP 429 responses can be injected
+to reproduce the behaviour of the real site without touching the network.
+"""
+
+import datetime
+import html
+import itertools
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VOTES = ('yes', 'maybe', 'no', 'question')
+VOTE_CLASSES = {
+    'yes': 'table-success-cell',
+    'maybe': 'table-warning-cell',
+    'no': 'table-danger-cell',
+    'question': 'table-question-cell'
+}
+
+class FakePoll:
+    """In-memory state of a single poll.
+    
+    Attributes:
+        id (str): The ID of the poll.
+        password (str): The admin password of the poll.
+        dates (list): A list of (date, date_id) tuples in poll order.
+        users (list): A list of (user_id, name, votes) tuples. `votes` maps date IDs to 'yes', 'maybe', 'no' or 'question'.
+    """
+    
+    def __init__(self, id='BenchPoll', password='secret'):
+        self.id = id
+        self.password = password
+        self.dates = []
+        self.users = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def generate(cls, n_dates, n_users, start='2023/09/25', seed=0, **kwargs):
+        """Creates a poll with consecutive dates and random votes.
+
+        Args:
+            n_dates (int): The number of dates.
+            n_users (int): The number of users.
+            start (str, optional): The first date in the format '%Y/%m/%d'. Defaults to '2023/09/25'.
+            seed (int, optional): The seed for the random votes. Defaults to 0.
+
+        Returns:
+            FakePoll: The generated poll.
+        """
+        poll = cls(**kwargs)
+        rng = random.Random(seed)
+        first = datetime.datetime.strptime(start, '%Y/%m/%d')
+        for i in range(n_dates):
+            poll.add_date((first + datetime.timedelta(days=i)).strftime('%Y/%m/%d'))
+        for i in range(n_users):
+            poll.add_user(f'User {i}', {date_id: rng.choice(VOTES) for _, date_id in poll.dates})
+        return poll
+    
+    def add_date(self, date):
+        with self._lock:
+            if any(existing == date for existing, _ in self.dates):
+                return
+            self.dates.append((date, str(next(self._ids))))
+            self.dates.sort()
+    
+    def delete_date(self, date_id):
+        with self._lock:
+            # Xoyondo never deletes the last remaining date
+            if len(self.dates) > 1:
+                self.dates = [(date, id) for date, id in self.dates if id != date_id]
+    
+    def add_user(self, name, votes):
+        with self._lock:
+            self.users.append((str(next(self._ids)), name, dict(votes)))
+    
+    def delete_user(self, user_id):
+        with self._lock:
+            self.users = [user for user in self.users if user[0] != user_id]
+    
+    def render(self):
+        """Renders the poll page.
+
+        Returns:
+            str: The HTML of the poll page.
+        """
+        with self._lock:
+            dates = list(self.dates)
+            users = list(self.users)
+            
+        parts = ['<html><body><table class="table"><thead><tr><th></th>']
+        for date, date_id in dates:
+            parts.append(f'<th>{date}<i class="fa fa-edit js-date-edit-cal text-warning pointer mx-1" data-date="{date}" data-dateid="{date_id}"></i></th>')
+        parts.append('</tr></thead><tbody>')
+        for user_id, name, votes in users:
+            parts.append(f'<tr class="js-user-rows" data-userid="{user_id}"><td class="table-user-cell"><i class="fa fa-user"></i> {html.escape(name)}</td>')
+            for _, date_id in dates:
+                parts.append(f'<td class="{VOTE_CLASSES[votes.get(date_id, "question")]}"></td>')
+            parts.append('</tr>')
+        parts.append('</tbody></table></body></html>')
+        return ''.join(parts)
+
+class FakeXoyondoServer(ThreadingHTTPServer):
+    """HTTP server that imitates xoyondo.com for a single poll.
+    
+    Attributes:
+        poll (FakePoll): The poll that is served.
+        recorded_html (str): If set, this HTML is served for the poll page instead of the rendered poll.
+        latency (float): Seconds every request is delayed by.
+        max_concurrent (int): Number of requests that may be in flight before the server answers with HTTP 429. None disables the limit.
+        rate_limit_every (int): Answer every n-th request with HTTP 429. None disables this.
+        request_counts (dict): Number of received requests per (method, path) pair.
+        rejected (int): Number of requests answered with HTTP 429.
+    """
+    
+    daemon_threads = True
+    request_queue_size = 1024
+    
+    def __init__(self, poll=None, host='127.0.0.1', port=0, recorded_html=None, latency=0.0, max_concurrent=None, rate_limit_every=None):
+        super().__init__((host, port), _Handler)
+        self.poll = poll if poll is not None else FakePoll()
+        self.recorded_html = recorded_html
+        self.latency = latency
+        self.max_concurrent = max_concurrent
+        self.rate_limit_every = rate_limit_every
+        self.request_counts = {}
+        self.rejected = 0
+        self._in_flight = 0
+        self._total = 0
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    @property
+    def poll_url(self):
+        return f'{self.base_url}/dp/{self.poll.id}/{self.poll.password}'
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts = {}
+            self.rejected = 0
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _admit(self, key):
+        """Counts a request and decides whether it is rate limited.
+
+        Returns:
+            bool: True if the request may be handled, False if it should be answered with HTTP 429.
+        """
+        with self._lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+            self._total += 1
+            if (self.max_concurrent is not None and self._in_flight >= self.max_concurrent) or \
+                    (self.rate_limit_every and self._total % self.rate_limit_every == 0):
+                self.rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+    
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are written separately, Nagle would delay kept-alive responses
+    
+    def log_message(self, format, *args):
+        pass    # keep benchmark output clean
+    
+    def _reply(self, status, body=b'', content_type='text/html; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _handle(self, method, handler):
+        path = urllib.parse.urlparse(self.path).path
+        # Always consume the body, a rejected request must not leave it in the kept-alive connection
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.server._admit((method, path)):
+            self._reply(429, b'Too Many Requests')
+            return
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            handler(path, body)
+        finally:
+            self.server._release()
+    
+    def do_GET(self):
+        self._handle('GET', self._get)
+    
+    def do_POST(self):
+        self._handle('POST', self._post)
+    
+    def _get(self, path, body):
+        poll = self.server.poll
+        if path != f'/dp/{poll.id}/{poll.password}':
+            self._reply(404, b'Not Found')
+            return
+        page = self.server.recorded_html if self.server.recorded_html is not None else poll.render()
+        self._reply(200, page.encode('utf-8'))
+    
+    def _post(self, path, body):
+        form = {key: values[-1] for key, values in urllib.parse.parse_qs(body.decode('utf-8')).items()}
+        poll = self.server.poll
+        
+        if form.get('ID') != poll.id or form.get('pass') != poll.password:
+            self._reply(403, b'Forbidden')
+            return
+        
+        operation = form.get('operation')
+        if path == '/pc/poll-change-poll' and operation == 'date_add_cal':
+            poll.add_date(form['newdates'])
+        elif path == '/pc/poll-change-poll' and operation == 'date_delete':
+            poll.delete_date(form['dateID'])
+        elif path == '/pc/poll-change-poll-ajax' and operation == 'delete-user':
+            poll.delete_user(form['u'])
+        else:
+            self._reply(400, b'Bad Request')
+            return
+        self._reply(200, b'{"success": true}', 'application/json')
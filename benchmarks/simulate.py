@@ -0,0 +1,291 @@
+"""Offline load test of the bot.
+
+Fires many concurrent `chart`, `reset_poll` and `erase` invocations through the real command handlers of
+`bot.py`. Xoyondo is replaced by the in-process stand-in from `fake_xoyondo.py`, Discord by the mocks below.
+Reports throughput, latency percentiles per command and the lag of the event loop. With --rounds, the load
+is repeated to check that the memory of the process (RSS) stays flat over thousands of commands.
+
+    python benchmarks/simulate.py --invocations 300 --concurrency 50 --mix chart=6,reset_poll=1,erase=3
+    python benchmarks/simulate.py --invocations 500 --rounds 10 --discord-latency 0 --xoyondo-latency 0
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_xoyondo import FakePoll, FakeXoyondoServer
+from loop_monitor import LoopMonitor
+import memory_monitor
+
+ERROR_PREFIX = ':stop_sign:'
+
+class FakeMessage:
+    def __init__(self, channel, content, created_at):
+        self.channel = channel
+        self.content = content
+        self.created_at = created_at
+
+    async def delete(self):
+        await self.channel.call()
+        with contextlib.suppress(ValueError):
+            self.channel.messages.remove(self)
+
+class FakeChannel:
+    """A text channel that keeps the sent messages, newest first, and delays every call like the Discord API."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = []
+
+    async def call(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def post(self, content):
+        message = FakeMessage(self, content, datetime.datetime.now(datetime.timezone.utc))
+        self.messages.insert(0, message)
+        return message
+
+    async def history(self, limit=100):
+        await self.call()
+        for message in self.messages[:limit]:
+            yield message
+
+class FakeContext:
+    """Stands in for `commands.Context` of a prefix command."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.sent = []
+
+    async def send(self, content=None, file=None, **kwargs):
+        await self.channel.call()
+        self.sent.append(content)
+        return self.channel.post(content or '')
+
+class _FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def defer(self, **kwargs):
+        await self.interaction.channel.call()
+
+class _FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, file=None, **kwargs):
+        await self.interaction.channel.call()
+        self.interaction.sent.append(content)
+
+class FakeInteraction:
+    """Stands in for `discord.Interaction` of a slash command."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.sent = []
+        self.response = _FakeResponse(self)
+        self.followup = _FakeFollowup(self)
+
+    async def edit_original_response(self, content=None, **kwargs):
+        await self.channel.call()
+        self.sent.append(content)
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def parse_mix(mix):
+    """Parses 'chart=6,reset_poll=1,erase=3' into a dict of weights."""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def load_bot(workdir):
+    """Imports `bot` and points its files into `workdir`."""
+    environ = dict(os.environ)
+    os.environ.setdefault('DISCORD_TOKEN', 'simulation')
+    os.environ.setdefault('XOYONDO_URL', 'https://xoyondo.com/dp/BenchPoll/secret')
+    try:
+        import bot
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    
+    import adaptive_limit
+    import poll_locks
+    import vote_archive
+    bot.locks = poll_locks.PollLocks()    # asyncio locks are bound to the event loop of their first use
+    bot.xoyow.archive = vote_archive.VoteArchive(os.path.join(workdir, 'vote_archive.db'))
+    bot.xoyow.concurrency = adaptive_limit.AdaptiveLimit(path=os.path.join(workdir, 'concurrency.json'))
+    return bot
+
+async def simulate(bot, server, invocations=300, concurrency=50, mix=None, slash=False, poll_size=(31, 50), discord_latency=0.05, seed=0):
+    """Runs the load test.
+
+    Args:
+        bot (module): The imported `bot` module.
+        server (FakeXoyondoServer): The stand-in the bot is pointed at.
+        invocations (int, optional): The number of commands to run. Defaults to 300.
+        concurrency (int, optional): The number of commands in flight at the same time. Defaults to 50.
+        mix (dict, optional): Relative weights of 'chart', 'reset_poll' and 'erase'. Defaults to 6:1:3.
+        slash (bool, optional): Whether the slash command handlers are used instead of the prefix commands. Defaults to False.
+        poll_size (tuple, optional): (dates, users) of the poll, restored after every reset as if everyone voted again. Defaults to (31, 50).
+        discord_latency (float, optional): Seconds every mocked Discord call takes. Defaults to 0.05.
+        seed (int, optional): Seed of the command sequence. Defaults to 0.
+
+    Returns:
+        dict: Throughput, latencies per command, event loop lag and errors.
+    """
+    mix = mix or {'chart': 6, 'reset_poll': 1, 'erase': 3}
+    rng = random.Random(seed)
+    commands = rng.choices(list(mix), weights=list(mix.values()), k=invocations)
+    channel = FakeChannel(discord_latency)
+    latencies = {name: [] for name in mix}
+    errors = []
+
+    async def invoke(name):
+        if slash:
+            target = FakeInteraction(channel)
+            handler = {'chart': bot.chart_s, 'reset_poll': bot.reset_poll_s, 'erase': bot.erase_s}[name].callback
+        else:
+            target = FakeContext(channel)
+            handler = {'chart': bot.chart_c, 'reset_poll': bot.reset_poll_c, 'erase': bot.erase_c}[name].callback
+        args = {'chart': (), 'reset_poll': ('2023/10/02:2023/10/08', False), 'erase': ('!tf_chart', 1)}[name]
+
+        start = time.perf_counter()
+        await handler(target, *args)
+        latencies[name].append(time.perf_counter() - start)
+
+        errors.extend(f'{name}: {content}' for content in target.sent if content and content.startswith(ERROR_PREFIX))
+        if name == 'reset_poll':
+            server.poll = FakePoll.generate(*poll_size)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(name):
+        async with semaphore:
+            channel.post(f'!tf_{name}')    # the command message, erase looks for these
+            await invoke(name)
+
+    monitor = LoopMonitor(interval=0.01)
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(name) for name in commands))
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+
+    return {
+        'invocations': invocations,
+        'seconds': elapsed,
+        'throughput': invocations / elapsed,
+        'latency': {
+            name: {'count': len(values), 'p50': percentile(values, 50), 'p99': percentile(values, 99), 'max': max(values, default=0.0)}
+            for name, values in latencies.items()
+        },
+        'loop_lag': {'p50': monitor.percentile(50), 'p99': monitor.percentile(99), 'max': monitor.max_lag, 'stalls': monitor.stall_count},
+        'errors': errors,
+    }
+
+def run(invocations=300, concurrency=50, mix=None, slash=False, poll_size=(31, 50), discord_latency=0.05, xoyondo_latency=0.02, max_concurrent=None, seed=0):
+    """Starts the stand-in, imports the bot and runs `simulate`. See `simulate` for the arguments.
+
+    Args:
+        xoyondo_latency (float, optional): Seconds every request to the stand-in takes. Defaults to 0.02.
+        max_concurrent (int, optional): Requests the stand-in handles in parallel before answering with HTTP 429. Defaults to None.
+    """
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeXoyondoServer(FakePoll.generate(*poll_size), latency=xoyondo_latency, max_concurrent=max_concurrent) as server:
+        bot = load_bot(workdir)
+        bot.xoyow.base_url = server.base_url
+        bot.xoyow.set_url(server.poll_url)
+        # erase_messages prints every message it looks at
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(simulate(bot, server, invocations, concurrency, mix, slash, poll_size, discord_latency, seed))
+        result['xoyondo_requests'] = sum(server.request_counts.values())
+        result['rejected'] = server.rejected
+        bot.xoyow.archive = None    # release the database before the directory is removed
+        return result
+
+def soak(rounds=10, invocations=500, concurrency=50, mix=None, poll_size=(31, 50), discord_latency=0.0, xoyondo_latency=0.0, seed=0):
+    """Runs `simulate` repeatedly on one bot and records the RSS after every round. See `simulate` for the arguments.
+
+    Args:
+        rounds (int, optional): The number of rounds. Defaults to 10.
+
+    Returns:
+        dict: The RSS in bytes after every round, the number of commands, the errors and the cache usage of the bot at the end.
+    """
+    async def rounds_on_one_loop(bot, server):
+        rss, errors = [], []
+        for round in range(rounds):
+            result = await simulate(bot, server, invocations, concurrency, mix, False, poll_size, discord_latency, seed + round)
+            errors.extend(result['errors'])
+            gc.collect()
+            rss.append(memory_monitor.rss())
+        return rss, errors
+    
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeXoyondoServer(FakePoll.generate(*poll_size), latency=xoyondo_latency) as server:
+        bot = load_bot(workdir)
+        bot.xoyow.base_url = server.base_url
+        bot.xoyow.set_url(server.poll_url)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            rss, errors = asyncio.run(rounds_on_one_loop(bot, server))
+        usage = bot.xoyow.cache_usage()
+        bot.xoyow.archive = None    # release the database before the directory is removed
+        return {'commands': rounds * invocations, 'rss': rss, 'errors': errors, 'cache_usage': usage}
+
+def report(result):
+    lines = [
+        f"{result['invocations']} invocations in {result['seconds']:.2f} s ({result['throughput']:.1f}/s), "
+        f"{result['xoyondo_requests']} Xoyondo requests, {result['rejected']} rejected with HTTP 429",
+        f"{'command':<12}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for name, stats in result['latency'].items():
+        lines.append(f"{name:<12}{stats['count']:>7}{stats['p50'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}")
+    lag = result['loop_lag']
+    lines.append(f"event loop lag: p50 {lag['p50'] * 1000:.1f} ms, p99 {lag['p99'] * 1000:.1f} ms, max {lag['max'] * 1000:.1f} ms, {lag['stalls']} stall(s) over 100 ms")
+    lines.append(f"{len(result['errors'])} error(s)")
+    lines.extend(f'  {error}' for error in result['errors'][:10])
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invocations', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--mix', default='chart=6,reset_poll=1,erase=3', help='relative weights of the commands')
+    parser.add_argument('--slash', action='store_true', help='use the slash command handlers')
+    parser.add_argument('--dates', type=int, default=31)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--discord-latency', type=float, default=0.05, help='seconds per mocked Discord call')
+    parser.add_argument('--xoyondo-latency', type=float, default=0.02, help='seconds per request to the stand-in')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='parallel requests before the stand-in answers with HTTP 429')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rounds', type=int, default=None, help='repeat the load and report the RSS after every round')
+    args = parser.parse_args()
+    
+    if args.rounds:
+        result = soak(args.rounds, args.invocations, args.concurrency, parse_mix(args.mix), (args.dates, args.users),
+                      args.discord_latency, args.xoyondo_latency, args.seed)
+        print(f"{result['commands']} commands, RSS per round (MiB): " + ', '.join(f'{rss / 2**20:.1f}' for rss in result['rss']))
+        print(f"{len(result['errors'])} error(s)")
+        sys.exit(1 if result['errors'] else 0)
+
+    result = run(args.invocations, args.concurrency, parse_mix(args.mix), args.slash, (args.dates, args.users),
+                 args.discord_latency, args.xoyondo_latency, args.max_concurrent, args.seed)
+    print(report(result))
+    sys.exit(1 if result['errors'] else 0)
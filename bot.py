@@ -1,19 +1,42 @@
+import asyncio
 import datetime
 import discord
+from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
-from fuzzywuzzy import fuzz
 import os
-import pytz
+import adaptive_limit
+import charts
+import loop_monitor
+import memory_monitor
+import poll_locks
+import prefetcher
+import reset_scheduler
+import tracing
+import vote_archive
 import xoyondo_wrapper as xyw
 
 ### globals ###
 url_storage = {}
 extra_info = False
+tree_synced = False
 COMMAND_PREFIX = '!tf_'
 
 load_dotenv()
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
+WARM_UP = os.getenv('WARM_UP', 'true').lower() == 'true'
+LOOP_DEBUG = os.getenv('LOOP_DEBUG', 'false').lower() == 'true'
+LOOP_STALL_MS = int(os.getenv('LOOP_STALL_MS', '100'))
+AUTO_RESET = os.getenv('AUTO_RESET')  # e.g. 'sun 03:00', resets the poll to the next week every week
+AUTO_RESET_CHANNEL = int(os.getenv('AUTO_RESET_CHANNEL', '0'))
+AUTO_RESET_WINDOW = float(os.getenv('AUTO_RESET_WINDOW', '10'))  # minutes the requests of the reset are spread over
+SNAPSHOT_BUDGET_MB = float(os.getenv('SNAPSHOT_BUDGET_MB', '16'))
+CHART_CACHE_MB = float(os.getenv('CHART_CACHE_MB', '8'))
+MEM_TRACE = os.getenv('MEM_TRACE', 'false').lower() == 'true'
+PREFETCH_SCHEDULE = os.getenv('PREFETCH_SCHEDULE')  # e.g. 'tue 18:00, thu 18:00', keeps the caches warm when everyone looks at the poll
+PREFETCH_WINDOW = float(os.getenv('PREFETCH_WINDOW', '15'))  # minutes the caches are kept warm
+PREFETCH_INTERVAL = float(os.getenv('PREFETCH_INTERVAL', '20'))  # seconds between two refreshes, below the snapshot TTL of 30 seconds
+VOTE_ARCHIVE = os.getenv('VOTE_ARCHIVE', 'vote_archive.db')
 
 intents = discord.Intents.default()
 intents.messages = True
@@ -22,7 +45,34 @@ bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents, help_command=
 
 XOYONDO_URL = os.getenv('XOYONDO_URL')
 
-xoyow = xyw.Xoyondo_Wrapper(XOYONDO_URL, print_messages=False)
+xoyow = xyw.open_poll(XOYONDO_URL, print_messages=False, collect_messages=extra_info, snapshot_budget=int(SNAPSHOT_BUDGET_MB * 2**20))
+xoyow.chart_renderer = os.getenv('CHART_RENDERER')
+xoyow.chart_cache = charts.ChartCache(max_bytes=int(CHART_CACHE_MB * 2**20))
+# The parallelism xoyondo.com tolerates is learned from its HTTP 429 responses and kept across restarts
+xoyow.concurrency = adaptive_limit.AdaptiveLimit(path=os.getenv('CONCURRENCY_FILE', 'concurrency.json'))
+# Keyed on `xoyow` itself, not on its ID: !tf_set_url changes the ID while commands wait for the lock
+locks = poll_locks.PollLocks()
+# Blocking calls inside the commands delay everything else on the event loop, including the gateway heartbeats
+loop_health = loop_monitor.LoopMonitor(threshold=LOOP_STALL_MS / 1000, debug=LOOP_DEBUG)
+memory = memory_monitor.MemoryMonitor()
+if MEM_TRACE:
+    memory.start()
+# Charts are requested in bursts after a reset was announced; the prefetcher has them ready
+prefetch = prefetcher.Prefetcher(PREFETCH_INTERVAL, PREFETCH_WINDOW * 60,
+                                 [reset_scheduler.parse_schedule(entry) for entry in (PREFETCH_SCHEDULE or '').split(',') if entry.strip()])
+xoyow.warm_window = prefetch  # outside of its windows, commands read the poll anew
+auto_reset = None
+if AUTO_RESET:
+    auto_reset = reset_scheduler.ResetScheduler(*reset_scheduler.parse_schedule(AUTO_RESET), path=os.getenv('AUTO_RESET_STATE', 'auto_reset.json'))
+
+TRACE_FILE = os.getenv('TRACE_FILE', 'trace.json')
+# Time spent talking to Discord shows up as spans of its own
+tracing.tracer.instrument(discord.abc.Messageable, 'send', 'discord.send')
+tracing.tracer.instrument(discord.Webhook, 'send', 'discord.followup_send')
+tracing.tracer.instrument(discord.InteractionResponse, 'defer', 'discord.defer')
+tracing.tracer.instrument(discord.Interaction, 'edit_original_response', 'discord.edit_response')
+
+BATCH_OPERATIONS = ('set_url', 'reset_poll', 'chart', 'best')  # commands that can be used in !tf_batch
 
 possible_commands = {
     'help': 'Zeigt diese Nachricht.',
@@ -30,15 +80,26 @@ possible_commands = {
     'set_url <url>': 'Setzt die URL der Umfrage auf <url>.',
     'reset_poll <dates>': 'Setzt die Umfrage auf die Daten <dates> zurück.',
     'chart': 'Erstellt ein Diagramm der aktuellen Umfrage.',
+    'renderer <name>': f'Wählt aus, womit Diagramme gezeichnet werden ({", ".join(charts.RENDERERS)}).',
+    'history [start] [end]': 'Erstellt ein Diagramm der Teilnahme pro Woche aus den archivierten Umfragen (Daten im Format YYYY/MM/DD).',
+    'best [count] [quorum]': 'Empfiehlt die [count] besten Termine, an denen mindestens [quorum] User zugesagt haben.',
+    'user_stats [user]': 'Zeigt die Abstimmungsstatistik aller User (oder von [user]), die besten Termine und Termine, an denen alle teilnehmen können.',
+    'trace <on|off|last|export>': 'Schaltet die Zeitmessung der Befehle um, zeigt die letzte Messung oder speichert alle Messungen als Chrome-Trace.',
+    'loop [reset|debug]': 'Zeigt die Verzögerung der Event-Loop und blockierende Aufrufe; debug schaltet das Aufzeichnen der Stacktraces um.',
+    'batch <Befehle>': f'Führt mehrere Befehle ({", ".join(BATCH_OPERATIONS)}), einer pro Zeile, mit einem einzigen Einlesen der Umfrage aus.',
+    'mem [on|off|top|diff|clear]': 'Zeigt den Speicherverbrauch und die Caches; on/off schaltet tracemalloc um, top/diff zeigt die größten Allokationen bzw. deren Zuwachs, clear leert die Caches.',
+    'prefetch [minutes]': 'Zeigt, ob Umfrage und Diagramme im Hintergrund aktuell gehalten werden; [minutes] hält sie für so viele Minuten aktuell.',
+    'schedule': 'Zeigt das automatische Zurücksetzen der Umfrage (nächster Termin und geplante Änderungen).',
     'special': 'Überraschung!',
     'special_for_jannik': 'Überraschung für Jannik! |**Notiz vom Entwickler: Das ist für dich Jannik :heart:**|',
-    'erase': 'Löscht den Command des Users und die dazugehörige Antwort des Bots.'
+    'erase': 'Löscht den Command des Users und die dazugehörige Antwort des Bots.',
+    '/reset_poll, /chart, /erase': 'Slash-Befehle, die sofort antworten und den Fortschritt anzeigen.'
 }
 ###############
 
 ### functions ###
-def get_current_week(offset=0):
-    day = datetime.date.today() + datetime.timedelta(days=7*offset)
+def get_current_week(offset=0, day=None):
+    day = (day or datetime.date.today()) + datetime.timedelta(days=7*offset)
     year, week, _ = day.isocalendar()
     return f'{year}/{week}'
 
@@ -46,11 +107,271 @@ def get_current_month(offset=0):
     day = datetime.date.today() + datetime.timedelta(days=30*offset)
     year, month = day.year, day.month
     return f'{year}/{month}'
+
+def resolve_dates(dates):
+    # Turns week_<YYYY/WW|current|next> and month_<YYYY/MM|current|next> into a date range
+    messages = xoyow.new_messages()
+    if dates.startswith('week_'):
+        year_week = dates.split('week_')[1]
+        
+        if year_week == 'current':
+            year_week = get_current_week()
+        elif year_week == 'next':
+            year_week = get_current_week(offset=1)
+            
+        dates, _messages = xoyow.get_dates_for_week(year_week)
+        messages.extend(_messages)
+    elif dates.startswith('month_'):
+        year_month = dates.split('month_')[1]
+        
+        if year_month == 'current':
+            year_month = get_current_month()
+        elif year_month == 'next':
+            year_month = get_current_month(offset=1)
+            
+        dates, _messages = xoyow.get_dates_for_month(year_month)
+        messages.extend(_messages)
+    return dates, messages
+
+def store_url(url):
+    # open file .env and change the line with XOYONDO_URL to XOYONDO_URL = url
+    with open('.env', 'r') as f:
+        lines = f.readlines()
+    with open('.env', 'w') as f:
+        for line in lines:
+            if line.startswith('XOYONDO_URL'):
+                f.write(f'XOYONDO_URL = {url}\n')
+            else:
+                f.write(line)
+
+def set_url(url):
+    messages = xoyow.set_url(url)
+    store_url(url)
+    return messages
+
+def format_bytes(size):
+    if size is None:
+        return 'unbekannt'
+    if abs(size) < 2**20:
+        return f'{size / 2**10:.1f} KiB'
+    return f'{size / 2**20:.1f} MiB'
+
+def split_message(text, limit=2000):
+    # Discord rejects messages longer than 2000 characters, so split long outputs at line breaks
+    chunks = []
+    chunk = ''
+    for line in text.splitlines(keepends=True):
+        if len(chunk) + len(line) > limit and chunk:
+            chunks.append(chunk)
+            chunk = ''
+        chunk += line[:limit]
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+async def erase_messages(channel, text, time_delta):
+    # Fetch the recent messages
+    recent_messages = [recent_message async for recent_message in channel.history(limit=100)]
+    
+    # Fuzzy matching is slow, keep it off the event loop
+    messages_to_delete, log = await asyncio.to_thread(match_messages, recent_messages, text, time_delta)
+    # Printed here in one write: concurrent prints from worker threads keep memory of the stream's buffer
+    print(''.join(log), end='')
+
+    # Delete the collected messages
+    for msg in messages_to_delete:
+        await msg.delete()
+    
+    return messages_to_delete
+
+def match_messages(recent_messages, text, time_delta):
+    """Returns the recent messages similar to `text` and the lines to print about the matching."""
+    from fuzzywuzzy import fuzz
+    
+    # List to hold messages to be deleted
+    messages_to_delete = []
+    log = [f"Count of messages in channel:  {len(recent_messages)}\n"]
+
+    for message in recent_messages:
+        # Check time delta first
+        utc_now = datetime.datetime.now(datetime.timezone.utc)
+        log.append(f"Message has been created {utc_now - message.created_at} ago\n")
+        if (utc_now - message.created_at).seconds > time_delta*60:
+            break
+        
+        log.append(f"text:  {text}\n")
+        log.append(f"Message content: {message.content}\n")
+
+        # Check if the message is similar to the text string using fuzzy matching
+        ratio = fuzz.ratio(text.lower(), message.content.lower())
+        log.append(f"Message likely to be deleted: {ratio}\n")
+        if ratio >= 80:  # you can adjust the threshold as needed
+            messages_to_delete.append(message)
+    
+    return messages_to_delete, log
+
+class ProgressReporter:
+    # Receives the completion events of the Xoyondo requests from the worker threads and shows them
+    # in the deferred response of a slash command, editing it at most once per interval
+    LABELS = {'date_add': 'Termine hinzugefügt', 'date_delete': 'Termine gelöscht', 'user_delete': 'User gelöscht'}
+    
+    def __init__(self, interaction, interval=1.0):
+        self.interaction = interaction
+        self.interval = interval
+        self.state = {}
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.task = None
+    
+    def __call__(self, operation, done, total):
+        # Called from the worker threads
+        self.loop.call_soon_threadsafe(self.update, operation, done, total)
+    
+    def update(self, operation, done, total):
+        previous, _ = self.state.get(operation, (0, total))
+        self.state[operation] = (max(previous, done), total)
+        self.changed.set()
+    
+    def text(self):
+        return ' | '.join(f'{done}/{total} {self.LABELS.get(operation, operation)}' for operation, (done, total) in self.state.items())
+    
+    async def run(self):
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            try:
+                await self.interaction.edit_original_response(content=f':hourglass: {self.text()}')
+            except discord.HTTPException:
+                pass
+            await asyncio.sleep(self.interval)
+    
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+    
+    async def __aexit__(self, *exc):
+        self.task.cancel()
+        # Wait until a pending edit is given up, so it cannot overwrite the final response
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # the command itself is being cancelled
+
+def format_best(recommendations, quorum):
+    if not recommendations:
+        return f'Kein Termin hat mindestens {quorum} Zusage(n).'
+    
+    output = 'Beste Termine:\n'
+    for rank, rec in enumerate(recommendations, start=1):
+        output += f'> {rank}. {rec.date}: Ja {rec.counts["yes"]} | Vielleicht {rec.counts["maybe"]} | Nein {rec.counts["no"]} | Keine Angabe {rec.counts["question"]} (Punkte: {rec.score:g})\n'
+    return output
+
+def run_batch(lines):
+    # Runs the operations one after another against one shared snapshot of the poll, see Xoyondo.batch.
+    # Returns a list of (text, charts) replies; stops at the first failing operation.
+    replies = []
+    with xoyow.batch():
+        for number, line in enumerate(lines, start=1):
+            name, *args = line.split()
+            name = name.removeprefix(COMMAND_PREFIX)
+            messages = xoyow.new_messages()
+            try:
+                if name == 'set_url' and len(args) == 1:
+                    messages.extend(set_url(args[0]))
+                    text, plots = f'URL geändert zu: <{args[0]}>', []
+                elif name == 'reset_poll' and len(args) == 1:
+                    dates, _messages = resolve_dates(args[0])
+                    messages.extend(_messages)
+                    messages.extend(xoyow.reset_poll(dates))
+                    text, plots = f'Die Umfrage wurde zurückgesetzt. Link: <{xoyow.get_url(False)}>', []
+                elif name == 'chart' and not args:
+                    plots, _messages = xoyow.create_plot()
+                    messages.extend(_messages)
+                    text = None
+                elif name == 'best' and len(args) <= 2:
+                    count, quorum = [int(arg) for arg in args] + [3, 0][len(args):]
+                    recommendations, _messages = xoyow.get_best_dates(count, quorum)
+                    messages.extend(_messages)
+                    text, plots = format_best(recommendations, quorum), []
+                else:
+                    raise ValueError(f'Unbekannter Befehl oder falsche Parameter (möglich: {", ".join(BATCH_OPERATIONS)})')
+            except Exception as e:
+                replies.append((f':stop_sign: **Fehler** :stop_sign: **-** Zeile {number} (`{line}`): {e}', []))
+                break
+            
+            if extra_info and messages:
+                text = ''.join(f'> {message}\n' for message in messages) + (text or '')
+            replies.append((text, plots))
+    return replies
+
+def auto_reset_dates(run):
+    # The poll of the week after the scheduled reset, also if the reset is caught up later
+    dates, _ = xoyow.get_dates_for_week(get_current_week(offset=1, day=run.date()))
+    return dates
+
+async def plan_auto_reset(run):
+    dates = auto_reset_dates(run)
+    async with locks.read(xoyow):
+        plan, _ = await asyncio.to_thread(xoyow.plan_reset, dates)
+    return plan.to_dict()
+
+async def run_auto_reset(run, plan):
+    dates = auto_reset_dates(run)
+    if plan is not None:
+        plan = reset_scheduler.ResetPlan.from_dict(plan)
+    
+    _, shared = await locks.write(xoyow, ('reset_poll', dates), asyncio.to_thread, xoyow.reset_poll, dates, None, plan, AUTO_RESET_WINDOW * 60)
+    
+    # reset_poll reports failed requests as messages only, so check the result
+    snapshot, _ = await asyncio.to_thread(xoyow.get_snapshot, 0)
+    expected, _ = xoyow.get_date_list(dates)
+    if list(snapshot.dates) != list(expected):
+        raise RuntimeError(f'Die Umfrage enthält nach dem Zurücksetzen nicht die Daten {dates}.')
+    
+    channel = bot.get_channel(AUTO_RESET_CHANNEL)
+    if channel is not None and not shared:
+        prefetch.trigger()
+        await channel.send(f'@everyone Die Umfrage wurde automatisch zurückgesetzt. Unter folgendem Link könnt ihr an der neuen Umfrage teilnehmen: <{xoyow.get_url(False)}>')
+
+async def warm_caches():
+    limit = xoyow.concurrency
+    if limit.in_flight >= int(limit.limit):
+        return  # bulk requests use up the limit, they go first
+    # Shares the lock with the charts, so a running reset is waited for instead of reading a half reset poll
+    async with locks.read(xoyow):
+        await asyncio.to_thread(xoyow.prefetch)
+
+async def auto_reset_failed(run, error, attempt):
+    channel = bot.get_channel(AUTO_RESET_CHANNEL)
+    if channel is not None and attempt == 1:  # it is retried every few minutes, only report it once
+        await channel.send(f':stop_sign: **Fehler** :stop_sign: **-** Automatisches Zurücksetzen fehlgeschlagen, es wird erneut versucht: {error}')
+
+def warm_up():
+    # Heavy modules are imported on first use to start the bot faster. Load them in the background once the bot is online.
+    import requests
+    import bs4
+    charts.warm_up(xoyow.chart_renderer)
+    import fuzzywuzzy.fuzz
+    import numpy
 #################
 
 @bot.event
 async def on_ready():
+    global tree_synced
     print(f'Eingeloggt als {bot.user}')
+    if xoyow.archive is None:
+        # Opened once the bot runs, so importing the module (e.g. in the benchmarks) creates no database file
+        xoyow.archive = vote_archive.VoteArchive(VOTE_ARCHIVE)
+    loop_health.start()
+    prefetch.start(warm_caches)
+    if auto_reset is not None:
+        auto_reset.start(plan_auto_reset, run_auto_reset, auto_reset_failed)
+    if not tree_synced:
+        await bot.tree.sync()
+        tree_synced = True
+    if WARM_UP:
+        await asyncio.to_thread(warm_up)
 
 @bot.command(name='help')
 async def help_c(ctx):
@@ -67,6 +388,7 @@ async def help_c_error(ctx, error):
 async def toggle_extra_info_c(ctx):
     global extra_info
     extra_info = not extra_info
+    xoyow.collect_messages = extra_info  # messages are only recorded if somebody is going to read them
     await ctx.send(f'Zusätzliche Infos sind jetzt {"aktiviert" if extra_info else "deaktiviert"}')
 @toggle_extra_info_c.error
 async def toggle_extra_info_c_error(ctx, error):
@@ -74,19 +396,11 @@ async def toggle_extra_info_c_error(ctx, error):
         await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
     
 @bot.command(name='set_url')
+@tracing.traced(COMMAND_PREFIX + 'set_url')
 async def set_url_c(ctx, url:str):
     try:
-        _messages = xoyow.set_url(url)
-        
-        # open file .env and change the line with XOYONDO_URL to XOYONDO_URL = url
-        with open('.env', 'r') as f:
-            lines = f.readlines()
-        with open('.env', 'w') as f:
-            for line in lines:
-                if line.startswith('XOYONDO_URL'):
-                    f.write(f'XOYONDO_URL = {url}\n')
-                else:
-                    f.write(line)
+        # Serialized with other writes to the current poll; concurrent identical requests are executed once
+        _messages, _ = await locks.write(xoyow, ('set_url', url), asyncio.to_thread, set_url, url)
         
         if extra_info:
             output = ''
@@ -103,31 +417,13 @@ async def set_url_c_error(ctx, error):
         await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** URL ist erforderlich!')
         
 @bot.command(name='reset_poll')
+@tracing.traced(COMMAND_PREFIX + 'reset_poll')
 async def reset_poll_c(ctx, dates:str, print_link:bool=True):
     try:
-        messages = []
-        if dates.startswith('week_'):
-            year_week = dates.split('week_')[1]
-            
-            if year_week == 'current':
-                year_week = get_current_week()
-            elif year_week == 'next':
-                year_week = get_current_week(offset=1)
-                
-            dates, _messages = xoyow.get_dates_for_week(year_week)
-            messages.extend(_messages)
-        elif dates.startswith('month_'):
-            year_month = dates.split('month_')[1]
-            
-            if year_month == 'current':
-                year_month = get_current_month()
-            elif year_month == 'next':
-                year_month = get_current_month(offset=1)
-                
-            dates, _messages = xoyow.get_dates_for_month(year_month)
-            messages.extend(_messages)
-            
-        _messages = xoyow.reset_poll(dates)
+        dates, messages = resolve_dates(dates)
+        
+        # Serialized with other writes to the poll; concurrent identical resets are executed once
+        _messages, shared = await locks.write(xoyow, ('reset_poll', dates), asyncio.to_thread, xoyow.reset_poll, dates)
         messages.extend(_messages)
         
         if extra_info:
@@ -136,10 +432,14 @@ async def reset_poll_c(ctx, dates:str, print_link:bool=True):
                 output += f'> {message}\n'
             await ctx.send(output)
 
-        if print_link:
+        if shared:
+            # The announcement is sent by the request that actually reset the poll
+            await ctx.send('Die Umfrage wurde bereits von einer gleichzeitigen Anfrage zurückgesetzt.')
+        elif print_link:
+            prefetch.trigger()  # everyone is about to look at the new poll
             await ctx.send(f'@everyone Die Umfrage wurde zurückgesetzt. Unter folgendem Link könnt ihr an der neuen Umfrage teilnehmen: <{xoyow.get_url(False)}>')
         else:
-            await ctx.send(f'Die Umfrage wurde zurückgesetzt.')
+            await ctx.send('Die Umfrage wurde zurückgesetzt.')
     except Exception as e:
         await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
 @reset_poll_c.error
@@ -148,9 +448,12 @@ async def reset_poll_c_error(ctx, error):
         await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Neue Daten sind erforderlich!')        
         
 @bot.command(name='chart')
+@tracing.traced(COMMAND_PREFIX + 'chart')
 async def chart_c(ctx):
     try:
-        buf, _messages = xoyow.create_plot()
+        # Votes are read without blocking the event loop, concurrent chart requests share one read of the poll
+        async with locks.read(xoyow):
+            plots, _messages = await xoyow.stream_plots()
         
         if extra_info:
             output = ''
@@ -158,7 +461,8 @@ async def chart_c(ctx):
                 output += f'> {_message}\n'
             await ctx.send(output)
         
-        for chart in buf:
+        # Every chart is sent as soon as it is rendered
+        async for chart in plots:
             await ctx.send(file=discord.File(chart, 'chart.png'))
     except Exception as e:
         await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
@@ -167,6 +471,277 @@ async def chart_c_error(ctx, error):
     if isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')   
         
+@bot.command(name='renderer')
+async def renderer_c(ctx, name:str):
+    try:
+        if name not in charts.RENDERERS:
+            raise ValueError(f'Unbekannter Renderer: {name}. Verfügbar: {", ".join(charts.RENDERERS)}')
+        xoyow.chart_renderer = name
+        await ctx.send(f'Diagramme werden jetzt mit {name} gezeichnet.')
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@renderer_c.error
+async def renderer_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Name ist erforderlich!')
+
+@bot.command(name='history')
+@tracing.traced(COMMAND_PREFIX + 'history')
+async def history_c(ctx, start:str=None, end:str=None):
+    try:
+        buf, _messages = await asyncio.to_thread(xoyow.create_history_plot, start, end)
+        
+        if extra_info:
+            output = ''
+            for _message in _messages:
+                output += f'> {_message}\n'
+            await ctx.send(output)
+        
+        await ctx.send(file=discord.File(buf, 'history.png'))
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@history_c.error
+async def history_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='best')
+@tracing.traced(COMMAND_PREFIX + 'best')
+async def best_c(ctx, count:int=3, quorum:int=0):
+    try:
+        async with locks.read(xoyow):
+            # Concurrent commands share one read of the poll instead of each blocking a thread on it
+            snapshot, _messages = await xoyow.get_snapshot_async()
+            recommendations, _best_messages = await asyncio.to_thread(xoyow.get_best_dates, count, quorum, snapshot=snapshot)
+            _messages.extend(_best_messages)
+        
+        if extra_info:
+            output = ''
+            for _message in _messages:
+                output += f'> {_message}\n'
+            await ctx.send(output)
+        
+        await ctx.send(format_best(recommendations, quorum))
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@best_c.error
+async def best_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='user_stats')
+@tracing.traced(COMMAND_PREFIX + 'user_stats')
+async def user_stats_c(ctx, user:str=None):
+    try:
+        async with locks.read(xoyow):
+            snapshot, _messages = await xoyow.get_snapshot_async()
+            stats, _stats_messages = await asyncio.to_thread(xoyow.get_user_stats, snapshot=snapshot)
+            _messages.extend(_stats_messages)
+        
+        if extra_info:
+            output = ''
+            for _message in _messages:
+                output += f'> {_message}\n'
+            await ctx.send(output)
+        
+        if user is not None and user not in stats.rates:
+            raise ValueError(f'User {user} nicht gefunden.')
+        
+        output = 'Abstimmungsverhalten:\n'
+        for name, rates in stats.rates.items():
+            if user is None or name == user:
+                output += f'> {name}: Ja {rates["yes"]:.0%} | Vielleicht {rates["maybe"]:.0%} | Nein {rates["no"]:.0%} | Keine Angabe {rates["question"]:.0%}\n'
+        output += 'Beste Termine: ' + ', '.join(f'{date} ({score:g})' for date, score in stats.best_dates[:3]) + '\n'
+        output += 'Termine, an denen alle teilnehmen können: ' + (', '.join(stats.covering_dates) or '-') + '\n'
+        if stats.uncovered_users:
+            output += 'Ohne Zusage: ' + ', '.join(stats.uncovered_users) + '\n'
+        
+        for chunk in split_message(output):
+            await ctx.send(chunk)
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@user_stats_c.error
+async def user_stats_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='trace')
+async def trace_c(ctx, action:str='last'):
+    try:
+        if action == 'on':
+            tracing.tracer.enabled = True
+            await ctx.send('Zeitmessung ist jetzt aktiviert')
+        elif action == 'off':
+            tracing.tracer.enabled = False
+            await ctx.send('Zeitmessung ist jetzt deaktiviert')
+        elif action == 'last':
+            # The trace command itself is not traced, so the last trace is the command before it
+            lines = tracing.tracer.summary()
+            if not lines:
+                raise ValueError('Keine Messung vorhanden. Zeitmessung aktivieren mit: ' + COMMAND_PREFIX + 'trace on')
+            output = f'Letzte Messung - {lines[0]}\n' + ''.join(f'> {line}\n' for line in lines[1:])
+            for chunk in split_message(output):
+                await ctx.send(chunk)
+        elif action == 'export':
+            count = await asyncio.to_thread(tracing.tracer.export_chrome_trace, TRACE_FILE)
+            await ctx.send(f'{count} Messpunkte gespeichert in {TRACE_FILE}', file=discord.File(TRACE_FILE))
+        else:
+            raise ValueError(f'Unbekannte Aktion: {action}')
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@trace_c.error
+async def trace_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='loop')
+async def loop_c(ctx, action:str=None):
+    try:
+        if action == 'reset':
+            loop_health.reset()
+            await ctx.send('Messwerte der Event-Loop zurückgesetzt')
+            return
+        elif action == 'debug':
+            loop_health.debug = not loop_health.debug
+            await ctx.send(f'Stacktraces blockierender Aufrufe werden jetzt {"aufgezeichnet" if loop_health.debug else "nicht aufgezeichnet"}')
+            return
+        elif action is not None:
+            raise ValueError(f'Unbekannte Aktion: {action}')
+        
+        metrics = loop_health.metrics()
+        output = (f'Event-Loop: {metrics["samples"]} Messungen, Verzögerung p50 {metrics["lag_p50_ms"]:.1f} ms, '
+                  f'p99 {metrics["lag_p99_ms"]:.1f} ms, max {metrics["lag_max_ms"]:.1f} ms\n'
+                  f'> {metrics["stalls"]} Blockade(n) über {metrics["threshold_ms"]:.0f} ms\n')
+        for stall in list(loop_health.stalls)[-5:]:
+            started = datetime.datetime.fromtimestamp(stall.started).strftime('%H:%M:%S')
+            output += f'> {started}: {stall.duration * 1000:.0f} ms\n'
+            if stall.stack:
+                # The innermost frames show the blocking call
+                output += '```\n' + ''.join(stall.stack.splitlines(keepends=True)[-8:]) + '```\n'
+        for chunk in split_message(output):
+            await ctx.send(chunk)
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@loop_c.error
+async def loop_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='mem')
+async def mem_c(ctx, action:str=None):
+    try:
+        if action == 'on':
+            await asyncio.to_thread(memory.start)
+            await ctx.send('tracemalloc ist jetzt aktiviert')
+            return
+        elif action == 'off':
+            memory.stop()
+            await ctx.send('tracemalloc ist jetzt deaktiviert')
+            return
+        elif action == 'clear':
+            before = memory_monitor.rss()
+            xoyow.clear_caches()
+            after = memory_monitor.rss()
+            await ctx.send(f'Caches geleert, RSS {format_bytes(before)} -> {format_bytes(after)}')
+            return
+        elif action in ('top', 'diff'):
+            if not memory.tracing:
+                raise ValueError('tracemalloc ist nicht aktiviert. Aktivieren mit: ' + COMMAND_PREFIX + 'mem on')
+            # Copying all traces takes a while, so keep it off the event loop
+            allocations = await asyncio.to_thread(memory.top if action == 'top' else memory.growth)
+            title = 'Größte Allokationen' if action == 'top' else 'Größter Zuwachs seit dem Aktivieren'
+            output = f'{title}:\n' + ''.join(f'> {a.location}: {format_bytes(a.size)} in {a.count} Blöcken\n' for a in allocations)
+            for chunk in split_message(output):
+                await ctx.send(chunk)
+            return
+        elif action is not None:
+            raise ValueError(f'Unbekannte Aktion: {action}')
+        
+        metrics = memory.metrics()
+        usage = xoyow.cache_usage()
+        output = (f'Speicher: RSS {format_bytes(metrics["rss"])}\n'
+                  f'> Umfrage-Cache: {format_bytes(usage["snapshot"])} von {format_bytes(usage["snapshot_budget"])}\n'
+                  f'> Diagramm-Cache: {usage["charts"]} Diagramm(e), {format_bytes(usage["charts_bytes"])} von {format_bytes(usage["charts_budget"])}\n')
+        if metrics['tracing']:
+            output += f'> tracemalloc: {format_bytes(metrics["traced"])}, Spitze {format_bytes(metrics["traced_peak"])}\n'
+        await ctx.send(output)
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@mem_c.error
+async def mem_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='batch')
+@tracing.traced(COMMAND_PREFIX + 'batch')
+async def batch_c(ctx, *, script:str):
+    try:
+        lines = [line.strip() for line in script.splitlines() if line.strip()]
+        
+        # A batch may change the poll, so it is serialized with all other writes
+        replies, _ = await locks.write(xoyow, ('batch', tuple(lines)), asyncio.to_thread, run_batch, lines)
+        
+        for text, plots in replies:
+            if text:
+                for chunk in split_message(text):
+                    await ctx.send(chunk)
+            for chart in plots:
+                await ctx.send(file=discord.File(chart, 'chart.png'))
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@batch_c.error
+async def batch_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Befehle sind erforderlich!')
+
+@bot.command(name='prefetch')
+async def prefetch_c(ctx, minutes:float=None):
+    try:
+        if minutes is not None:
+            if minutes <= 0:
+                raise ValueError('Die Dauer muss positiv sein.')
+            prefetch.trigger(minutes * 60)
+        
+        metrics = prefetch.metrics()
+        if metrics['active']:
+            output = f'Umfrage und Diagramme werden noch {metrics["remaining"] / 60:.0f} Minute(n) alle {prefetch.interval:g} Sekunden vorgeladen\n'
+        else:
+            output = 'Umfrage und Diagramme werden gerade nicht vorgeladen\n'
+        if metrics['next_window'] is not None:
+            output += f'> Nächstes geplantes Vorladen: {metrics["next_window"]:%d.%m.%Y %H:%M}\n'
+        output += f'> {metrics["runs"]} Mal vorgeladen, {metrics["failures"]} Fehler\n'
+        if metrics['last_error'] is not None:
+            output += f'> Letzter Fehler: {metrics["last_error"]}\n'
+        await ctx.send(output)
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@prefetch_c.error
+async def prefetch_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
+@bot.command(name='schedule')
+async def schedule_c(ctx):
+    try:
+        if auto_reset is None:
+            raise ValueError('Automatisches Zurücksetzen ist nicht eingerichtet (AUTO_RESET, z.B. "sun 03:00").')
+        
+        run = auto_reset.next_run()
+        output = f'Nächstes automatisches Zurücksetzen: {run:%d.%m.%Y %H:%M} auf {auto_reset_dates(run)}\n'
+        output += f'> Letztes Zurücksetzen: {auto_reset.last_run:%d.%m.%Y %H:%M}\n'
+        if auto_reset.plan is not None and auto_reset.plan.get('run') == run.isoformat() and auto_reset.plan['plan'] is not None:
+            plan = reset_scheduler.ResetPlan.from_dict(auto_reset.plan['plan'])
+            output += f'> Geplant: {len(plan.to_add)} Termin(e) hinzufügen, {len(plan.to_delete)} löschen, {plan.users} User löschen\n'
+        if auto_reset.last_error is not None:
+            output += f'> Letzter Fehler: {auto_reset.last_error}\n'
+        await ctx.send(output)
+    except Exception as e:
+        await ctx.send(f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+@schedule_c.error
+async def schedule_c_error(ctx, error):
+    if isinstance(error, commands.MissingRequiredArgument):
+        await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
+
 @bot.command(name='special')
 async def special_c(ctx):
     await ctx.send('Jannik & Natalie -> :heart: :cupid: :smiling_face_with_3_hearts:')
@@ -185,33 +760,10 @@ async def special_for_jannik_c_error(ctx, error):
 
 
 @bot.command(name='erase')
+@tracing.traced(COMMAND_PREFIX + 'erase')
 async def erase_c(ctx, text:str, time_delta:int=1, long_answer:bool=False):
     try:
-        # List to hold messages to be deleted
-        messages_to_delete = []
-
-        # Fetch the recent messages
-        recent_messages = [recent_message async for recent_message in ctx.channel.history(limit=100)]
-        print("Count of messages in channel: ", len(recent_messages))
-
-        for message in recent_messages:
-            # Check time delta first
-            utc_now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
-            print(f"Message has been created {utc_now - message.created_at} ago")
-            if (utc_now - message.created_at).seconds > time_delta*60:
-                break
-            
-            print("text: ", text)
-            print(f"Message content: {message.content}")
-
-            # Check if the message is similar to the text string using fuzzy matching
-            print("Message likely to be deleted:", fuzz.ratio(text.lower(), message.content.lower()))
-            if fuzz.ratio(text.lower(), message.content.lower()) >= 80:  # you can adjust the threshold as needed
-                messages_to_delete.append(message)
-
-        # Delete the collected messages
-        for msg in messages_to_delete:
-            await msg.delete()
+        messages_to_delete = await erase_messages(ctx.channel, text, time_delta)
 
         # Send a confirmation message and then delete it after a few seconds
         if long_answer:
@@ -228,4 +780,76 @@ async def erase_c_error(ctx, error):
         await ctx.send(':stop_sign: **Fehler** :stop_sign: **-** Parameter ist erforderlich!')
     
 
-bot.run(DISCORD_TOKEN)
\ No newline at end of file
+### slash commands ###
+# Slash commands answer right away with a deferred response and report the progress of the backend work
+
+@bot.tree.command(name='reset_poll', description='Setzt die Umfrage auf neue Daten zurück.')
+@app_commands.describe(dates='Daten (YYYY/MM/DD, Bereiche mit :, week_<YYYY/WW|current|next>, month_<YYYY/MM|current|next>)', print_link='Link zur Umfrage an @everyone senden')
+@tracing.traced('/reset_poll')
+async def reset_poll_s(interaction: discord.Interaction, dates: str, print_link: bool = True):
+    await interaction.response.defer(thinking=True)
+    try:
+        dates, messages = resolve_dates(dates)
+        
+        async with ProgressReporter(interaction) as progress:
+            _messages, shared = await locks.write(xoyow, ('reset_poll', dates), asyncio.to_thread, xoyow.reset_poll, dates, progress)
+        messages.extend(_messages)
+        
+        if extra_info:
+            output = ''
+            for message in messages:
+                output += f'> {message}\n'
+            for chunk in split_message(output):
+                await interaction.followup.send(chunk)
+        
+        if shared:
+            await interaction.edit_original_response(content='Die Umfrage wurde bereits von einer gleichzeitigen Anfrage zurückgesetzt.')
+        elif print_link:
+            prefetch.trigger()  # everyone is about to look at the new poll
+            await interaction.edit_original_response(content='Die Umfrage wurde zurückgesetzt.')
+            # Mentions in edited messages do not notify anyone, so the announcement is a new message
+            await interaction.followup.send(f'@everyone Die Umfrage wurde zurückgesetzt. Unter folgendem Link könnt ihr an der neuen Umfrage teilnehmen: <{xoyow.get_url(False)}>')
+        else:
+            await interaction.edit_original_response(content='Die Umfrage wurde zurückgesetzt.')
+    except Exception as e:
+        await interaction.edit_original_response(content=f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+
+@bot.tree.command(name='chart', description='Erstellt ein Diagramm der aktuellen Umfrage.')
+@tracing.traced('/chart')
+async def chart_s(interaction: discord.Interaction):
+    await interaction.response.defer(thinking=True)
+    try:
+        async with locks.read(xoyow):
+            plots, _messages = await xoyow.stream_plots()
+        
+        if extra_info:
+            output = ''
+            for _message in _messages:
+                output += f'> {_message}\n'
+            for chunk in split_message(output):
+                await interaction.followup.send(chunk)
+        
+        count = 0
+        async for chart in plots:
+            count += 1
+            await interaction.followup.send(file=discord.File(chart, 'chart.png'))
+            await interaction.edit_original_response(content=f':hourglass: {count} Diagramm(e) gesendet')
+        await interaction.edit_original_response(content=f'{count} Diagramm(e) erstellt.')
+    except Exception as e:
+        await interaction.edit_original_response(content=f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+
+@bot.tree.command(name='erase', description='Löscht ähnliche Nachrichten der letzten Minuten.')
+@app_commands.describe(text='Text der zu löschenden Nachrichten', time_delta='Zeitraum in Minuten')
+@tracing.traced('/erase')
+async def erase_s(interaction: discord.Interaction, text: str, time_delta: int = 1):
+    await interaction.response.defer(thinking=True, ephemeral=True)
+    try:
+        messages_to_delete = await erase_messages(interaction.channel, text, time_delta)
+        await interaction.edit_original_response(content=f'{len(messages_to_delete)} message(s) similar to `{text}` from the past {time_delta} minute(s) {"has" if len(messages_to_delete) == 1 else "have"} been deleted.')
+    except Exception as e:
+        await interaction.edit_original_response(content=f':stop_sign: **Fehler** :stop_sign: **-** {e}')
+######################
+
+
+if __name__ == '__main__':
+    bot.run(DISCORD_TOKEN)
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""Rendering of the poll charts.
+
+A chart shows one stacked bar per date with the 'Keine Angabe', 'Nein', 'Vielleicht' and 'Ja' votes.
+The default renderer draws the chart with Pillow, which is much faster and lighter than matplotlib.
+matplotlib is kept as a fallback and can be selected at runtime.
+Rendered charts can be kept in a ChartCache, so a chart of unchanged votes is not rendered again.
+"""
+
+from collections import OrderedDict
+import io
+import threading
+
+import tracing
+
+# Drawn bottom to top: (label, key in the vote dict, colour)
+SERIES = [
+    ('Keine Angabe', 'question_count', (128, 128, 128)),
+    ('Nein', 'no_count', (255, 0, 0)),
+    ('Vielleicht', 'maybe_count', (191, 191, 0)),
+    ('Ja', 'yes_count', (0, 128, 0)),
+]
+MATPLOTLIB_COLORS = {'Ja': 'g', 'Vielleicht': 'y', 'Nein': 'r', 'Keine Angabe': 'grey'}
+
+WIDTH, HEIGHT = 1000, 500
+
+def render_matplotlib(chunk):
+    """Renders a chart with matplotlib.
+
+    Args:
+        chunk (list): Vote dicts with 'date', 'yes_count', 'no_count', 'maybe_count' and 'question_count'.
+
+    Returns:
+        BytesIO: The chart as PNG.
+    """
+    from matplotlib.figure import Figure  # imported on first use, as matplotlib is slow to import
+    
+    labels = [vote['date'] for vote in chunk]
+    
+    # Use a standalone figure instead of pyplot's global state, so charts can be rendered from several threads
+    fig = Figure(figsize=(WIDTH / 100, HEIGHT / 100))
+    ax = fig.subplots()
+    
+    bottom = [0] * len(chunk)
+    for label, key, _ in SERIES:
+        counts = [int(vote[key]) for vote in chunk]
+        ax.bar(labels, counts, color=MATPLOTLIB_COLORS[label], bottom=bottom, label=label)
+        bottom = [b + c for b, c in zip(bottom, counts)]
+    
+    ax.set_ylabel("Stimmen")
+    ax.legend()
+    
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    buf.seek(0)
+    return buf
+
+def _font(size):
+    from PIL import ImageFont
+    
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 only has a fixed size bitmap font
+        return ImageFont.load_default()
+
+def _nice_step(maximum, ticks=6):
+    """Returns a round step for the y axis, so there are about `ticks` grid lines."""
+    raw = max(maximum / ticks, 1)
+    magnitude = 10 ** (len(str(int(raw))) - 1)
+    for factor in (1, 2, 5, 10):
+        if factor * magnitude >= raw:
+            return factor * magnitude
+    return 10 * magnitude
+
+def render_pillow(chunk):
+    """Renders a chart with Pillow.
+
+    Args:
+        chunk (list): Vote dicts with 'date', 'yes_count', 'no_count', 'maybe_count' and 'question_count'.
+
+    Returns:
+        BytesIO: The chart as PNG.
+    """
+    from PIL import Image, ImageDraw  # imported on first use
+    
+    font = _font(14)
+    image = Image.new('RGB', (WIDTH, HEIGHT), 'white')
+    draw = ImageDraw.Draw(image)
+    
+    left, right, top, bottom = 80, WIDTH - 20, 20, HEIGHT - 50
+    totals = [sum(int(vote[key]) for _, key, _ in SERIES) for vote in chunk]
+    highest = max(totals, default=0) * 1.05  # leave some room above the highest bar like matplotlib
+    step = _nice_step(highest)
+    y_max = max(step * -int(-highest // step), step)
+    scale = (bottom - top) / y_max
+    
+    # Y axis with grid lines and label
+    for value in range(0, y_max + 1, step):
+        y = bottom - value * scale
+        draw.line([(left - 5, y), (left, y)], fill='black')
+        draw.text((left - 8, y), str(value), fill='black', font=font, anchor='rm')
+    label = Image.new('RGBA', (120, 20), (255, 255, 255, 0))
+    ImageDraw.Draw(label).text((60, 10), 'Stimmen', fill='black', font=font, anchor='mm')
+    label = label.rotate(90, expand=True)
+    image.paste(label, (10, (top + bottom) // 2 - label.height // 2), label)
+    
+    # Stacked bars
+    slot = (right - left) / max(len(chunk), 1)
+    bar_width = slot * 0.8
+    for i, vote in enumerate(chunk):
+        x0 = left + i * slot + (slot - bar_width) / 2
+        y = bottom
+        for _, key, colour in SERIES:
+            height = int(vote[key]) * scale
+            if height:
+                draw.rectangle([x0, y - height, x0 + bar_width, y], fill=colour)
+            y -= height
+        draw.text((x0 + bar_width / 2, bottom + 8), vote['date'], fill='black', font=font, anchor='mt')
+    draw.line([(left, top), (left, bottom), (right, bottom)], fill='black')
+    
+    # Legend, top entry first like matplotlib
+    legend_x, legend_y = right - 130, top + 5
+    draw.rectangle([legend_x - 8, legend_y - 5, right - 5, legend_y + 20 * len(SERIES)], fill='white', outline=(204, 204, 204))
+    for i, (name, _, colour) in enumerate(reversed(SERIES)):
+        y = legend_y + i * 20
+        draw.rectangle([legend_x, y + 2, legend_x + 24, y + 12], fill=colour)
+        draw.text((legend_x + 32, y + 7), name, fill='black', font=font, anchor='lm')
+    
+    buf = io.BytesIO()
+    image.save(buf, format='png', compress_level=1)
+    buf.seek(0)
+    return buf
+
+class ChartCache:
+    """Rendered charts keyed by the votes they show. The least recently used charts are dropped beyond a memory budget.
+    
+    Attributes:
+        max_bytes (int): The maximum total size of the cached PNGs.
+        nbytes (int): The current total size of the cached PNGs.
+        hits (int): Number of charts served from the cache.
+        misses (int): Number of charts that had to be rendered.
+    """
+    
+    def __init__(self, max_bytes=8 * 2**20):
+        """Initialize an empty cache.
+
+        Args:
+            max_bytes (int, optional): The maximum total size of the cached PNGs. Defaults to 8 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(chunk, renderer):
+        """Returns the cache key of a chart: charts showing the same counts for the same dates look the same."""
+        return renderer, tuple((vote['date'],) + tuple(int(vote[key]) for _, key, _ in SERIES) for vote in chunk)
+    
+    def get(self, key):
+        """Returns the PNG of a cached chart as bytes, None if it is not cached."""
+        with self._lock:
+            png = self._charts.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._charts.move_to_end(key)
+            self.hits += 1
+            return png
+    
+    def put(self, key, png):
+        """Caches the PNG of a chart, dropping the least recently used charts until it fits into the budget."""
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._charts.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self._charts[key] = png
+            self.nbytes += len(png)
+            while self.nbytes > self.max_bytes:
+                _, dropped = self._charts.popitem(last=False)
+                self.nbytes -= len(dropped)
+    
+    def clear(self):
+        with self._lock:
+            self._charts.clear()
+            self.nbytes = 0
+    
+    def __len__(self):
+        return len(self._charts)
+    
+    def __repr__(self):
+        return f'<ChartCache {len(self._charts)} charts, {self.nbytes}/{self.max_bytes} bytes, {self.hits} hits, {self.misses} misses>'
+
+RENDERERS = {
+    'pillow': render_pillow,
+    'matplotlib': render_matplotlib,
+}
+DEFAULT_RENDERER = 'pillow'
+
+def warm_up(renderer=None):
+    """Imports the modules of a renderer and loads its font, so the first chart is rendered as fast as the next.
+
+    Args:
+        renderer (str, optional): One of RENDERERS. Defaults to DEFAULT_RENDERER. Only this renderer is loaded,
+            as matplotlib alone takes tens of MiB.
+    """
+    if (renderer or DEFAULT_RENDERER) == 'matplotlib':
+        import matplotlib.figure
+        import matplotlib.backends.backend_agg
+    else:
+        import PIL.Image
+        import PIL.ImageDraw
+        _font(14)
+
+def render_chart(chunk, renderer=None, cache=None):
+    """Renders a chart, falling back to matplotlib if the selected renderer is not available.
+
+    Args:
+        chunk (list): Vote dicts with 'date', 'yes_count', 'no_count', 'maybe_count' and 'question_count'.
+        renderer (str, optional): One of RENDERERS. Defaults to DEFAULT_RENDERER.
+        cache (ChartCache, optional): Serves charts that were rendered before and keeps new ones. Defaults to None.
+
+    Raises:
+        ValueError: If the renderer is unknown.
+
+    Returns:
+        BytesIO: The chart as PNG.
+    """
+    renderer = renderer or DEFAULT_RENDERER
+    if renderer not in RENDERERS:
+        raise ValueError(f"Unknown renderer: {renderer}. Available: {', '.join(RENDERERS)}")
+    
+    with tracing.span('render_chart', renderer=renderer) as span:
+        if cache is not None:
+            key = cache.key(chunk, renderer)
+            png = cache.get(key)
+            span.set(cached=png is not None)
+            if png is not None:
+                return io.BytesIO(png)
+        
+        try:
+            buf = RENDERERS[renderer](chunk)
+        except ImportError:
+            if renderer == 'matplotlib':
+                raise
+            buf = render_matplotlib(chunk)
+        
+        if cache is not None:
+            cache.put(key, buf.getvalue())
+        return buf
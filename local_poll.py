@@ -0,0 +1,228 @@
+"""Polls kept in a local SQLite database.
+
+A stand-in for Xoyondo that needs no network: the bot can run against it during development or while
+xoyondo.com is unreachable, and the benchmarks measure the bot without any HTTP round trips. A database
+file can hold several polls, told apart by name. The bot only reads and resets a poll; votes are entered
+with `vote`, e.g. from a script.
+"""
+
+from datetime import datetime
+import logging
+import re
+import sqlite3
+
+from poll_backend import PollBackend, writes_poll
+from poll_snapshot import VOTE_CODES, PollSnapshot
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dates (id INTEGER PRIMARY KEY, poll TEXT NOT NULL, date TEXT NOT NULL, UNIQUE (poll, date));
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, poll TEXT NOT NULL, name TEXT NOT NULL, UNIQUE (poll, name));
+CREATE TABLE IF NOT EXISTS votes (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    date_id INTEGER NOT NULL REFERENCES dates(id),
+    vote INTEGER NOT NULL,
+    PRIMARY KEY (user_id, date_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS votes_by_date ON votes (date_id);
+'''
+
+# 'sqlite:///polls.db#team' is the poll 'team' in polls.db, 'sqlite:////var/lib/polls.db' an absolute path
+URL_PATTERN = re.compile(r'^sqlite:///(?P<path>[^#]+)(?:#(?P<poll>.+))?$')
+
+DEFAULT_POLL = 'default'
+
+def parse_url(url):
+    """Splits the URL of a local poll into the path of the database and the name of the poll.
+
+    Raises:
+        ValueError: If `url` is not of the form 'sqlite:///<path>#<poll>'.
+
+    Returns:
+        tuple: The path and the name of the poll, DEFAULT_POLL if the URL names none.
+    """
+    match = URL_PATTERN.match(url)
+    if not match:
+        raise ValueError(f"Invalid URL format: {url}")
+    return match['path'], match['poll'] or DEFAULT_POLL
+
+class LocalPoll(PollBackend):
+    """A poll stored in a local SQLite database.
+
+    Dates are kept in chronological order like on Xoyondo, users in the order they first voted.
+
+    Attributes:
+        url (str): The address of the poll, 'sqlite:///<path>#<poll>'.
+        path (str): The path of the database file.
+        id (str): The name of the poll within the database.
+    """
+
+    def __init__(self, url, print_messages = True, collect_messages = True, message_level = logging.DEBUG, snapshot_ttl = 30, concurrency = None, snapshot_budget = 16 * 2**20, message_limit = 1000):
+        """Initialize the object and create the tables if the database is new.
+
+        Args:
+            url (str): The address of the poll, 'sqlite:///<path>#<poll>'.
+            print_messages (bool, optional): Whether to print messages to the console. Defaults to True.
+            collect_messages (bool, optional): Whether to record messages in the returned message lists. Defaults to True.
+            message_level (int, optional): The minimum logging level of printed and recorded messages. Defaults to logging.DEBUG.
+            snapshot_ttl (float, optional): Seconds a cached poll snapshot is reused for while `warm_window` is active. Defaults to 30.
+            concurrency (AdaptiveLimit, optional): Only used to pace resets. Defaults to a new, not persisted AdaptiveLimit.
+            snapshot_budget (int, optional): Bytes a snapshot may occupy to be cached. Defaults to 16 MiB.
+            message_limit (int, optional): The maximum number of messages kept per message list. Defaults to 1000.
+        """
+
+        super().__init__(print_messages, collect_messages, message_level, snapshot_ttl, concurrency, snapshot_budget, message_limit)
+        self.url = url
+        self.path, self.id = parse_url(url)
+        with self.__connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def __connect(self):
+        return sqlite3.connect(self.path)
+
+    @writes_poll
+    def set_url(self, url):
+        """Points the object at another local poll, creating the tables if the database is new.
+
+        Args:
+            url (str): The address of the poll, 'sqlite:///<path>#<poll>'.
+
+        Raises:
+            ValueError: If `url` is not the address of a local poll.
+
+        Returns:
+            Messages: The messages.
+        """
+        messages = self.new_messages()
+
+        self.path, self.id = parse_url(url)
+        self.url = url
+        with self.__connect() as conn:
+            conn.executescript(SCHEMA)
+        self.invalidate_snapshot()
+
+        self.log_message(messages, logging.INFO, "Changed URL to: %s", url)
+
+        return messages
+
+    def get_url(self, full=False):
+        """Returns the object's URL. A local poll has no password, so `full` makes no difference."""
+        return self.url
+
+    def _read_snapshot(self):
+        messages = self.new_messages()
+
+        with self.__connect() as conn:
+            dates = conn.execute('SELECT id, date FROM dates WHERE poll = ? ORDER BY date', (self.id,)).fetchall()
+            users = conn.execute('SELECT id, name FROM users WHERE poll = ? ORDER BY id', (self.id,)).fetchall()
+            votes = conn.execute(
+                'SELECT votes.user_id, votes.date_id, votes.vote FROM votes JOIN users ON users.id = votes.user_id WHERE users.poll = ?',
+                (self.id,)
+            ).fetchall()
+
+        columns = {date_id: index for index, (date_id, _) in enumerate(dates)}
+        rows = {user_id: bytearray([VOTE_CODES['question']]) * len(dates) for user_id, _ in users}
+        for user_id, date_id, vote in votes:
+            rows[user_id][columns[date_id]] = vote
+
+        snapshot = PollSnapshot(
+            (date for _, date in dates), (str(date_id) for date_id, _ in dates),
+            (name for _, name in users), (str(user_id) for user_id, _ in users),
+            (rows[user_id] for user_id, _ in users)
+        )
+        self.log_message(messages, logging.DEBUG, "Read local poll %s from %s", self.id, self.path)
+
+        return snapshot, messages
+
+    @writes_poll
+    def add_dates(self, dates, progress=None):
+        messages = self.new_messages()
+
+        dates_to_add, _messages = self.get_date_list(dates)
+        messages.extend(_messages)
+        # Stored like Xoyondo shows them ('2024/01/05', not '2024/1/5'), so they sort chronologically
+        dates_to_add = list(dict.fromkeys(datetime.strptime(date, '%Y/%m/%d').strftime('%Y/%m/%d') for date in dates_to_add))
+
+        with self.__connect() as conn:
+            for done, date in enumerate(dates_to_add, 1):
+                conn.execute('INSERT OR IGNORE INTO dates (poll, date) VALUES (?, ?)', (self.id, date))
+                if progress is not None:
+                    progress('date_add', done, len(dates_to_add))
+        self.log_message(messages, logging.DEBUG, "Added %s dates", len(dates_to_add))
+        self._after_write([], lambda snapshot: snapshot.with_dates(dates_to_add))
+
+        return messages
+
+    @writes_poll
+    def delete_dates(self, dates=None, progress=None):
+        messages = self.new_messages()
+
+        # Within a batch this is the shared snapshot, whose new dates have no ID yet; so dates are deleted by value
+        snapshot, _messages = self.get_snapshot(max_age=0)
+        messages.extend(_messages)
+        dates_to_delete = self._select_dates_to_delete(dates, {date: date for date in snapshot.dates}, messages)
+        if dates_to_delete is None:
+            return messages
+
+        with self.__connect() as conn:
+            for done, date in enumerate(dates_to_delete, 1):
+                conn.execute('DELETE FROM votes WHERE date_id IN (SELECT id FROM dates WHERE poll = ? AND date = ?)', (self.id, date))
+                conn.execute('DELETE FROM dates WHERE poll = ? AND date = ?', (self.id, date))
+                if progress is not None:
+                    progress('date_delete', done, len(dates_to_delete))
+        self.log_message(messages, logging.DEBUG, "Deleted %s dates", len(dates_to_delete))
+        self._after_write([], lambda snapshot: snapshot.without_date_values(dates_to_delete))
+
+        return messages
+
+    @writes_poll
+    def delete_users(self, users=None, progress=None):
+        messages = self.new_messages()
+        names = None if not users else [username.strip() for username in users.split(',')]
+
+        with self.__connect() as conn:
+            rows = conn.execute('SELECT id, name FROM users WHERE poll = ? ORDER BY id', (self.id,)).fetchall()
+            user_ids_to_delete = [user_id for user_id, name in rows if names is None or name in names]
+            if len(user_ids_to_delete) < 1:
+                self.log_message(messages, logging.WARNING, "Deletion not possible as there is no user registered.")
+            for done, user_id in enumerate(user_ids_to_delete, 1):
+                conn.execute('DELETE FROM votes WHERE user_id = ?', (user_id,))
+                conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+                if progress is not None:
+                    progress('user_delete', done, len(user_ids_to_delete))
+        self.log_message(messages, logging.DEBUG, "Deleted %s users", len(user_ids_to_delete))
+        self._after_write([], lambda snapshot: snapshot.without_users(str(user_id) for user_id in user_ids_to_delete))
+
+        return messages
+
+    @writes_poll
+    def vote(self, user, votes):
+        """Enters the votes of a user, replacing earlier votes for the same dates.
+
+        Args:
+            user (str): The name of the user. Added to the poll if it is new.
+            votes (dict): The vote ('yes', 'no', 'maybe' or 'question') per date in the format '%Y/%m/%d'. Dates that are not in the poll are ignored.
+
+        Raises:
+            ValueError: If a vote is not valid.
+
+        Returns:
+            Messages: The messages.
+        """
+        messages = self.new_messages()
+
+        for vote in votes.values():
+            if vote not in VOTE_CODES:
+                raise ValueError(f"Invalid vote: {vote}")
+
+        with self.__connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO users (poll, name) VALUES (?, ?)', (self.id, user))
+            user_id, = conn.execute('SELECT id FROM users WHERE poll = ? AND name = ?', (self.id, user)).fetchone()
+            date_ids = dict(conn.execute('SELECT date, id FROM dates WHERE poll = ?', (self.id,)))
+            conn.executemany(
+                'INSERT OR REPLACE INTO votes (user_id, date_id, vote) VALUES (?, ?, ?)',
+                ((user_id, date_ids[date], VOTE_CODES[vote]) for date, vote in votes.items() if date in date_ids)
+            )
+        self.log_message(messages, logging.DEBUG, "Entered %s votes of %s", len(votes), user)
+        self.invalidate_snapshot()
+
+        return messages
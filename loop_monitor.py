@@ -0,0 +1,158 @@
+"""Health monitor of an asyncio event loop.
+
+A task on the loop sleeps for a fixed interval and records how much later than planned it woke up.
+This scheduling delay is the time other callbacks kept the loop busy. A few milliseconds are normal;
+long delays mean a coroutine made a blocking call, which also stalls the heartbeats of the Discord gateway.
+
+In debug mode a watchdog thread additionally captures the stack of the loop thread while the loop is
+stalled, which shows the call that is blocking it.
+"""
+
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+class Stall:
+    """A period in which the event loop did not run scheduled callbacks.
+
+    Attributes:
+        started (float): When the stall was detected, as a time.time() timestamp.
+        duration (float): Seconds the loop was blocked, as far as known when the stall was recorded.
+        stack (str): The stack of the loop thread during the stall. Empty if it was not captured.
+    """
+
+    __slots__ = ('started', 'duration', 'stack')
+
+    def __init__(self, started, duration, stack=''):
+        self.started = started
+        self.duration = duration
+        self.stack = stack
+
+    def __repr__(self):
+        return f'<Stall {self.duration * 1000:.0f} ms>'
+
+class LoopMonitor:
+    """Samples the scheduling delay of the running event loop.
+
+    Attributes:
+        interval (float): Seconds between two samples.
+        threshold (float): Delay in seconds from which the loop counts as stalled.
+        debug (bool): Whether stacks of stalls are captured by a watchdog thread.
+        lags (collections.deque): The most recent delays in seconds.
+        stalls (collections.deque): The most recent stalls.
+        stall_count (int): Number of stalls since the monitor was started or reset.
+        max_lag (float): The longest delay since the monitor was started or reset.
+        samples (int): Number of samples since the monitor was started or reset.
+    """
+
+    def __init__(self, interval=0.1, threshold=0.1, debug=False, history=1000, max_stalls=20):
+        """Initialize the monitor. It starts sampling once `start` is called from within the loop.
+
+        Args:
+            interval (float, optional): Seconds between two samples. Defaults to 0.1.
+            threshold (float, optional): Delay in seconds from which the loop counts as stalled. Defaults to 0.1.
+            debug (bool, optional): Whether stacks of stalls are captured. Defaults to False.
+            history (int, optional): Number of delays kept for percentiles. Defaults to 1000.
+            max_stalls (int, optional): Number of stalls kept. Defaults to 20.
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.lags = collections.deque(maxlen=history)
+        self.stalls = collections.deque(maxlen=max_stalls)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self.samples = 0
+        self._task = None
+        self._loop_thread = None
+        self._heartbeat = time.monotonic()
+        self._watchdog = None
+        self._stall = None    # the stall the watchdog is currently observing
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts sampling on the running event loop. Does nothing if the monitor is already running."""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self.__sample())
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self.__watch, name='loop-watchdog', daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self):
+        """Forgets all samples and stalls."""
+        self.lags.clear()
+        self.stalls.clear()
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self.samples = 0
+
+    async def __sample(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - start - self.interval)
+            self.lags.append(lag)
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.stall_count += 1
+                stall, self._stall = self._stall, None
+                if stall is None:
+                    stall = Stall(time.time() - lag, lag)
+                stall.duration = lag
+                self.stalls.append(stall)
+                logger.warning("Event loop was blocked for %.0f ms%s", lag * 1000, f":\n{stall.stack}" if stall.stack else "")
+
+    def __watch(self):
+        # Runs in its own thread, so it keeps running while the loop is blocked
+        while True:
+            time.sleep(self.threshold / 2)
+            if not self.debug or not self.running:
+                continue
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked >= self.threshold and self._stall is None:
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+                self._stall = Stall(time.time() - blocked, blocked, stack)
+
+    def percentile(self, p):
+        """Returns the p-th percentile of the recent delays in seconds."""
+        if not self.lags:
+            return 0.0
+        lags = sorted(self.lags)
+        return lags[min(len(lags) - 1, int(round(p / 100 * (len(lags) - 1))))]
+
+    def metrics(self):
+        """Returns the current figures of the monitor.
+
+        Returns:
+            dict: Number of samples, delay percentiles and maximum in milliseconds, and number of stalls.
+        """
+        return {
+            'samples': self.samples,
+            'lag_p50_ms': self.percentile(50) * 1000,
+            'lag_p99_ms': self.percentile(99) * 1000,
+            'lag_max_ms': self.max_lag * 1000,
+            'stalls': self.stall_count,
+            'threshold_ms': self.threshold * 1000,
+            'debug': self.debug,
+        }
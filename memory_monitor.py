@@ -0,0 +1,142 @@
+"""Memory diagnostics of the running process.
+
+The resident set size (RSS) is read from the operating system. For details, tracemalloc can be started at
+runtime: it records where the Python objects that are alive were allocated, at the cost of some speed and
+memory while it runs. A snapshot taken when tracing started serves as baseline, so comparing with it shows
+what grew since.
+"""
+
+import os
+import sys
+import tracemalloc
+
+# Allocations of the diagnostics themselves and of the import machinery are not of interest
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def rss():
+    """Returns the resident set size of the process in bytes.
+
+    Returns:
+        int: The current RSS. Where it cannot be read (e.g. on macOS) the peak RSS, None if neither is available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, kilobytes elsewhere
+
+class Allocation:
+    """The memory allocated at one source line.
+
+    Attributes:
+        location (str): The file name and line number.
+        size (int): Bytes allocated there that are still alive, or their change since the baseline.
+        count (int): Number of blocks allocated there that are still alive, or their change since the baseline.
+    """
+
+    __slots__ = ('location', 'size', 'count')
+
+    def __init__(self, location, size, count):
+        self.location = location
+        self.size = size
+        self.count = count
+
+    @classmethod
+    def from_stat(cls, stat):
+        frame = stat.traceback[0]
+        location = f'{os.path.basename(frame.filename)}:{frame.lineno}'
+        if isinstance(stat, tracemalloc.StatisticDiff):
+            return cls(location, stat.size_diff, stat.count_diff)
+        return cls(location, stat.size, stat.count)
+
+    def __repr__(self):
+        return f'<Allocation {self.location} {self.size} bytes in {self.count} blocks>'
+
+class MemoryMonitor:
+    """Starts and stops tracemalloc and reports the largest allocations.
+
+    Attributes:
+        frames (int): Number of frames stored per allocation.
+        baseline (tracemalloc.Snapshot): The snapshot taken when tracing started, None while not tracing.
+    """
+
+    def __init__(self, frames=1):
+        """Initialize the monitor. Tracing starts with `start`.
+
+        Args:
+            frames (int, optional): Number of frames stored per allocation. More frames cost more memory. Defaults to 1.
+        """
+        self.frames = frames
+        self.baseline = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """Starts tracing and takes the baseline. Does nothing if tracing is running already."""
+        if self.tracing:
+            return
+        tracemalloc.start(self.frames)
+        self.baseline = self.__snapshot()
+
+    def stop(self):
+        """Stops tracing and frees the memory used for it."""
+        tracemalloc.stop()
+        self.baseline = None
+
+    def __snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+    def top(self, limit=10):
+        """Returns the source lines holding the most memory. Slow, as it copies all traces.
+
+        Raises:
+            RuntimeError: If tracing is not running.
+
+        Returns:
+            list: Up to `limit` Allocation objects, largest first.
+        """
+        if not self.tracing:
+            raise RuntimeError('tracemalloc is not running')
+        stats = self.__snapshot().statistics('lineno')
+        return [Allocation.from_stat(stat) for stat in stats[:limit]]
+
+    def growth(self, limit=10):
+        """Returns the source lines whose memory grew the most since tracing started. Slow, as it copies all traces.
+
+        Raises:
+            RuntimeError: If tracing is not running.
+
+        Returns:
+            list: Up to `limit` Allocation objects with the changes, largest growth first.
+        """
+        if not self.tracing or self.baseline is None:
+            raise RuntimeError('tracemalloc is not running')
+        stats = self.__snapshot().compare_to(self.baseline, 'lineno')
+        return [Allocation.from_stat(stat) for stat in stats[:limit] if stat.size_diff > 0]
+
+    def metrics(self):
+        """Returns the current figures of the process.
+
+        Returns:
+            dict: RSS, and the memory traced by tracemalloc (current and peak, 0 while not tracing) in bytes.
+        """
+        traced, traced_peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            'rss': rss(),
+            'traced': traced,
+            'traced_peak': traced_peak,
+            'tracing': self.tracing,
+        }
@@ -0,0 +1,651 @@
+"""The interface of the poll providers the bot can work with.
+
+A backend reads its poll as a PollSnapshot and changes it by adding and deleting dates and deleting users.
+Everything else (caching of snapshots, batches, counting votes, parsing dates) is shared by all backends and
+lives in PollBackend, so a new provider only implements reading and writing its poll. Xoyondo (xoyondo.py)
+scrapes xoyondo.com; LocalPoll (local_poll.py) keeps polls in a SQLite file and needs no network at all.
+"""
+
+import abc
+import asyncio
+import contextlib
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+import functools
+import threading
+import logging
+
+from adaptive_limit import AdaptiveLimit
+from poll_snapshot import VOTE_NAMES
+from singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+# Messages reach the console through `print_messages`; logging only outputs them where the application configured it
+logger.addHandler(logging.NullHandler())
+
+def writes_poll(method):
+    """Serializes calls of methods that change the poll, so concurrent writes from several threads cannot interleave."""
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    
+    return wrapper
+
+class Messages:
+    """A list of log messages that are only formatted when they are read.
+    
+    Messages below `level` or messages logged while the list is disabled are dropped right away,
+    so building the message list costs nothing if nobody is going to read it. Beyond `limit` messages
+    the oldest ones are dropped, so bulk operations on large polls cannot fill the memory with messages.
+    
+    Attributes:
+        level (int): The minimum logging level of messages that are kept.
+        enabled (bool): Whether messages are recorded at all.
+        limit (int): The maximum number of messages kept. None if there is no limit.
+        dropped (int): The number of messages dropped because of `limit`.
+    """
+    
+    __slots__ = ('level', 'enabled', 'limit', 'dropped', '_records')
+    
+    def __init__(self, level=logging.DEBUG, enabled=True, limit=None):
+        """Initialize an empty message list.
+
+        Args:
+            level (int, optional): The minimum logging level of messages that are kept. Defaults to logging.DEBUG.
+            enabled (bool, optional): Whether messages are recorded at all. Defaults to True.
+            limit (int, optional): The maximum number of messages kept. Defaults to None (no limit).
+        """
+        
+        self.level = level
+        self.enabled = enabled
+        self.limit = limit
+        self.dropped = 0
+        self._records = deque(maxlen=limit)
+    
+    def __add(self, record):
+        if self.limit is not None and len(self._records) >= self.limit:
+            self.dropped += 1
+        self._records.append(record)
+    
+    def log(self, level, msg, *args):
+        """Records a message without formatting it.
+
+        Args:
+            level (int): The logging level of the message.
+            msg (str): The message, optionally containing %-style placeholders.
+            *args: The arguments for the placeholders in `msg`.
+        """
+        
+        if self.enabled and level >= self.level:
+            self.__add((level, msg, args))
+    
+    def append(self, message, level=logging.INFO):
+        """Records an already formatted message.
+
+        Args:
+            message (str): The message.
+            level (int, optional): The logging level of the message. Defaults to logging.INFO.
+        """
+        
+        self.log(level, '%s', message)
+    
+    def extend(self, other):
+        """Adds all messages of another message list (or any iterable of strings).
+
+        Args:
+            other (Messages | iterable): The messages to be added.
+        """
+        
+        if not self.enabled:
+            return
+        if isinstance(other, Messages):
+            self.dropped += other.dropped
+            for record in other._records:
+                if record[0] >= self.level:
+                    self.__add(record)
+        else:
+            for message in other:
+                self.append(message)
+    
+    def records(self):
+        """Returns the raw, unformatted records.
+
+        Returns:
+            list: A list of (level, msg, args) tuples.
+        """
+        
+        return list(self._records)
+    
+    def __iter__(self):
+        if self.dropped:
+            yield f'... {self.dropped} earlier messages dropped'
+        for _, msg, args in self._records:
+            yield msg % args if args else msg
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def __bool__(self):
+        return bool(self._records)
+    
+    def __repr__(self):
+        return f'Messages({list(self)!r})'
+
+class PollBackend(abc.ABC):
+    """A poll of some provider.
+    
+    Subclasses implement `_read_snapshot`, `add_dates`, `delete_dates`, `delete_users`, `set_url` and `get_url`,
+    set `id` to a name that identifies the poll, and decorate their writes with `writes_poll`.
+    
+    Attributes:
+        id (str): Identifies the poll, e.g. for locking it.
+        print_messages (bool): Whether messages are printed to the console.
+        collect_messages (bool): Whether messages are recorded in the returned message lists.
+        message_level (int): The minimum logging level of printed and recorded messages.
+        snapshot_ttl (float): Seconds a cached poll snapshot is reused for while `warm_window` is active.
+        warm_window (object): Something with an `active` flag, e.g. a prefetcher.Prefetcher. Only while it is active do reads reuse a cached snapshot by default; otherwise they read the poll anew. None if there is no window.
+        snapshot_budget (int): Bytes a snapshot may occupy to be cached. Larger snapshots are read again every time. None if there is no budget.
+        message_limit (int): The maximum number of messages kept per message list. None if there is no limit.
+        concurrency (AdaptiveLimit): Limits the parallel requests of bulk operations.
+    """
+    
+    id = None
+    warm_window = None
+    
+    def __init__(self, print_messages = True, collect_messages = True, message_level = logging.DEBUG, snapshot_ttl = 30, concurrency = None, snapshot_budget = 16 * 2**20, message_limit = 1000):
+        """Initialize the state shared by all backends.
+
+        Args:
+            print_messages (bool, optional): Whether to print messages to the console. Defaults to True.
+            collect_messages (bool, optional): Whether to record messages in the returned message lists. Defaults to True.
+            message_level (int, optional): The minimum logging level of printed and recorded messages. Defaults to logging.DEBUG.
+            snapshot_ttl (float, optional): Seconds a cached poll snapshot is reused for while `warm_window` is active. Defaults to 30.
+            concurrency (AdaptiveLimit, optional): Limits the parallel requests of bulk operations. Defaults to a new, not persisted AdaptiveLimit.
+            snapshot_budget (int, optional): Bytes a snapshot may occupy to be cached. Defaults to 16 MiB.
+            message_limit (int, optional): The maximum number of messages kept per message list. Defaults to 1000.
+        """
+        
+        self._write_lock = threading.RLock()
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot = None
+        self._async_flights = AsyncSingleFlight()
+        self.snapshot_budget = snapshot_budget
+        self.concurrency = concurrency if concurrency is not None else AdaptiveLimit()
+        self._batch = threading.local()
+        self.print_messages = print_messages
+        self.collect_messages = collect_messages
+        self.message_level = message_level
+        self.message_limit = message_limit
+    
+    @abc.abstractmethod
+    def set_url(self, url):
+        """Points the object at another poll.
+
+        Args:
+            url (str): The address of the poll, in the format of the backend.
+
+        Raises:
+            ValueError: If the backend cannot handle `url`.
+
+        Returns:
+            Messages: The messages.
+        """
+    
+    @abc.abstractmethod
+    def get_url(self, full=False):
+        """Returns the address of the poll.
+
+        Args:
+            full (bool, optional): Whether to include secrets like the admin password. Defaults to False.
+
+        Returns:
+            str: The address of the poll.
+        """
+    
+    @abc.abstractmethod
+    def _read_snapshot(self):
+        """Reads the poll, bypassing the cache.
+
+        Returns:
+            tuple: The PollSnapshot and the messages.
+        """
+    
+    @abc.abstractmethod
+    def add_dates(self, dates, progress=None):
+        """Adds dates to the poll. Must update the cached snapshot with `_after_write`.
+
+        Args:
+            dates (str): Dates and date ranges ('start:end') separated by commas, in the format '%Y/%m/%d'.
+            progress (callable, optional): Called as progress(operation, done, total) after every date. Defaults to None.
+
+        Raises:
+            ValueError: If a date is invalid.
+
+        Returns:
+            Messages: The messages.
+        """
+    
+    @abc.abstractmethod
+    def delete_dates(self, dates=None, progress=None):
+        """Deletes dates from the poll; one date is always left. Must update the cached snapshot with `_after_write`.
+
+        Args:
+            dates (str, optional): Dates, indices and ranges of both separated by commas (see `_select_dates_to_delete`). Defaults to all dates but the last.
+            progress (callable, optional): Called as progress(operation, done, total) after every date. Defaults to None.
+
+        Raises:
+            ValueError: If a date or index is invalid or not in the poll.
+
+        Returns:
+            Messages: The messages.
+        """
+    
+    @abc.abstractmethod
+    def delete_users(self, users=None, progress=None):
+        """Deletes users and their votes from the poll. Must update the cached snapshot with `_after_write`.
+
+        Args:
+            users (str, optional): Names of the users separated by commas. Defaults to all users.
+            progress (callable, optional): Called as progress(operation, done, total) after every user. Defaults to None.
+
+        Returns:
+            Messages: The messages.
+        """
+    
+    def get_date_list(self, start, end=None):    # throws ValueError
+        """Generate a list of dates in the format '%Y/%m/%d' between two given dates (inclusive).
+        
+        If only `start` is given, it is read as a comma separated list of dates and date ranges ('start:end').
+
+        Args:
+            start (str): The starting date in the format '%Y/%m/%d'.
+            end (str, optional): The ending date in the format '%Y/%m/%d'. Defaults to None.
+
+        Returns:
+            list: A list of dates as strings in the format '%Y/%m/%d' from the start date to the end date, inclusive.
+        """
+        if end is None:
+            return self._parse_date_list(start)
+        
+        messages = self.new_messages()
+        
+        start = str(start)
+        end = str(end)
+        
+        try:
+            start_date = datetime.strptime(start, '%Y/%m/%d')
+        except ValueError:
+            raise ValueError(f"Invalid start date: {start}")
+        try:
+            end_date = datetime.strptime(end, '%Y/%m/%d')
+        except ValueError:
+            raise ValueError(f"Invalid end date: {end}")
+        
+        delta = end_date - start_date
+        date_list = [(start_date + timedelta(days=i)).strftime('%Y/%m/%d') for i in range(delta.days + 1)]
+        self.log_message(messages, logging.DEBUG, "Generated date list from %s to %s", start, end)
+        
+        return date_list, messages
+        
+    def _parse_date_list(self, dates):    # throws ValueError
+        
+        messages = self.new_messages()
+        
+        dates = str(dates)
+        if "," in dates or ":" in dates:
+            parts = dates.split(",")
+            dates = []
+            for part in parts:
+                if ":" in part:
+                    start, end = [x.strip() for x in part.split(":")]
+                    dates_buf, _messages = self.get_date_list(start, end)
+                    dates.extend(dates_buf)
+                    messages.extend(_messages)
+                    self.log_message(messages, logging.DEBUG, "Added date list from %s to %s to date list", start, end)
+                else:
+                    try:
+                        _ = datetime.strptime(part.strip(), '%Y/%m/%d')
+                        dates.append(part.strip())
+                        self.log_message(messages, logging.DEBUG, "Added date %s to date list", part.strip())
+                    except ValueError:
+                        raise ValueError(f"Invalid date: {part.strip()}")
+        else:
+            try:
+                _ = datetime.strptime(dates.strip(), '%Y/%m/%d')
+                dates = [dates.strip()]
+                self.log_message(messages, logging.DEBUG, "Added date %s to date list", dates[0])
+            except ValueError:
+                raise ValueError(f"Invalid date: {dates.strip()}")
+            
+        return dates, messages
+    
+
+    def get_snapshot(self, max_age=None):  # throws HTTPError
+        """Returns a snapshot of the poll, reusing the cached one if it is recent enough.
+
+        Args:
+            max_age (float, optional): The maximum age of a cached snapshot in seconds. Defaults to `default_max_age()`.
+
+        Raises:
+            HTTPError: If the backend cannot read the poll (e.g., a 404 Not Found error of Xoyondo).
+
+        Returns:
+            tuple: The PollSnapshot and the messages.
+        """
+        
+        messages = self.new_messages()
+        max_age = self.default_max_age() if max_age is None else max_age
+        
+        snapshot = self._snapshot
+        if snapshot is not None and self.in_batch():
+            self.log_message(messages, logging.DEBUG, "Using the snapshot shared by the batch")
+            return snapshot, messages
+        if snapshot is not None and snapshot.age() <= max_age:
+            self.log_message(messages, logging.DEBUG, "Using cached snapshot from %.1f seconds ago", snapshot.age())
+            return snapshot, messages
+        
+        snapshot, _messages = self._read_snapshot()
+        messages.extend(_messages)
+        # A batch needs its snapshot whatever its size; it is dropped when the batch ends
+        if self.snapshot_budget is None or self.in_batch() or snapshot.nbytes() <= self.snapshot_budget:
+            self._snapshot = snapshot
+        else:
+            self._snapshot = None
+            self.log_message(messages, logging.WARNING, "Snapshot of %s bytes exceeds the budget of %s bytes and is not cached", snapshot.nbytes(), self.snapshot_budget)
+        self.log_message(messages, logging.DEBUG, "Created snapshot with %s dates and %s users", len(snapshot.dates), len(snapshot.users))
+        
+        return snapshot, messages
+    
+    async def get_snapshot_async(self, max_age=None):  # throws HTTPError
+        """Like `get_snapshot`, but reads the poll without blocking the event loop.
+        
+        Coroutines that need the poll at the same time share one read, so a burst of commands does not
+        occupy a thread each while waiting for the same page.
+
+        Args:
+            max_age (float, optional): The maximum age of a cached snapshot in seconds. Defaults to `default_max_age()`.
+
+        Raises:
+            HTTPError: If the backend cannot read the poll (e.g., a 404 Not Found error of Xoyondo).
+
+        Returns:
+            tuple: The PollSnapshot and the messages.
+        """
+        
+        messages = self.new_messages()
+        max_age = self.default_max_age() if max_age is None else max_age
+        
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age() <= max_age:
+            self.log_message(messages, logging.DEBUG, "Using cached snapshot from %.1f seconds ago", snapshot.age())
+            return snapshot, messages
+        
+        (snapshot, _messages), shared = await self._async_flights.do('snapshot', asyncio.to_thread, self.get_snapshot, max_age)
+        # Every caller gets its own list, the shared one is read by all of them
+        messages.extend(_messages)
+        if shared:
+            self.log_message(messages, logging.DEBUG, "Shared the read of the poll with a concurrent caller")
+        
+        return snapshot, messages
+    
+    def default_max_age(self):
+        """The maximum age of a cached snapshot that reads accept unless they ask for another one.
+        
+        Commands show the poll as it is, so a vote entered just before `!tf_chart` is in the chart. Only while
+        `warm_window` is active, e.g. during the burst of requests after a reset, is a snapshot up to `snapshot_ttl`
+        old good enough. Batches reuse their shared snapshot either way.
+
+        Returns:
+            float: Seconds.
+        """
+        window = self.warm_window
+        return self.snapshot_ttl if window is not None and window.active else 0
+    
+    def invalidate_snapshot(self):
+        """Drops the cached snapshot, e.g. after the poll was changed."""
+        
+        self._snapshot = None
+    
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager that runs a sequence of operations of the current thread against one shared snapshot.
+        
+        The poll is read once when the first operation needs it. Within the batch, reads reuse this snapshot
+        regardless of its age, and writes that succeeded update it to the known outcome instead of dropping it,
+        so operations after a write need no further requests. Writes of other threads wait until the batch is done.
+        """
+        with self._write_lock:
+            outermost = not self.in_batch()
+            if outermost:
+                self.invalidate_snapshot()  # start from the current poll
+            self._batch.depth = getattr(self._batch, 'depth', 0) + 1
+            try:
+                yield self
+            finally:
+                self._batch.depth -= 1
+                if outermost:
+                    # The shared snapshot may contain guessed state (e.g. unknown date IDs)
+                    self.invalidate_snapshot()
+    
+    def in_batch(self):
+        """Whether the current thread runs a batch (see `batch`)."""
+        return getattr(self._batch, 'depth', 0) > 0
+    
+    def _after_write(self, failed, update):
+        """Updates the shared snapshot of a batch to the outcome of a write, or drops the cached snapshot.
+
+        Args:
+            failed (list): The items whose requests failed. The outcome is unknown if there are any.
+            update (callable): Returns the snapshot after the write, given the one before.
+        """
+        if self.in_batch() and self._snapshot is not None and not failed:
+            self._snapshot = update(self._snapshot)
+        else:
+            self.invalidate_snapshot()
+    
+    def new_messages(self):
+        """Creates an empty message list that honours the object's message settings.
+
+        Returns:
+            Messages: An empty message list. It only records messages if `collect_messages` is set.
+        """
+        
+        return Messages(self.message_level, self.collect_messages, self.message_limit)
+    
+    def log_message(self, list_of_messages, level, msg, *args):
+        """Adds a message to a list of messages and prints it to the console if requested.
+        
+        The message is formatted lazily (`msg % args`), so nothing is formatted unless the message is printed
+        or a consumer reads the list.
+
+        Args:
+            list_of_messages (Messages): The list of messages to which the new message should be added.
+            level (int): The logging level of the message (e.g. logging.DEBUG).
+            msg (str): The message, optionally containing %-style placeholders.
+            *args: The arguments for the placeholders in `msg`.
+        """
+        
+        list_of_messages.log(level, msg, *args)
+        if self.print_messages and level >= self.message_level:
+            print(msg % args if args else msg)
+        if logger.isEnabledFor(level):
+            logger.log(level, msg, *args)
+    
+
+    def _select_dates_to_delete(self, dates, date_to_id, messages):
+        """Resolves the dates, indices and ranges given to `delete_dates` to date IDs.
+
+        Returns:
+            list: The IDs of the dates to delete, or None if there is only one date left.
+        """
+        dates_to_delete = []
+        
+        if len(date_to_id) <= 1:
+            self.log_message(messages, logging.WARNING, "Deletion not possible as there is only one date left.")
+            return None
+        elif dates is None:
+            dates_to_delete = list(date_to_id.values())
+            self.log_message(messages, logging.WARNING, "Full deletion not possible as there will be '%s' left.", list(date_to_id.keys())[-1])
+        else:
+            dates = str(dates)
+            if "," in dates or ":" in dates:
+                parts = dates.split(",")
+                for part in parts:
+                    if ":" in part:
+                        start, end = [x.strip() for x in part.split(":")]
+                        
+                        # Check if the range is valid
+                        if start.replace('-', '').isdigit() and end.replace('-', '').isdigit():
+                            # at least one negative number
+
+                            try:
+                                start = int(start)
+                            except ValueError:
+                                raise ValueError(f"Invalid index: {start.strip()}")   
+                             
+                            try:
+                                end = int(end)
+                            except ValueError:
+                                raise ValueError(f"Invalid index: {end.strip()}")    
+                                
+                            if start < 0:
+                                start = len(date_to_id) + start
+                            if len(date_to_id) <= start or start < 0:
+                                raise ValueError(f"Index {start} out of range.")
+                            if end < 0:
+                                end = len(date_to_id) + end
+                            if len(date_to_id) <= end or end < 0:
+                                raise ValueError(f"Index {end} out of range.")
+
+                            if start <= end:
+                                dates_to_delete.extend(date_to_id[date] for i, date in enumerate(date_to_id.keys()) if start <= i <= end)
+                                self.log_message(messages, logging.DEBUG, "Added dates from %s to %s to deletion list", list(date_to_id.keys())[start], list(date_to_id.keys())[end])
+                            else:
+                                raise ValueError(f"Start index must be less than or equal to end index. Given: {start}:{end}")
+                                
+                        else:
+                            # dates
+                            dates, _messages = self.get_date_list(start, end)
+                            messages.extend(_messages)
+                            for date in dates:
+                                if date.strip() in date_to_id:
+                                    dates_to_delete.append(date_to_id[date.strip()])
+                                    self.log_message(messages, logging.DEBUG, "Added date %s to deletion list", date.strip())
+                                else:
+                                    raise ValueError(f"No such date to delete: {date.strip()}")
+                    else:
+                        if part.replace('-', '').isdigit():
+                            try:
+                                index = int(part)
+                                
+                                if -len(date_to_id) <= index < len(date_to_id):
+                                    dates_to_delete.append(date_to_id[list(date_to_id.keys())[index if index > 0 else index]])
+                                    self.log_message(messages, logging.DEBUG, "Added date %s to deletion list", list(date_to_id.keys())[index if index > 0 else index])
+                                else:
+                                    raise ValueError(f"Index {index} out of range.")
+                            except ValueError:
+                                raise ValueError(f"Invalid index: {part.strip()}")
+                        elif part.strip() in date_to_id:
+                            dates_to_delete.append(date_to_id[part.strip()])
+                            self.log_message(messages, logging.DEBUG, "Added date %s to deletion list", part.strip())
+                        else:
+                            raise ValueError(f"No such date to delete: {part.strip()}")
+            else:
+                if dates.replace('-', '').isdigit():    
+                    try:
+                        index = int(dates)
+                        
+                        if -len(date_to_id) <= index < len(date_to_id):
+                            dates_to_delete.append(date_to_id[list(date_to_id.keys())[index if index > 0 else index]])
+                            self.log_message(messages, logging.DEBUG, "Added date %s to deletion list", list(date_to_id.keys())[index if index > 0 else index])
+                        else:
+                            raise ValueError(f"Index {index} out of range.")
+                    except ValueError:
+                        raise ValueError(f"Invalid index: {dates.strip()}")
+                elif dates.strip() in date_to_id:
+                    dates_to_delete.append(date_to_id[dates.strip()])
+                    self.log_message(messages, logging.DEBUG, "Added date %s to deletion list", dates.strip())
+                else:
+                    raise ValueError(f"No such date to delete: {dates.strip()}")
+        
+        dates_to_delete = list(OrderedDict.fromkeys(dates_to_delete))  # Remove duplicates while maintaining order
+        
+        remaining_dates = set(date_to_id.values()) - set(dates_to_delete)
+        if len(remaining_dates) < 1:
+            self.log_message(messages, logging.WARNING, "Deletion will result in only one date being left. It is thus not possible.")
+            dates_to_delete = dates_to_delete[:-1]
+        
+        return dates_to_delete
+    
+    def _count_votes(self, snapshot):
+        """Counts the votes per date of a snapshot, in the format of `get_votes_by_date`."""
+        results = []
+        for index, date in enumerate(snapshot.dates):
+            column = [row[index] for row in snapshot.votes if index < len(row)]
+            if not column:
+                continue    # like the poll page, which has no vote cells without users
+            counts = {name: 0 for name in VOTE_NAMES}
+            for code in column:
+                counts[VOTE_NAMES[code]] += 1
+            results.append({
+                'date': date,
+                'yes_count': counts['yes'],
+                'no_count': counts['no'],
+                'maybe_count': counts['maybe'],
+                'question_count': counts['question']
+            })
+        return results
+    
+    def get_votes_by_date(self, dates = None, snapshot = None):
+        """Counts the votes per date.
+
+        Args:
+            dates (str, optional): Dates and date ranges ('start:end') separated by commas. Dates of a range that are not in the poll are skipped. Defaults to all dates.
+            snapshot (PollSnapshot, optional): The poll to count. Defaults to the cached or a fresh snapshot.
+
+        Raises:
+            ValueError: If a single date is not in the poll.
+
+        Returns:
+            tuple: A list of dicts with 'date', 'yes_count', 'no_count', 'maybe_count' and 'question_count' in poll order, and the messages.
+        """
+        
+        if snapshot is None:
+            snapshot, messages = self.get_snapshot()
+        else:
+            messages = self.new_messages()
+        votes = self._count_votes(snapshot)
+        if not dates:
+            return votes, messages
+        
+        selected, _messages = self._select_dates(dates, snapshot.dates)
+        messages.extend(_messages)
+        selected = set(selected)
+        
+        return [vote for vote in votes if vote['date'] in selected], messages
+    
+    def _select_dates(self, dates, poll_dates):    # throws ValueError
+        """Resolves dates and date ranges ('start:end') separated by commas to the dates of the poll.
+
+        Returns:
+            tuple: The selected dates without duplicates and the messages.
+        """
+        messages = self.new_messages()
+        selected = []
+        
+        for part in str(dates).split(","):
+            if ":" in part:
+                start, end = [x.strip() for x in part.split(":")]
+                date_list, _messages = self.get_date_list(start, end)
+                messages.extend(_messages)
+                selected.extend(date for date in date_list if date in poll_dates)
+                self.log_message(messages, logging.DEBUG, "Selected dates from %s to %s", start, end)
+            elif part.strip() in poll_dates:
+                selected.append(part.strip())
+                self.log_message(messages, logging.DEBUG, "Selected date %s", part.strip())
+            else:
+                raise ValueError(f"Invalid date: {part.strip()}")
+        
+        return list(dict.fromkeys(selected)), messages
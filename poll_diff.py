@@ -0,0 +1,110 @@
+"""Differences between two poll snapshots."""
+
+from poll_snapshot import VOTE_NAMES
+
+class PollDiff:
+    """The changes between two snapshots of a poll.
+    
+    Dates are identified by their date, users by their Xoyondo ID (or their name if there is none).
+    
+    Attributes:
+        added_dates (list): Dates only in the new snapshot.
+        removed_dates (list): Dates only in the old snapshot.
+        added_users (list): Names of the users only in the new snapshot.
+        removed_users (list): Names of the users only in the old snapshot.
+        changed_votes (list): (user, date, old vote, new vote) tuples for users and dates in both snapshots.
+    """
+    
+    __slots__ = ('added_dates', 'removed_dates', 'added_users', 'removed_users', 'changed_votes')
+    
+    def __init__(self, added_dates=(), removed_dates=(), added_users=(), removed_users=(), changed_votes=()):
+        self.added_dates = list(added_dates)
+        self.removed_dates = list(removed_dates)
+        self.added_users = list(added_users)
+        self.removed_users = list(removed_users)
+        self.changed_votes = list(changed_votes)
+    
+    @property
+    def structure_changed(self):
+        """Whether dates or users were added or removed."""
+        return bool(self.added_dates or self.removed_dates or self.added_users or self.removed_users)
+    
+    def __bool__(self):
+        return self.structure_changed or bool(self.changed_votes)
+    
+    def __len__(self):
+        return len(self.added_dates) + len(self.removed_dates) + len(self.added_users) + len(self.removed_users) + len(self.changed_votes)
+    
+    def __repr__(self):
+        return (f'PollDiff(+{len(self.added_dates)}/-{len(self.removed_dates)} dates, '
+                f'+{len(self.added_users)}/-{len(self.removed_users)} users, {len(self.changed_votes)} changed votes)')
+    
+    def summary(self):
+        """Returns a short, human readable description of the changes.
+
+        Returns:
+            list: One line per kind of change.
+        """
+        lines = []
+        if self.added_dates:
+            lines.append(f"Added dates: {', '.join(self.added_dates)}")
+        if self.removed_dates:
+            lines.append(f"Removed dates: {', '.join(self.removed_dates)}")
+        if self.added_users:
+            lines.append(f"Added users: {', '.join(self.added_users)}")
+        if self.removed_users:
+            lines.append(f"Removed users: {', '.join(self.removed_users)}")
+        for user, date, old, new in self.changed_votes:
+            lines.append(f"{user} changed {date} from {old} to {new}")
+        return lines
+
+def user_keys(snapshot):
+    """Returns the keys identifying the users of a snapshot across snapshots."""
+    return [user_id if user_id is not None else name for user_id, name in zip(snapshot.user_ids, snapshot.users)]
+
+def diff_snapshots(old, new):
+    """Computes the changes between two snapshots in time linear in the number of vote cells.
+    
+    Identical snapshots are detected by their digest without looking at single cells.
+
+    Args:
+        old (PollSnapshot): The older snapshot.
+        new (PollSnapshot): The newer snapshot.
+
+    Returns:
+        PollDiff: The changes from `old` to `new`.
+    """
+    if old is new or old.digest() == new.digest():
+        return PollDiff()
+    
+    old_dates = {date: i for i, date in enumerate(old.dates)}
+    new_dates = {date: i for i, date in enumerate(new.dates)}
+    old_users = {key: i for i, key in enumerate(user_keys(old))}
+    new_users = {key: i for i, key in enumerate(user_keys(new))}
+    
+    diff = PollDiff(
+        [date for date in new.dates if date not in old_dates],
+        [date for date in old.dates if date not in new_dates],
+        [new.users[i] for key, i in new_users.items() if key not in old_users],
+        [old.users[i] for key, i in old_users.items() if key not in new_users]
+    )
+    
+    # (old column, new column) of every date in both snapshots
+    common_dates = [(old_dates[date], new_dates[date], date) for date in new.dates if date in old_dates]
+    same_columns = old.dates == new.dates
+    
+    for key, new_row in new_users.items():
+        old_row = old_users.get(key)
+        if old_row is None:
+            continue
+        old_votes, new_votes = old.votes[old_row], new.votes[new_row]
+        if same_columns and old_votes == new_votes:
+            continue
+        name = new.users[new_row]
+        for old_col, new_col, date in common_dates:
+            old_vote = old_votes[old_col] if old_col < len(old_votes) else 0
+            new_vote = new_votes[new_col] if new_col < len(new_votes) else 0
+            if old_vote != new_vote:
+                diff.changed_votes.append((name, date, VOTE_NAMES[old_vote], VOTE_NAMES[new_vote]))
+    
+    return diff
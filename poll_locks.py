@@ -0,0 +1,127 @@
+"""Per-poll concurrency control for bot commands.
+
+Read commands of a poll run concurrently, write commands are serialized and identical writes that are
+requested while one of them is still pending are executed only once.
+"""
+
+import asyncio
+import contextlib
+
+class ReadWriteLock:
+    """An asyncio lock that admits many readers or a single writer. Waiting writers are preferred over new readers."""
+    
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    @property
+    def readers(self):
+        return self._readers
+    
+    @property
+    def locked(self):
+        return self._writer
+    
+    async def acquire_read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+    
+    async def release_read(self):
+        async with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+    
+    async def acquire_write(self):
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+    
+    async def release_write(self):
+        async with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+    
+    @contextlib.asynccontextmanager
+    async def read(self):
+        await self.acquire_read()
+        try:
+            yield
+        finally:
+            await self.release_read()
+    
+    @contextlib.asynccontextmanager
+    async def write(self):
+        await self.acquire_write()
+        try:
+            yield
+        finally:
+            await self.release_write()
+
+class PollLocks:
+    """Read/write locks for every poll plus coalescing of identical writes."""
+    
+    def __init__(self):
+        self._locks = {}
+        self._writes = {}
+    
+    def lock(self, poll):
+        """Returns the lock of a poll.
+
+        Args:
+            poll (hashable): Identifies the poll, e.g. the object the bot reads and writes it through. It must not
+                change while the poll is in use, so not its Xoyondo ID, which `set_url` changes.
+
+        Returns:
+            ReadWriteLock: The lock of the poll.
+        """
+        lock = self._locks.get(poll)
+        if lock is None:
+            lock = self._locks[poll] = ReadWriteLock()
+        return lock
+    
+    def read(self, poll):
+        """Returns an async context manager holding the read lock of a poll."""
+        return self.lock(poll).read()
+    
+    async def write(self, poll, key, coro_fn, *args, **kwargs):
+        """Runs a write under the write lock of a poll.
+        
+        If an identical write (same poll and key) is already pending or running, its result is shared instead
+        of running the write again. Cancelling a caller does not cancel the shared write.
+
+        Args:
+            poll (hashable): Identifies the poll, e.g. the object the bot reads and writes it through. It must not
+                change while the poll is in use, so not its Xoyondo ID, which `set_url` changes.
+            key (hashable): Identifies identical writes, e.g. the command and its arguments.
+            coro_fn (callable): A function returning an awaitable that performs the write.
+            *args: Positional arguments for `coro_fn`.
+            **kwargs: Keyword arguments for `coro_fn`.
+
+        Returns:
+            tuple: The result of the write and whether it was shared with another caller.
+        """
+        write_key = (poll, key)
+        task = self._writes.get(write_key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(self.__locked_write(poll, coro_fn, *args, **kwargs))
+            self._writes[write_key] = task
+            task.add_done_callback(lambda _: self._writes.pop(write_key, None))
+        
+        return await asyncio.shield(task), shared
+    
+    async def __locked_write(self, poll, coro_fn, *args, **kwargs):
+        async with self.lock(poll).write():
+            return await coro_fn(*args, **kwargs)
+    
+    def pending_writes(self):
+        """Returns the number of writes that are pending or running."""
+        return len(self._writes)
@@ -0,0 +1,188 @@
+"""Parsed, immutable copies of a Xoyondo poll."""
+
+import hashlib
+import sys
+import time
+
+VOTE_NAMES = ('question', 'no', 'maybe', 'yes')
+VOTE_CODES = {name: code for code, name in enumerate(VOTE_NAMES)}
+VOTE_CLASSES = {
+    'table-question-cell': VOTE_CODES['question'],
+    'table-danger-cell': VOTE_CODES['no'],
+    'table-warning-cell': VOTE_CODES['maybe'],
+    'table-success-cell': VOTE_CODES['yes']
+}
+
+class PollSnapshot:
+    """A parsed copy of a poll at one point in time.
+    
+    Votes are stored as one row of vote codes (see VOTE_CODES) per user, so the whole poll can be turned
+    into a users x dates matrix without touching the HTML again.
+    
+    Attributes:
+        dates (tuple): The dates of the poll in the format '%Y/%m/%d', in poll order.
+        date_ids (tuple): The Xoyondo IDs of the dates.
+        users (tuple): The names of the users, in poll order.
+        user_ids (tuple): The Xoyondo IDs of the users.
+        votes (tuple): One bytes object per user containing a vote code per date.
+        fetched_at (float): The time (time.time()) the poll was read.
+    """
+    
+    __slots__ = ('dates', 'date_ids', 'users', 'user_ids', 'votes', 'fetched_at', '_matrix', '_digest')
+    
+    def __init__(self, dates, date_ids, users, user_ids, votes, fetched_at=None):
+        self.dates = tuple(dates)
+        self.date_ids = tuple(date_ids)
+        self.users = tuple(users)
+        self.user_ids = tuple(user_ids)
+        self.votes = tuple(bytes(row) for row in votes)
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self._matrix = None
+        self._digest = None
+    
+    @classmethod
+    def from_html(cls, html):
+        """Parses a poll page.
+
+        Args:
+            html (BeautifulSoup): The parsed poll page.
+
+        Returns:
+            PollSnapshot: The snapshot of the poll.
+        """
+        date_elements = html.find_all('i', {'class': 'fa fa-edit js-date-edit-cal text-warning pointer mx-1'})
+        date_to_id = {el['data-date']: el['data-dateid'] for el in date_elements}
+        
+        users, user_ids, votes = [], [], []
+        for user_row in html.find_all('tr', class_='js-user-rows'):
+            user_name_element = user_row.find('td', {'class': 'table-user-cell'})
+            if not user_name_element:
+                continue
+            vote_columns = user_row.find_all('td', {'class': list(VOTE_CLASSES)})
+            users.append(list(user_name_element.stripped_strings)[-1])
+            user_ids.append(user_row.get('data-userid'))
+            votes.append(bytes(cls.__vote_code(column['class']) for column in vote_columns))
+        
+        return cls(date_to_id.keys(), date_to_id.values(), users, user_ids, votes)
+    
+    @staticmethod
+    def __vote_code(classes):
+        for css_class in classes:
+            if css_class in VOTE_CLASSES:
+                return VOTE_CLASSES[css_class]
+        return VOTE_CODES['question']
+    
+    def matrix(self):
+        """Returns the votes as a users x dates matrix of vote codes.
+
+        Returns:
+            numpy.ndarray: A read-only uint8 matrix. Missing votes are filled with the code for 'question'.
+        """
+        if self._matrix is None:
+            import numpy as np  # imported on first use, as numpy is slow to import
+            
+            matrix = np.full((len(self.users), len(self.dates)), VOTE_CODES['question'], dtype=np.uint8)
+            for row, user_votes in enumerate(self.votes):
+                count = min(len(user_votes), len(self.dates))
+                matrix[row, :count] = np.frombuffer(user_votes, dtype=np.uint8, count=count)
+            matrix.setflags(write=False)
+            self._matrix = matrix
+        return self._matrix
+    
+    def vote(self, user, date):
+        """Returns the vote of a user for a date.
+
+        Args:
+            user (int): The index of the user.
+            date (int): The index of the date.
+
+        Returns:
+            str: 'yes', 'maybe', 'no' or 'question'.
+        """
+        row = self.votes[user]
+        return VOTE_NAMES[row[date]] if date < len(row) else 'question'
+    
+    def digest(self):
+        """Returns a digest of the dates, users and votes. Snapshots with equal content have equal digests.
+
+        Returns:
+            bytes: The digest.
+        """
+        if self._digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            for values in (self.dates, self.date_ids, self.users, self.user_ids):
+                h.update(repr(values).encode('utf-8'))
+            for row in self.votes:
+                h.update(len(row).to_bytes(4, 'little'))
+                h.update(row)
+            self._digest = h.digest()
+        return self._digest
+    
+    def dates_digest(self):
+        """Returns a digest of the dates and their IDs only, which votes and new users leave unchanged.
+
+        Returns:
+            bytes: The digest.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((self.dates, self.date_ids)).encode('utf-8'))
+        return h.digest()
+    
+    def with_dates(self, dates):
+        """Returns the snapshot the poll has after `dates` were added. The IDs of the new dates are unknown (None).
+
+        Args:
+            dates (iterable): The added dates in the format '%Y/%m/%d'.
+
+        Returns:
+            PollSnapshot: The expected snapshot. Dates are in chronological order like on Xoyondo, new dates have no votes.
+        """
+        ids = dict(zip(self.dates, self.date_ids))
+        for date in dates:
+            ids.setdefault(date, None)
+        new_dates = sorted(ids)
+        
+        columns = {date: index for index, date in enumerate(self.dates)}
+        question = VOTE_CODES['question']
+        votes = [
+            bytes(row[columns[date]] if date in columns and columns[date] < len(row) else question for date in new_dates)
+            for row in self.votes
+        ]
+        return PollSnapshot(new_dates, (ids[date] for date in new_dates), self.users, self.user_ids, votes, self.fetched_at)
+    
+    def without_dates(self, date_ids):
+        """Returns the snapshot the poll has after the dates with the given IDs were deleted."""
+        date_ids = set(date_ids)
+        return self.__keep_dates([index for index, date_id in enumerate(self.date_ids) if date_id not in date_ids])
+    
+    def without_date_values(self, dates):
+        """Returns the snapshot the poll has after the given dates ('%Y/%m/%d') were deleted, also if their IDs are unknown (None)."""
+        dates = set(dates)
+        return self.__keep_dates([index for index, date in enumerate(self.dates) if date not in dates])
+    
+    def __keep_dates(self, keep):
+        votes = [bytes(row[index] for index in keep if index < len(row)) for row in self.votes]
+        return PollSnapshot((self.dates[i] for i in keep), (self.date_ids[i] for i in keep), self.users, self.user_ids, votes, self.fetched_at)
+    
+    def without_users(self, user_ids):
+        """Returns the snapshot the poll has after the users with the given IDs were deleted."""
+        user_ids = set(user_ids)
+        keep = [index for index, user_id in enumerate(self.user_ids) if user_id not in user_ids]
+        return PollSnapshot(self.dates, self.date_ids, (self.users[i] for i in keep), (self.user_ids[i] for i in keep),
+                            (self.votes[i] for i in keep), self.fetched_at)
+    
+    def nbytes(self):
+        """Returns an estimate of the memory the snapshot occupies in bytes, including its cached matrix."""
+        size = sys.getsizeof(self.votes) + sum(sys.getsizeof(row) for row in self.votes)
+        for values in (self.dates, self.date_ids, self.users, self.user_ids):
+            size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+        if self._matrix is not None:
+            size += self._matrix.nbytes
+        return size
+    
+    def age(self):
+        """Returns the number of seconds since the poll was read."""
+        return time.time() - self.fetched_at
+    
+    def __repr__(self):
+        return f'PollSnapshot({len(self.dates)} dates, {len(self.users)} users)'
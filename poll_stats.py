@@ -0,0 +1,64 @@
+"""Attendance statistics computed from a poll snapshot."""
+
+from poll_snapshot import VOTE_CODES, VOTE_NAMES
+
+DEFAULT_WEIGHTS = {'yes': 1.0, 'maybe': 0.5, 'no': 0.0, 'question': 0.0}
+
+class UserStats:
+    """Attendance statistics of a poll.
+    
+    Attributes:
+        snapshot (PollSnapshot): The snapshot the statistics were computed from.
+        rates (dict): Maps every user to a dict with the share of 'yes', 'maybe', 'no' and 'question' votes.
+        best_dates (list): (date, score) tuples sorted by their weighted score, best first.
+        covering_dates (list): A small set of dates so that every coverable user can attend (votes 'yes') at least one of them.
+        uncovered_users (list): The users that did not vote 'yes' for any date.
+    """
+    
+    def __init__(self, snapshot, rates, best_dates, covering_dates, uncovered_users):
+        self.snapshot = snapshot
+        self.rates = rates
+        self.best_dates = best_dates
+        self.covering_dates = covering_dates
+        self.uncovered_users = uncovered_users
+
+def compute_user_stats(snapshot, weights=None):
+    """Computes attendance statistics over the vote matrix of a snapshot.
+
+    Args:
+        snapshot (PollSnapshot): The snapshot of the poll.
+        weights (dict, optional): The weight of each vote for the date score. Defaults to DEFAULT_WEIGHTS.
+
+    Returns:
+        UserStats: The statistics.
+    """
+    import numpy as np  # imported on first use, as numpy is slow to import
+    
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    matrix = snapshot.matrix()
+    n_users, n_dates = matrix.shape
+    
+    # Per user: share of every vote across all dates
+    counts = np.stack([(matrix == code).sum(axis=1) for code in range(len(VOTE_NAMES))], axis=1)
+    shares = counts / max(n_dates, 1)
+    rates = {user: dict(zip(VOTE_NAMES, shares[row].tolist())) for row, user in enumerate(snapshot.users)}
+    
+    # Per date: weighted score, vote codes are used as index into the weight table
+    weight_table = np.array([weights[name] for name in VOTE_NAMES])
+    scores = weight_table[matrix].sum(axis=0) if n_users else np.zeros(n_dates)
+    order = np.argsort(-scores, kind='stable')
+    best_dates = [(snapshot.dates[i], float(scores[i])) for i in order]
+    
+    # Greedy set cover over the 'yes' votes. Finding the minimal cover is NP-hard, the greedy
+    # choice is at most a factor of ln(n_users) away from it and is exact for typical polls.
+    can_attend = matrix == VOTE_CODES['yes']
+    uncovered = can_attend.any(axis=1)
+    covering_dates = []
+    while uncovered.any():
+        gain = can_attend[uncovered].sum(axis=0)
+        best = int(np.argmax(gain))
+        covering_dates.append(snapshot.dates[best])
+        uncovered &= ~can_attend[:, best]
+    uncovered_users = [user for row, user in enumerate(snapshot.users) if not can_attend[row].any()]
+    
+    return UserStats(snapshot, rates, best_dates, covering_dates, uncovered_users)
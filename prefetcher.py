@@ -0,0 +1,146 @@
+"""Warming of the caches ahead of predictable bursts of commands.
+
+Right after a reset is announced, and around the days the group meets, many users ask for charts at once.
+While a warm window is open, the prefetcher refreshes the caches in the background every few seconds, so
+these commands are served from the caches instead of each reading the poll and rendering the charts.
+Windows are opened by `trigger` (e.g. after an announcement) and at fixed times every week.
+"""
+
+import asyncio
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def next_occurrence(weekday, at, now):
+    """Returns the first time after `now` that falls on `weekday` (0 is Monday) at `at`."""
+    moment = datetime.datetime.combine(now.date() + datetime.timedelta(days=(weekday - now.weekday()) % 7), at)
+    if moment <= now:
+        moment += datetime.timedelta(days=7)
+    return moment
+
+class Prefetcher:
+    """Runs a warm-up job repeatedly while a window is open.
+
+    Attributes:
+        interval (float): Seconds between two refreshes while a window is open.
+        window (float): Seconds a window stays open by default.
+        schedule (list): (weekday, datetime.time) pairs at which a window opens every week, 0 is Monday.
+        runs (int): Number of successful refreshes.
+        failures (int): Number of failed refreshes.
+        last_error (str): The error of the last refresh, None if it succeeded.
+    """
+
+    def __init__(self, interval=20, window=900, schedule=()):
+        """Initialize the prefetcher. It starts working once `start` is called from within the loop.
+
+        Args:
+            interval (float, optional): Seconds between two refreshes while a window is open. Defaults to 20.
+            window (float, optional): Seconds a window stays open by default. Defaults to 900.
+            schedule (iterable, optional): (weekday, datetime.time) pairs at which a window opens every week. Defaults to none.
+        """
+        self.interval = interval
+        self.window = window
+        self.schedule = list(schedule)
+        self.runs = 0
+        self.failures = 0
+        self.last_error = None
+        self._until = 0.0    # time.monotonic() at which the current window closes
+        self._wake = None
+        self._tasks = []
+
+    @property
+    def running(self):
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def active(self):
+        """Whether a window is open."""
+        return time.monotonic() < self._until
+
+    def remaining(self):
+        """Returns the seconds until the current window closes, 0 if none is open."""
+        return max(0.0, self._until - time.monotonic())
+
+    def start(self, warm):
+        """Starts the prefetcher on the running event loop. Does nothing if it is already running.
+
+        Args:
+            warm (coroutine function): Refreshes the caches. Called without arguments.
+        """
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        if self.active:
+            self._wake.set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self.__refresh(warm))]
+        if self.schedule:
+            self._tasks.append(loop.create_task(self.__open_scheduled()))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def trigger(self, duration=None):
+        """Opens a window, or extends the open one, and refreshes the caches right away.
+
+        Args:
+            duration (float, optional): Seconds the window stays open. Defaults to `window`.
+        """
+        self._until = max(self._until, time.monotonic() + (self.window if duration is None else duration))
+        if self._wake is not None:
+            self._wake.set()
+
+    def next_window(self, now=None):
+        """Returns the time the next scheduled window opens, None if there is no schedule."""
+        now = now or datetime.datetime.now()
+        return min((next_occurrence(weekday, at, now) for weekday, at in self.schedule), default=None)
+
+    async def __refresh(self, warm):
+        while True:
+            if not self.active:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            self._wake.clear()
+            try:
+                await warm()
+                self.runs += 1
+                self.last_error = None
+            except Exception as e:
+                # The commands read the poll themselves if the caches are cold, so a failed refresh is no emergency
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning("Prefetching failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __open_scheduled(self):
+        while True:
+            moment = self.next_window()
+            # Sleep in steps, so a changed system clock (e.g. daylight saving time) is noticed
+            while (remaining := (moment - datetime.datetime.now()).total_seconds()) > 0:
+                await asyncio.sleep(min(remaining, 600))
+            logger.info("Opening the scheduled prefetch window of %s", moment)
+            self.trigger()
+            await asyncio.sleep(1)    # do not open the same window twice
+
+    def metrics(self):
+        """Returns the current figures of the prefetcher.
+
+        Returns:
+            dict: Whether and how long a window is open, the next scheduled window and the number of refreshes.
+        """
+        return {
+            'active': self.active,
+            'remaining': self.remaining(),
+            'next_window': self.next_window(),
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,178 @@
+"""Best-date recommendation with incremental scoring."""
+
+import threading
+
+import poll_diff
+from poll_snapshot import VOTE_CODES, VOTE_NAMES
+from poll_stats import DEFAULT_WEIGHTS
+
+class Recommendation:
+    """The score of a single date.
+    
+    Attributes:
+        date (str): The date in the format '%Y/%m/%d'.
+        score (float): The weighted score of the date.
+        counts (dict): The number of 'yes', 'maybe', 'no' and 'question' votes.
+        meets_quorum (bool): Whether enough users voted 'yes'.
+    """
+    
+    __slots__ = ('date', 'score', 'counts', 'meets_quorum')
+    
+    def __init__(self, date, score, counts, meets_quorum):
+        self.date = date
+        self.score = score
+        self.counts = counts
+        self.meets_quorum = meets_quorum
+    
+    def __repr__(self):
+        return f'Recommendation({self.date!r}, score={self.score:g}, meets_quorum={self.meets_quorum})'
+
+class DateRecommender:
+    """Ranks the dates of a poll by a weighted score of their votes.
+    
+    The vote counts per date are kept between updates. When a new snapshot only differs in a few vote cells
+    or users, only those changes are applied instead of scoring the whole vote matrix again.
+    
+    Dates are ranked by: meeting the quorum, score, number of 'yes' votes, fewest 'no' votes and finally by date.
+    
+    The recommender is thread-safe: updates change the kept counts in place, so they are serialized, and
+    `recommend` updates and ranks in one step, so a concurrent update cannot slip in between.
+    
+    Attributes:
+        weights (dict): The weight of each vote.
+        quorum (int): The number of 'yes' votes a date needs to be recommended.
+        prefer (str): 'earliest' or 'latest', decides between dates that are tied otherwise.
+        snapshot (PollSnapshot): The snapshot the current ranking is based on.
+        full_updates (int): Number of updates that scored the whole vote matrix.
+        incremental_updates (int): Number of updates that only applied changed cells.
+    """
+    
+    def __init__(self, weights=None, quorum=0, prefer='earliest'):
+        if prefer not in ('earliest', 'latest'):
+            raise ValueError(f"Invalid preference: {prefer}")
+        
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.quorum = quorum
+        self.prefer = prefer
+        self.snapshot = None
+        self.full_updates = 0
+        self.incremental_updates = 0
+        self._counts = None     # dates x votes matrix of vote counts
+        self._ranking = None
+        self._lock = threading.Lock()
+    
+    def update(self, snapshot, max_changed_cells=None):
+        """Updates the scores to match a new snapshot.
+
+        Args:
+            snapshot (PollSnapshot): The new snapshot of the poll.
+            max_changed_cells (int, optional): Above this number of changes the whole matrix is scored again. Defaults to a tenth of the cells.
+
+        Returns:
+            bool: True if the update was incremental, False if everything was scored again.
+        """
+        with self._lock:
+            return self.__update(snapshot, max_changed_cells)
+    
+    def ranking(self):
+        """Returns all dates, best first.
+
+        Returns:
+            list: A list of Recommendation objects.
+        """
+        with self._lock:
+            return self.__ranking()
+    
+    def best(self, n=1):
+        """Returns the best dates that meet the quorum.
+
+        Args:
+            n (int, optional): The number of dates. Defaults to 1.
+
+        Returns:
+            list: Up to `n` Recommendation objects.
+        """
+        with self._lock:
+            return self.__best(n)
+    
+    def recommend(self, snapshot, n=1, max_changed_cells=None):
+        """Updates the scores to match a new snapshot and returns its best dates, see `update` and `best`.
+
+        Returns:
+            tuple: Whether the update was incremental and up to `n` Recommendation objects.
+        """
+        with self._lock:
+            return self.__update(snapshot, max_changed_cells), self.__best(n)
+    
+    def __update(self, snapshot, max_changed_cells):
+        if self.snapshot is None:
+            diff = None
+        else:
+            diff = poll_diff.diff_snapshots(self.snapshot, snapshot)
+            if not diff:
+                self.snapshot = snapshot
+                return True
+        
+        if max_changed_cells is None:
+            max_changed_cells = max(len(snapshot.users) * len(snapshot.dates) // 10, 1)
+        
+        if diff is None or self.snapshot.dates != snapshot.dates or len(diff) > max_changed_cells:
+            self.__score_all(snapshot)
+            self.full_updates += 1
+            incremental = False
+        else:
+            self.__apply(diff, self.snapshot, snapshot)
+            self.incremental_updates += 1
+            incremental = True
+        
+        self.snapshot = snapshot
+        self._ranking = None
+        return incremental
+    
+    def __ranking(self):
+        if self._ranking is None:
+            self._ranking = self.__rank()
+        return list(self._ranking)
+    
+    def __best(self, n):
+        return [rec for rec in self.__ranking() if rec.meets_quorum][:n]
+    
+    def __score_all(self, snapshot):
+        import numpy as np  # imported on first use, as numpy is slow to import
+        
+        matrix = snapshot.matrix()
+        self._counts = np.stack([(matrix == code).sum(axis=0) for code in range(len(VOTE_NAMES))], axis=1).astype(np.int64)
+    
+    def __apply(self, diff, old, new):
+        """Applies the changes between two snapshots with the same dates to the vote counts."""
+        columns = {date: i for i, date in enumerate(new.dates)}
+        for _, date, old_vote, new_vote in diff.changed_votes:
+            self._counts[columns[date], VOTE_CODES[old_vote]] -= 1
+            self._counts[columns[date], VOTE_CODES[new_vote]] += 1
+        
+        if diff.added_users or diff.removed_users:
+            old_keys, new_keys = set(poll_diff.user_keys(old)), set(poll_diff.user_keys(new))
+            for key, row in zip(poll_diff.user_keys(old), old.votes):
+                if key not in new_keys:
+                    self.__add_row(row, -1)
+            for key, row in zip(poll_diff.user_keys(new), new.votes):
+                if key not in old_keys:
+                    self.__add_row(row, 1)
+    
+    def __add_row(self, row, sign):
+        for date in range(len(self.snapshot.dates)):
+            self._counts[date, row[date] if date < len(row) else VOTE_CODES['question']] += sign
+    
+    def __rank(self):
+        weight_table = [self.weights[name] for name in VOTE_NAMES]
+        yes = VOTE_CODES['yes']
+        
+        recommendations = []
+        for date, counts in zip(self.snapshot.dates, self._counts.tolist()):
+            score = sum(weight * count for weight, count in zip(weight_table, counts))
+            recommendations.append(Recommendation(date, score, dict(zip(VOTE_NAMES, counts)), counts[yes] >= self.quorum))
+        
+        # Stable sorts: apply the least important key first
+        recommendations.sort(key=lambda rec: rec.date, reverse=self.prefer == 'latest')
+        recommendations.sort(key=lambda rec: (not rec.meets_quorum, -rec.score, -rec.counts['yes'], rec.counts['no']))
+        return recommendations
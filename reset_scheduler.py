@@ -0,0 +1,208 @@
+"""Weekly automatic reset of the poll.
+
+The reset runs at a fixed weekday and time, ideally at night when nobody votes. Its plan (the dates to add
+and delete) is worked out some time before, so invalid dates and unreachable polls show up early. The
+time of the last reset is stored in a file: a reset that was missed while the bot was offline is caught up
+when it starts again.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+class ResetPlan:
+    """The changes a reset makes to a poll.
+
+    Attributes:
+        add_dates (str): The dates the poll is reset to, as passed to `reset_poll`.
+        to_add (list): Dates that are added.
+        to_delete (list): Dates that are deleted.
+        users (int): Number of users that are deleted, as of planning.
+        digest (str): The hex digest of the dates of the snapshot the plan is based on (see PollSnapshot.dates_digest). The plan is outdated once the dates changed; votes do not affect it.
+    """
+
+    __slots__ = ('add_dates', 'to_add', 'to_delete', 'users', 'digest')
+
+    def __init__(self, add_dates, to_add=(), to_delete=(), users=0, digest=None):
+        self.add_dates = str(add_dates)
+        self.to_add = list(to_add)
+        self.to_delete = list(to_delete)
+        self.users = users
+        self.digest = digest
+
+    @property
+    def requests(self):
+        """The number of requests needed to carry out the plan."""
+        return len(self.to_add) + len(self.to_delete) + self.users
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return f'ResetPlan({self.add_dates}: +{len(self.to_add)}/-{len(self.to_delete)} dates, -{self.users} users)'
+
+def parse_schedule(text):
+    """Parses a schedule like 'sun 03:00'.
+
+    Raises:
+        ValueError: If `text` is not a weekday followed by a time.
+
+    Returns:
+        tuple: The weekday (0 is Monday) and the datetime.time.
+    """
+    try:
+        day, at = text.lower().split()
+        return WEEKDAYS.index(day[:3]), datetime.datetime.strptime(at, '%H:%M').time()
+    except ValueError:
+        raise ValueError(f'Invalid schedule: {text} (expected e.g. "sun 03:00")')
+
+class ResetScheduler:
+    """Runs a job once a week and catches up on a missed run.
+
+    Attributes:
+        weekday (int): The weekday of the run, 0 is Monday.
+        at (datetime.time): The local time of the run.
+        lead (datetime.timedelta): How long before the run its plan is made.
+        retry (datetime.timedelta): How long to wait before retrying a failed run.
+        path (str): The file the state is persisted to.
+        last_run (datetime.datetime): The scheduled time of the last successful run.
+        plan (object): The plan made for the next run, None if there is none yet.
+        last_error (str): The error of the last failed attempt, None if the last attempt succeeded.
+    """
+
+    def __init__(self, weekday, at, path='auto_reset.json', lead=datetime.timedelta(hours=1), retry=datetime.timedelta(minutes=15), clock=datetime.datetime.now, sleep=asyncio.sleep):
+        """Initialize the scheduler and load its state from `path`.
+
+        Args:
+            weekday (int): The weekday of the run, 0 is Monday.
+            at (datetime.time): The local time of the run.
+            path (str, optional): The file the state is persisted to. Defaults to 'auto_reset.json'.
+            lead (datetime.timedelta, optional): How long before the run its plan is made. Defaults to one hour.
+            retry (datetime.timedelta, optional): How long to wait before retrying a failed run. Defaults to 15 minutes.
+            clock (callable, optional): Returns the current local time. Defaults to datetime.datetime.now.
+            sleep (coroutine function, optional): Waits the given number of seconds. Defaults to asyncio.sleep.
+        """
+        self.weekday = weekday
+        self.at = at
+        self.path = path
+        self.lead = lead
+        self.retry = retry
+        self.clock = clock
+        self.sleep = sleep
+        self.last_run = None
+        self.plan = None
+        self.last_error = None
+        self._task = None
+        self.__load()
+
+    def __load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    state = json.load(f)
+                self.last_run = datetime.datetime.fromisoformat(state['last_run'])
+                self.plan = state.get('plan')
+                return
+            except (OSError, ValueError, KeyError, TypeError):    # json.JSONDecodeError is a ValueError
+                # A corrupt or unreadable file must not keep the bot from starting
+                logger.exception("Could not load the state of the automatic reset from %s, starting anew", self.path)
+        # Nothing to catch up on when the schedule is used for the first time
+        self.last_run = self.previous_run(self.clock())
+        self.plan = None
+        self.__save()
+
+    def __save(self):
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'last_run': self.last_run.isoformat(), 'plan': self.plan}, f)
+            os.replace(tmp, self.path)  # never leave a half written file behind
+        except (OSError, TypeError, ValueError):
+            # Keep running; only catching up after a restart is affected
+            logger.exception("Could not save the state of the automatic reset to %s", self.path)
+
+    def previous_run(self, now):
+        """Returns the latest scheduled time at or before `now`."""
+        run = datetime.datetime.combine(now.date() - datetime.timedelta(days=(now.weekday() - self.weekday) % 7), self.at)
+        if run > now:
+            run -= datetime.timedelta(days=7)
+        return run
+
+    def next_run(self, now=None):
+        """Returns the scheduled time of the next run. A missed run is due at once, so it is returned as it is."""
+        now = now or self.clock()
+        previous = self.previous_run(now)
+        if previous > self.last_run:
+            return previous
+        return previous + datetime.timedelta(days=7)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, make_plan, execute, on_error=None):
+        """Starts the scheduler on the running event loop. Does nothing if it is already running.
+
+        Args:
+            make_plan (coroutine function): Called as make_plan(run) with the scheduled time some time before
+                the run. Returns a JSON serializable plan, which is persisted.
+            execute (coroutine function): Called as execute(run, plan) at the scheduled time. The plan is None
+                if it could not be made in advance. An exception marks the run as failed, it is then retried.
+            on_error (coroutine function, optional): Called as on_error(run, exception, attempt) when a run failed. Defaults to None.
+        """
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self.__run(make_plan, execute, on_error))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def __sleep_until(self, moment):
+        # Sleep in steps, so a changed system clock (e.g. daylight saving time) is noticed
+        while (remaining := (moment - self.clock()).total_seconds()) > 0:
+            await self.sleep(min(remaining, 600))
+
+    async def __run(self, make_plan, execute, on_error):
+        attempt = 0
+        while True:
+            run = self.next_run()
+            if self.plan is None or self.plan.get('run') != run.isoformat():
+                await self.__sleep_until(run - self.lead)
+                try:
+                    plan = await make_plan(run)
+                    logger.info("Planned reset for %s: %s", run, plan)
+                except Exception as e:
+                    # The reset works out its changes itself if there is no plan
+                    plan = None
+                    logger.warning("Planning the reset for %s failed: %s", run, e)
+                self.plan = {'run': run.isoformat(), 'plan': plan}
+                self.__save()
+
+            await self.__sleep_until(run)
+            try:
+                await execute(run, self.plan['plan'])
+            except Exception as e:
+                attempt += 1
+                self.last_error = str(e)
+                logger.exception("Automatic reset for %s failed (attempt %s)", run, attempt)
+                if on_error is not None:
+                    await on_error(run, e, attempt)
+                await self.sleep(self.retry.total_seconds())
+                continue
+
+            attempt = 0
+            self.last_run = run
+            self.plan = None
+            self.last_error = None
+            self.__save()
@@ -0,0 +1,100 @@
+"""Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight call and its result instead of
+each starting their own. Nothing is cached: once the call finished, the next caller starts a new one.
+"""
+
+import asyncio
+import threading
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls from multiple threads."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def do(self, key, fn, *args, **kwargs):
+        """Calls `fn` unless a call for `key` is already in flight, in which case its result is awaited and shared.
+
+        Args:
+            key (hashable): Identifies calls that can share their result.
+            fn (callable): The function to be called.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Raises:
+            Exception: Whatever `fn` raised. All callers sharing the call receive the same exception.
+
+        Returns:
+            tuple: The result of `fn` and whether it was shared with another caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        
+        return call.result, False
+    
+    def in_flight(self):
+        """Returns the number of calls that are currently in flight."""
+        with self._lock:
+            return len(self._calls)
+
+class AsyncSingleFlight:
+    """Coalesces concurrent calls from coroutines running on the same event loop."""
+    
+    def __init__(self):
+        self._tasks = {}
+    
+    async def do(self, key, coro_fn, *args, **kwargs):
+        """Awaits `coro_fn(*args, **kwargs)` unless a call for `key` is already in flight, in which case its result is shared.
+        
+        Cancelling one of the callers does not cancel the shared call.
+
+        Args:
+            key (hashable): Identifies calls that can share their result.
+            coro_fn (callable): A function returning an awaitable.
+            *args: Positional arguments for `coro_fn`.
+            **kwargs: Keyword arguments for `coro_fn`.
+
+        Returns:
+            tuple: The result of the awaitable and whether it was shared with another caller.
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        
+        return await asyncio.shield(task), shared
+    
+    def in_flight(self):
+        """Returns the number of calls that are currently in flight."""
+        return len(self._tasks)
@@ -0,0 +1,225 @@
+"""Opt-in latency tracing with nested spans.
+
+Spans are linked to their parent through a context variable, so they nest across `await`, `asyncio.to_thread`
+and worker threads started with a copied context. Every finished root span is kept as a trace, which can be
+summarized or exported in the Chrome trace format (chrome://tracing, Perfetto). Traces of background work,
+like prefetching, are kept apart, so they neither count as the last trace nor push out those of commands.
+"""
+
+import collections
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+_current = contextvars.ContextVar('tracing_span', default=None)
+
+class Span:
+    """A timed operation.
+    
+    Attributes:
+        name (str): The name of the operation.
+        attrs (dict): Additional information, e.g. the URL of a request.
+        start (int): Start time in nanoseconds (time.perf_counter_ns()).
+        end (int): End time in nanoseconds, None while the span is running.
+        thread (int): The ID of the thread the span was started in.
+        parent (Span): The enclosing span, None for a root span.
+        children (list): The spans started inside this span.
+        background (bool): Whether the span is background work rather than a command.
+    """
+    
+    __slots__ = ('name', 'attrs', 'start', 'end', 'thread', 'parent', 'children', 'background')
+    
+    def __init__(self, name, attrs, parent, background=False):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.background = background
+        self.children = []
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        self.end = None
+    
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter_ns()) - self.start) / 1e6
+    
+    def set(self, **attrs):
+        """Adds information to the span."""
+        self.attrs.update(attrs)
+    
+    def walk(self):
+        """Yields this span and all spans below it."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+class _NoSpan:
+    """Stands in for a span while tracing is disabled."""
+    
+    def set(self, **attrs):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+class Tracer:
+    """Collects spans while enabled.
+    
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+        traces (deque): The most recent finished root spans.
+        background_traces (deque): The most recent finished root spans of background work.
+    """
+    
+    def __init__(self, enabled=False, max_traces=20):
+        self.enabled = enabled
+        self.traces = collections.deque(maxlen=max_traces)
+        self.background_traces = collections.deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+    
+    @contextlib.contextmanager
+    def span(self, name, background=False, **attrs):
+        """Times the enclosed block as a span. Does nothing if tracing is disabled.
+
+        Args:
+            name (str): The name of the operation.
+            background (bool, optional): Whether the span is background work. A background trace is kept in `background_traces`. Defaults to False.
+            **attrs: Additional information about the operation.
+
+        Yields:
+            Span: The running span.
+        """
+        if not self.enabled:
+            yield _NO_SPAN
+            return
+        
+        parent = _current.get()
+        span = Span(name, attrs, parent, background)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs['error'] = repr(e)
+            raise
+        finally:
+            span.end = time.perf_counter_ns()
+            _current.reset(token)
+            with self._lock:
+                if parent is None:
+                    (self.background_traces if background else self.traces).append(span)
+                else:
+                    parent.children.append(span)
+    
+    def traced(self, name=None, nested_only=False, background=False):
+        """Decorator that runs every call of a function or coroutine function in a span.
+
+        Args:
+            name (str, optional): The name of the span. Defaults to the qualified name of the function.
+            nested_only (bool, optional): Only record calls made inside another span, so they never start a trace of their own. Defaults to False.
+            background (bool, optional): Whether the calls are background work, see `span`. Defaults to False.
+        """
+        def decorator(func):
+            span_name = name or func.__qualname__
+            
+            def skip():
+                return not self.enabled or (nested_only and _current.get() is None)
+            
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if skip():
+                        return await func(*args, **kwargs)
+                    with self.span(span_name, background):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if skip():
+                    return func(*args, **kwargs)
+                with self.span(span_name, background):
+                    return func(*args, **kwargs)
+            return wrapper
+        
+        return decorator
+    
+    def instrument(self, cls, method, name=None):
+        """Wraps a method of a (third party) class in a span, e.g. discord.abc.Messageable.send.
+        
+        Only calls made inside another span are recorded.
+        """
+        original = getattr(cls, method)
+        if getattr(original, '__traced__', False):
+            return
+        wrapped = self.traced(name or f'{cls.__name__}.{method}', nested_only=True)(original)
+        wrapped.__traced__ = True
+        setattr(cls, method, wrapped)
+    
+    def last(self):
+        """Returns the most recent finished trace that is not background work, or None."""
+        with self._lock:
+            return self.traces[-1] if self.traces else None
+    
+    def summary(self, trace=None):
+        """Sums up a trace per span name.
+
+        Args:
+            trace (Span, optional): The root span. Defaults to the most recent trace.
+
+        Returns:
+            list: One line for the root span and one per span name with count, total and maximum duration, slowest first.
+        """
+        trace = trace or self.last()
+        if trace is None:
+            return []
+        
+        totals = {}
+        for span in trace.walk():
+            if span is trace:
+                continue
+            count, total, longest = totals.get(span.name, (0, 0.0, 0.0))
+            totals[span.name] = (count + 1, total + span.duration_ms, max(longest, span.duration_ms))
+        
+        lines = [f'{trace.name}: {trace.duration_ms:.1f} ms']
+        for span_name, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f'{span_name}: {count}x, {total:.1f} ms total, {longest:.1f} ms max')
+        return lines
+    
+    def export_chrome_trace(self, path, traces=None):
+        """Writes traces in the Chrome trace event format.
+
+        Args:
+            path (str): The file to write.
+            traces (list, optional): The root spans to export. Defaults to all kept traces, including those of background work.
+
+        Returns:
+            int: The number of exported spans.
+        """
+        with self._lock:
+            traces = list(self.traces) + list(self.background_traces) if traces is None else list(traces)
+        
+        events = []
+        pid = os.getpid()
+        for trace in traces:
+            for span in trace.walk():
+                events.append({
+                    'name': span.name,
+                    'ph': 'X',
+                    'ts': span.start / 1000,
+                    'dur': ((span.end or span.start) - span.start) / 1000,
+                    'pid': pid,
+                    'tid': span.thread,
+                    'args': {key: str(value) for key, value in span.attrs.items()}
+                })
+        
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+tracer = Tracer(enabled=os.getenv('TRACE', 'false').lower() == 'true')
+span = tracer.span
+traced = tracer.traced
@@ -0,0 +1,133 @@
+"""Local archive of poll snapshots.
+
+Snapshots are stored in SQLite. User names and dates are dictionary-encoded, so every vote only takes
+a row of four integers. History queries and charts run locally without requesting xoyondo.com.
+"""
+
+import datetime
+import sqlite3
+import threading
+import time
+
+from poll_snapshot import VOTE_NAMES
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS dates (id INTEGER PRIMARY KEY, date TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, poll_id TEXT, archived_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS votes (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    date_id INTEGER NOT NULL REFERENCES dates(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    vote INTEGER NOT NULL,
+    PRIMARY KEY (snapshot_id, date_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS votes_by_date ON votes (date_id, snapshot_id);
+'''
+
+class VoteArchive:
+    """Stores poll snapshots in a local SQLite database.
+    
+    Attributes:
+        path (str): The path of the database file.
+    """
+    
+    def __init__(self, path='vote_archive.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        with self.__connect() as conn:
+            conn.executescript(SCHEMA)
+    
+    def __connect(self):
+        return sqlite3.connect(self.path)
+    
+    def __encode(self, conn, table, column, values):
+        """Returns the IDs of `values` in a dictionary table, adding the missing ones."""
+        conn.executemany(f'INSERT OR IGNORE INTO {table} ({column}) VALUES (?)', ((value,) for value in values))
+        ids = {}
+        for value, id in conn.execute(f'SELECT {column}, id FROM {table}'):
+            ids[value] = id
+        return [ids[value] for value in values]
+    
+    def archive(self, snapshot, poll_id=None):
+        """Stores a snapshot.
+
+        Args:
+            snapshot (PollSnapshot): The snapshot to be archived.
+            poll_id (str, optional): The ID of the poll the snapshot belongs to. Defaults to None.
+
+        Returns:
+            int: The ID of the archived snapshot.
+        """
+        with self._lock, self.__connect() as conn:
+            user_ids = self.__encode(conn, 'users', 'name', snapshot.users)
+            date_ids = self.__encode(conn, 'dates', 'date', snapshot.dates)
+            snapshot_id = conn.execute('INSERT INTO snapshots (poll_id, archived_at) VALUES (?, ?)', (poll_id, snapshot.fetched_at)).lastrowid
+            conn.executemany(
+                'INSERT OR REPLACE INTO votes (snapshot_id, date_id, user_id, vote) VALUES (?, ?, ?, ?)',
+                ((snapshot_id, date_ids[date], user_id, vote)
+                 for user_id, row in zip(user_ids, snapshot.votes)
+                 for date, vote in enumerate(row[:len(date_ids)]))
+            )
+        return snapshot_id
+    
+    def snapshots(self, since=None, until=None):
+        """Lists the archived snapshots.
+
+        Args:
+            since (float, optional): Only snapshots archived at or after this time (time.time()). Defaults to None.
+            until (float, optional): Only snapshots archived at or before this time. Defaults to None.
+
+        Returns:
+            list: (snapshot ID, poll ID, archived at) tuples, oldest first.
+        """
+        with self.__connect() as conn:
+            return conn.execute(
+                'SELECT id, poll_id, archived_at FROM snapshots WHERE archived_at >= ? AND archived_at <= ? ORDER BY archived_at',
+                (since if since is not None else 0, until if until is not None else time.time())
+            ).fetchall()
+    
+    def vote_counts(self, start=None, end=None):
+        """Counts the votes per date, using the most recent archived snapshot of every date.
+
+        Args:
+            start (str, optional): The first date in the format '%Y/%m/%d'. Defaults to None.
+            end (str, optional): The last date in the format '%Y/%m/%d'. Defaults to None.
+
+        Returns:
+            list: (date, counts) tuples sorted by date. `counts` maps 'yes', 'maybe', 'no' and 'question' to numbers.
+        """
+        with self.__connect() as conn:
+            rows = conn.execute('''
+                SELECT d.date, v.vote, COUNT(*)
+                FROM votes v
+                JOIN dates d ON d.id = v.date_id
+                WHERE d.date >= ? AND d.date <= ?
+                  AND v.snapshot_id = (SELECT MAX(snapshot_id) FROM votes WHERE date_id = v.date_id)
+                GROUP BY d.date, v.vote
+                ORDER BY d.date
+            ''', (start or '', end or '9999')).fetchall()
+        
+        counts = {}
+        for date, vote, count in rows:
+            counts.setdefault(date, dict.fromkeys(VOTE_NAMES, 0))[VOTE_NAMES[vote]] = count
+        return list(counts.items())
+    
+    def weekly_attendance(self, start=None, end=None):
+        """Computes the attendance per calendar week, i.e. the 'yes' votes of the best date of every week.
+
+        Args:
+            start (str, optional): The first date in the format '%Y/%m/%d'. Defaults to None.
+            end (str, optional): The last date in the format '%Y/%m/%d'. Defaults to None.
+
+        Returns:
+            list: (week in the format 'YYYY/WW', best date, counts of the best date) tuples sorted by week.
+        """
+        weeks = {}
+        for date, counts in self.vote_counts(start, end):
+            year, week, _ = datetime.datetime.strptime(date, '%Y/%m/%d').isocalendar()
+            key = f'{year}/{week:02d}'
+            best = weeks.get(key)
+            if best is None or (counts['yes'], counts['maybe']) > (best[1]['yes'], best[1]['maybe']):
+                weeks[key] = (date, counts)
+        return [(week, date, counts) for week, (date, counts) in sorted(weeks.items())]
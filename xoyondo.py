@@ -1,32 +1,83 @@
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+import contextvars
+from datetime import datetime
 from collections import OrderedDict
 import re
 import threading
+import time
 import queue
-from multipledispatch import dispatch
+import logging
 
-class Xoyondo:
-    """_summary_
+from poll_backend import PollBackend, writes_poll
+from poll_snapshot import PollSnapshot
+from singleflight import SingleFlight
+import tracing
+
+# The user rows of the poll page, read without parsing the page when only the IDs are needed
+USER_ID_PATTERN = re.compile(r'<tr\b(?=[^>]*\bclass="[^"]*\bjs-user-rows\b)[^>]*\bdata-userid="([^"]*)"')
+# Any user row, however its attributes are written; used to check that USER_ID_PATTERN found all of them
+USER_ROW_PATTERN = re.compile(r'<tr\b[^>]*\bjs-user-rows\b')
+
+def find_user_ids(page):
+    """Returns the IDs of the users of a poll page, in page order.
+    
+    The page is only searched with USER_ID_PATTERN. If that misses some of the user rows, their markup differs
+    from the pattern (e.g. other quotes), so the page is parsed instead.
+
+    Args:
+        page (str): The HTML of the poll page.
+
+    Returns:
+        list: The user IDs without duplicates.
+    """
+    user_ids = USER_ID_PATTERN.findall(page)
+    if len(user_ids) != len(USER_ROW_PATTERN.findall(page)):
+        from bs4 import BeautifulSoup  # imported on first use, as it is slow to import
+        html = BeautifulSoup(page, 'html.parser')
+        user_ids = [row['data-userid'] for row in html.find_all('tr', class_='js-user-rows') if row.has_attr('data-userid')]
+    return list(OrderedDict.fromkeys(user_ids))
+
+class Xoyondo(PollBackend):
+    """A poll on xoyondo.com, read by scraping the poll page and changed through the forms of the page.
     
     Attributes:
         url (str): The provided URL.
         id (str): The user ID extracted from the URL.
         password (str): The password extracted from the URL.
         headers (dict): The headers to be used for HTTP requests.
+        print_messages (bool): Whether messages are printed to the console.
+        collect_messages (bool): Whether messages are recorded in the returned message lists.
+        message_level (int): The minimum logging level of printed and recorded messages.
+        base_url (str): The address of the Xoyondo server. Can be pointed at a local stand-in.
+        snapshot_ttl (float): Seconds a cached poll snapshot is reused for while `warm_window` is active.
+        warm_window (object): Something with an `active` flag, e.g. a prefetcher.Prefetcher. Only while it is active do reads reuse a cached snapshot by default. None if there is no window.
+        snapshot_budget (int): Bytes a snapshot may occupy to be cached. Larger snapshots are read again every time. None if there is no budget.
+        message_limit (int): The maximum number of messages kept per message list. None if there is no limit.
+        concurrency (AdaptiveLimit): Limits the parallel requests of bulk operations, learning from HTTP 429 responses.
     """
     
-    def __init__(self, url, headers = {"User-Agent": "Mozilla/5.0"}, print_messages = True):
+    BASE_URL = "https://xoyondo.com"
+    
+    def __init__(self, url, headers = {"User-Agent": "Mozilla/5.0"}, print_messages = True, collect_messages = True, message_level = logging.DEBUG, base_url = BASE_URL, snapshot_ttl = 30, concurrency = None, snapshot_budget = 16 * 2**20, message_limit = 1000):
         """Initialize the object with a specified URL and headers.
 
         Args:
             url (str): The URL that might contain user ID and password information. Defaults to an empty string.
             headers (dict, optional): The headers to be used for HTTP requests. Defaults to {"User-Agent": "Mozilla/5.0"}.
             print_messages (bool, optional): Whether to print messages to the console. Defaults to True.
+            collect_messages (bool, optional): Whether to record messages in the returned message lists. Defaults to True.
+            message_level (int, optional): The minimum logging level of printed and recorded messages. Defaults to logging.DEBUG.
+            base_url (str, optional): The address of the Xoyondo server. Defaults to "https://xoyondo.com".
+            snapshot_ttl (float, optional): Seconds a cached poll snapshot is reused for while `warm_window` is active. Defaults to 30.
+            concurrency (AdaptiveLimit, optional): Limits the parallel requests of bulk operations. Defaults to a new, not persisted AdaptiveLimit.
+            snapshot_budget (int, optional): Bytes a snapshot may occupy to be cached. Defaults to 16 MiB.
+            message_limit (int, optional): The maximum number of messages kept per message list. Defaults to 1000.
         """
         
-        self.print_messages = print_messages
+        super().__init__(print_messages, collect_messages, message_level, snapshot_ttl, concurrency, snapshot_budget, message_limit)
+        self.base_url = base_url.rstrip('/')
+        self._flights = SingleFlight()
+        self._session = None
+        self._session_lock = threading.Lock()
         self.url = url
         self.id, self.password, _ = self.__extract_from_url(self.url)
         self.headers = headers
@@ -43,9 +94,9 @@ class Xoyondo:
         Returns:
             tuple: A tuple containing the extracted user ID and password from the URL.
         """
-        messages = []
+        messages = self.new_messages()
         
-        pattern= r'^https://xoyondo\.com/dp/([^/]+)/([^/]+)$'
+        pattern= r'^' + re.escape(self.base_url) + r'/dp/([^/]+)/([^/]+)$'
         match = re.match(pattern, url)
         
         ### Error handling (ValueError)
@@ -55,23 +106,25 @@ class Xoyondo:
         
         id, password = match.groups()
         
-        self.log_message(f"URL has correct format. Consisting of ID: {id} and password: {password}", messages)
+        self.log_message(messages, logging.DEBUG, "URL has correct format. Consisting of ID: %s and password: %s", id, password)
         
         return id, password, messages
     
+    @writes_poll
     def set_url(self, url):
         """Updates the object's URL and extracts the user ID and password from the new URL.
 
         Args:
             url (str): The new URL that might contain user ID and password information.
         """
-        messages = []
+        messages = self.new_messages()
         
         self.url = url
         self.id, self.password, _messages = self.__extract_from_url(self.url)
         messages.extend(_messages)
+        self.invalidate_snapshot()
         
-        self.log_message(f"Changed URL to: {url}", messages)
+        self.log_message(messages, logging.INFO, "Changed URL to: %s", url)
         
         return messages
     
@@ -89,225 +142,121 @@ class Xoyondo:
         else:
             return re.sub(r'/[^/]+$', '', self.url)
     
-    @dispatch(str, str)
-    def get_date_list(self, start, end):    # throws ValueError
-        """Generate a list of dates in the format '%Y/%m/%d' between two given dates (inclusive).
-
-        Args:
-            start (str): The starting date in the format '%Y/%m/%d'.
-            end (str): The ending date in the format '%Y/%m/%d'.
-
-        Returns:
-            list: A list of dates as strings in the format '%Y/%m/%d' from the start date to the end date, inclusive.
-        """
-        messages = []
-        
-        start = str(start)
-        end = str(end)
-        
-        try:
-            start_date = datetime.strptime(start, '%Y/%m/%d')
-        except ValueError:
-            raise ValueError(f"Invalid start date: {start}")
-        try:
-            end_date = datetime.strptime(end, '%Y/%m/%d')
-        except ValueError:
-            raise ValueError(f"Invalid end date: {end}")
-        
-        delta = end_date - start_date
-        date_list = [(start_date + timedelta(days=i)).strftime('%Y/%m/%d') for i in range(delta.days + 1)]
-        self.log_message(f"Generated date list from {start} to {end}", messages)
-        
-        return date_list, messages
-        
-    @dispatch(str)
-    def get_date_list(self, dates):
-        
-        messages = []
-        
-        dates = str(dates)
-        if "," in dates or ":" in dates:
-            parts = dates.split(",")
-            dates = []
-            for part in parts:
-                if ":" in part:
-                    start, end = [x.strip() for x in part.split(":")]
-                    dates_buf, _messages = self.get_date_list(start, end)
-                    dates.extend(dates_buf)
-                    messages.extend(_messages)
-                    self.log_message(f"Added date list from {start} to {end} to date list", messages)
-                else:
-                    try:
-                        _ = datetime.strptime(part.strip(), '%Y/%m/%d')
-                        dates.append(part.strip())
-                        self.log_message(f"Added date {part.strip()} to date list", messages)
-                    except ValueError:
-                        raise ValueError(f"Invalid date: {part.strip()}")
-        else:
-            try:
-                _ = datetime.strptime(dates.strip(), '%Y/%m/%d')
-                dates = [dates.strip()]
-                self.log_message(f"Added date {dates.strip()} to date list", messages)
-            except ValueError:
-                raise ValueError(f"Invalid date: {dates.strip()}")
-            
-        return dates, messages
-    
     def __get_webpage(self, url, headers, features="html.parser"):  # throws HTTPError
         """Fetches the content of a webpage using the provided URL and headers, and then parses it using BeautifulSoup.
+        
+        Concurrent calls for the same URL share a single request and parse result.
 
         Args:
             url (str): The URL of the webpage to be fetched.
             headers (dict): The headers to be used for the HTTP request.
-            features (str, optional): The parser to be used by BeautifulSoup. Defaults to "html.parser".
+            features (str, optional): The parser to be used by BeautifulSoup. None skips parsing and returns the HTML as a string. Defaults to "html.parser".
 
         Raises:
             HTTPError: If there's an issue with the HTTP request (e.g., a 404 Not Found error).
 
         Returns:
-            BeautifulSoup: A BeautifulSoup object containing the parsed content of the webpage.
+            BeautifulSoup: A BeautifulSoup object containing the parsed content of the webpage, or the HTML if `features` is None.
         """
         
-        messages = []
+        messages = self.new_messages()
         
-        response = requests.get(url, headers=headers)
+        with tracing.span('xoyondo.get_webpage', url=url) as span:
+            html, shared = self._flights.do((url, features), self.__fetch_webpage, url, headers, features)
+            span.set(shared=shared)
+        
+        if shared:
+            self.log_message(messages, logging.INFO, "Successfully fetched webpage: %s (shared with a concurrent request)", url)
+        else:
+            self.log_message(messages, logging.INFO, "Successfully fetched webpage: %s", url)
+        
+        return html, messages
+    
+    def __fetch_webpage(self, url, headers, features):  # throws HTTPError
+        # Reads count against the same limit as the writes, so background reads cannot crowd out a reset
+        with tracing.span('http.get', url=url) as span, self.concurrency.slot() as report:
+            response = self.__get_session().get(url, headers=headers)
+            report(response.status_code)
+            span.set(status=response.status_code, bytes=len(response.content))
         
         ### Error handling (HTTPError)
         response.raise_for_status()
         ###
         
-        self.log_message(f"Successfully fetched webpage: {url}", messages)
+        if features is None:
+            return response.text
         
-        return BeautifulSoup(response.content, features), messages
+        from bs4 import BeautifulSoup  # imported on first use, as it is slow to import and not needed to start the bot
+        with tracing.span('parse', features=features):
+            return BeautifulSoup(response.content, features)
     
-    def log_message(self, new_message, list_of_messages):
-        """Prints a message to the console and adds it to a list of messages.
-
-        Args:
-            new_message (str): The message to be printed.
-            list_of_messages (list): The list of messages to which the new message should be added.
-        """
-        
-        list_of_messages.append(new_message)
-        if self.print_messages:
-            print(new_message)
+    def __get_session(self):
+        """Returns the HTTP session shared by all requests, so connections are kept alive and reused."""
+        with self._session_lock:
+            if self._session is None:
+                import requests  # imported on first use, as it is slow to import
+                
+                self._session = requests.Session()
+                # One pooled connection per request the concurrency limit may allow at the same time
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency.max_limit)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
     
-    def delete_dates(self, dates:str=None):
-        messages = []
-        dates_to_delete = []
-        
-        html, _messages = self.__get_webpage(self.url, self.headers)
-        messages.extend(_messages)
-        date_elements = html.find_all('i', {'class': 'fa fa-edit js-date-edit-cal text-warning pointer mx-1'})
-        date_to_id = {el['data-date']: el['data-dateid'] for el in date_elements}
-        
-        if len(date_to_id) <= 1:
-            self.log_message("Deletion not possible as there is only one date left.", messages)
-            return messages
-        elif dates is None:
-            dates_to_delete = list(date_to_id.values())
-            self.log_message(f"Full deletion not possible as there will be '{list(date_to_id.keys())[-1]}' left.", messages)
-        else:
-            dates = str(dates)
-            if "," in dates or ":" in dates:
-                parts = dates.split(",")
-                for part in parts:
-                    if ":" in part:
-                        start, end = [x.strip() for x in part.split(":")]
-                        
-                        # Check if the range is valid
-                        if start.replace('-', '').isdigit() and end.replace('-', '').isdigit():
-                            # at least one negative number
-
-                            try:
-                                start = int(start)
-                            except ValueError:
-                                raise ValueError(f"Invalid index: {start.strip()}")   
-                             
-                            try:
-                                end = int(end)
-                            except ValueError:
-                                raise ValueError(f"Invalid index: {end.strip()}")    
-                                
-                            if start < 0:
-                                start = len(date_to_id) + start
-                            if len(date_to_id) <= start or start < 0:
-                                raise ValueError(f"Index {start} out of range.")
-                            if end < 0:
-                                end = len(date_to_id) + end
-                            if len(date_to_id) <= end or end < 0:
-                                raise ValueError(f"Index {end} out of range.")
-
-                            if start <= end:
-                                dates_to_delete.extend(date_to_id[date] for i, date in enumerate(date_to_id.keys()) if start <= i <= end)
-                                self.log_message(f"Added dates from {list(date_to_id.keys())[start]} to {list(date_to_id.keys())[end]} to deletion list", messages)
-                            else:
-                                raise ValueError(f"Start index must be less than or equal to end index. Given: {start}:{end}")
-                                
-                        else:
-                            # dates
-                            dates, _messages = self.get_date_list(start, end)
-                            messages.extend(_messages)
-                            for date in dates:
-                                if date.strip() in date_to_id:
-                                    dates_to_delete.append(date_to_id[date.strip()])
-                                    self.log_message(f"Added date {date.strip()} to deletion list", messages)
-                                else:
-                                    raise ValueError(f"No such date to delete: {date.strip()}")
-                    else:
-                        if part.replace('-', '').isdigit():
-                            try:
-                                index = int(part)
-                                
-                                if -len(date_to_id) <= index < len(date_to_id):
-                                    dates_to_delete.append(date_to_id[list(date_to_id.keys())[index if index > 0 else index]])
-                                    self.log_message(f"Added date {list(date_to_id.keys())[index if index > 0 else index]} to deletion list", messages)
-                                else:
-                                    raise ValueError(f"Index {index} out of range.")
-                            except ValueError:
-                                raise ValueError(f"Invalid index: {part.strip()}")
-                        elif part.strip() in date_to_id:
-                            dates_to_delete.append(date_to_id[part.strip()])
-                            self.log_message(f"Added date {part.strip()} to deletion list", messages)
-                        else:
-                            raise ValueError(f"No such date to delete: {part.strip()}")
-            else:
-                if dates.replace('-', '').isdigit():    
-                    try:
-                        index = int(dates)
-                        
-                        if -len(date_to_id) <= index < len(date_to_id):
-                            dates_to_delete.append(date_to_id[list(date_to_id.keys())[index if index > 0 else index]])
-                            self.log_message(f"Added date {list(date_to_id.keys())[index if index > 0 else index]} to deletion list", messages)
-                        else:
-                            raise ValueError(f"Index {index} out of range.")
-                    except ValueError:
-                        raise ValueError(f"Invalid index: {dates.strip()}")
-                elif dates.strip() in date_to_id:
-                    dates_to_delete.append(date_to_id[dates.strip()])
-                    self.log_message(f"Added date {dates.strip()} to deletion list", messages)
+    def __post(self, url, form_data):
+        """Sends a form post within the concurrency limit, retrying it while it is rate limited."""
+        session = self.__get_session()
+        
+        for attempt in range(self.concurrency.max_retries + 1):
+            with self.concurrency.slot() as report, \
+                    tracing.span('http.post', url=url, operation=form_data.get('operation'), attempt=attempt) as span:
+                response = session.post(url, headers=self.headers, data=form_data)
+                report(response.status_code)
+                span.set(status=response.status_code)
+            
+            if response.status_code != 429 or attempt == self.concurrency.max_retries:
+                return response
+            time.sleep(self.concurrency.retry_delay(attempt, response.headers.get('Retry-After')))
+    
+    def _read_snapshot(self):  # throws HTTPError
+        html, messages = self.__get_webpage(self.url, self.headers)
+        with tracing.span('snapshot'):
+            return PollSnapshot.from_html(html), messages
+    
+    @writes_poll
+    def delete_dates(self, dates:str=None, progress=None):
+        messages = self.new_messages()
+        dates_to_delete = None
+        
+        if self.in_batch():
+            snapshot = self._snapshot
+            if snapshot is not None:
+                # Dates added within the batch have no known ID yet; only read the poll again if one of them is to be deleted
+                _messages = self.new_messages()
+                dates_to_delete = self._select_dates_to_delete(dates, dict(zip(snapshot.dates, snapshot.date_ids)), _messages)
+                if dates_to_delete is None or None not in dates_to_delete:
+                    messages.extend(_messages)
+                    self.log_message(messages, logging.DEBUG, "Using the date IDs of the snapshot shared by the batch")
                 else:
-                    raise ValueError(f"No such date to delete: {dates.strip()}")
+                    self.invalidate_snapshot()
+                    snapshot = None
+            if snapshot is None:
+                snapshot, _messages = self.get_snapshot()
+                messages.extend(_messages)
+                dates_to_delete = self._select_dates_to_delete(dates, dict(zip(snapshot.dates, snapshot.date_ids)), messages)
+        else:
+            html, _messages = self.__get_webpage(self.url, self.headers)
+            messages.extend(_messages)
+            date_elements = html.find_all('i', {'class': 'fa fa-edit js-date-edit-cal text-warning pointer mx-1'})
+            date_to_id = {el['data-date']: el['data-dateid'] for el in date_elements}
+            dates_to_delete = self._select_dates_to_delete(dates, date_to_id, messages)
         
-        dates_to_delete = list(OrderedDict.fromkeys(dates_to_delete))  # Remove duplicates while maintaining order
+        if dates_to_delete is None:
+            return messages
         
-        remaining_dates = set(date_to_id.values()) - set(dates_to_delete)
-        if len(remaining_dates) < 1:
-            self.log_message("Deletion will result in only one date being left. It is thus not possible.", messages)
-            dates_to_delete = dates_to_delete[:-1]
-            
-        threads = []
-        message_queue = queue.Queue()
-        for date_id in dates_to_delete:
-            thread = threading.Thread(target=self.__delete_date, args=("https://xoyondo.com/pc/poll-change-poll", date_id, message_queue))
-            threads.append(thread)
-            thread.start()
-            
-        for thread in threads:
-            thread.join()
-            
-        while not message_queue.empty():
-            messages.extend(message_queue.get())
+        _messages, failed = self.__run_mutations(self.__delete_date, f"{self.base_url}/pc/poll-change-poll", dates_to_delete, 'date_delete', progress)
+        messages.extend(_messages)
+        self._after_write(failed, lambda snapshot: snapshot.without_dates(dates_to_delete))
         
         return messages
         
@@ -316,8 +265,81 @@ class Xoyondo:
         # delete every date given in the list of dates
         # if user wanted to delete every date give hint, that the last date could not be deleted due to xoyondo restrictions
 
+    def __run_mutations(self, mutation, url, items, operation, progress=None):
+        """Sends one request per item in parallel threads. The number of requests in flight is limited by `concurrency`.
+
+        Args:
+            mutation (callable): Sends the request for a single item. Called as mutation(url, item, message_queue), returns whether it succeeded.
+            url (str): The URL the requests are sent to.
+            items (list): The items (e.g. date IDs) to send requests for.
+            operation (str): The name of the operation ('date_add', 'date_delete' or 'user_delete'), passed on to `progress`.
+            progress (callable, optional): Called as progress(operation, done, total) from the worker threads whenever a request finished. Defaults to None.
+
+        Returns:
+            tuple: The messages of all requests and the list of items whose request failed.
+        """
+        messages = self.new_messages()
+        message_queue = queue.Queue()
+        done = 0
+        failed = []
+        done_lock = threading.Lock()
+        
+        def run(item):
+            nonlocal done
+            succeeded = False
+            try:
+                succeeded = mutation(url, item, message_queue)
+            except Exception as e:
+                _messages = self.new_messages()
+                self.log_message(_messages, logging.WARNING, "Request for %s failed: %s", item, e)
+                message_queue.put(_messages)
+            finally:
+                with done_lock:
+                    done += 1
+                    count = done
+                    if not succeeded:
+                        failed.append(item)
+                if progress is not None:
+                    progress(operation, count, len(items))
+        
+        pending = queue.SimpleQueue()
+        for item in items:
+            pending.put(item)
+        
+        def work():
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                run(item)
+        
+        with tracing.span(f'xoyondo.{operation}', requests=len(items)) as span:
+            threads = []
+            # The limit can only grow up to max_limit, more workers would just wait for a slot
+            for _ in range(min(len(items), self.concurrency.max_limit)):
+                # Every thread gets a copy of the context, so its spans are nested in the current span
+                thread = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+                threads.append(thread)
+                thread.start()
+                
+            for thread in threads:
+                thread.join()
+            span.set(concurrency=int(self.concurrency.limit))
+            
+        while not message_queue.empty():
+            messages.extend(message_queue.get())
+        
+        self.log_message(messages, logging.DEBUG, "Concurrency limit after %s: %s", operation, int(self.concurrency.limit))
+        try:
+            self.concurrency.save()
+        except OSError as e:
+            self.log_message(messages, logging.WARNING, "Could not save the concurrency limit: %s", e)
+        
+        return messages, failed
+    
     def __delete_date(self, delete_url, date_id, message_queue):
-        messages = []
+        messages = self.new_messages()
         
         form_data = {
             'ID': self.id,
@@ -326,16 +348,18 @@ class Xoyondo:
             'operation': 'date_delete',
             'pass': self.password
         }
-        delete_response = requests.post(delete_url, headers=self.headers, data=form_data)
+        delete_response = self.__post(delete_url, form_data)
         if delete_response.status_code == 200:
-            self.log_message(f'Successfully deleted date with ID {date_id}', messages)
+            self.log_message(messages, logging.INFO, "Successfully deleted date with ID %s", date_id)
         else:
-            self.log_message(f'Failed to delete date with ID {date_id}: HTTP {delete_response.status_code}', messages)
+            self.log_message(messages, logging.WARNING, "Failed to delete date with ID %s: HTTP %s", date_id, delete_response.status_code)
                 
         message_queue.put(messages)
+        return delete_response.status_code == 200
 
-    def add_dates(self, dates):
-        messages = []
+    @writes_poll
+    def add_dates(self, dates, progress=None):
+        messages = self.new_messages()
         dates_to_add = []
         
         try:
@@ -351,13 +375,13 @@ class Xoyondo:
                     dates, _messages = self.get_date_list(start, end)
                     messages.extend(_messages)
                     dates_to_add.extend(dates)
-                    self.log_message(f"Added date list from {start} to {end} to add list", messages)
+                    self.log_message(messages, logging.DEBUG, "Added date list from %s to %s to add list", start, end)
                 else:
                     # check for valid date format
                     try:
                         datetime.strptime(part.strip(), '%Y/%m/%d')
                         dates_to_add.append(part.strip())
-                        self.log_message(f"Added date {part.strip()} to add list", messages)
+                        self.log_message(messages, logging.DEBUG, "Added date %s to add list", part.strip())
                     except ValueError:
                         raise ValueError(f"Invalid date: {part.strip()}")
         else:
@@ -365,25 +389,15 @@ class Xoyondo:
             try:
                 datetime.strptime(dates.strip(), '%Y/%m/%d')
                 dates_to_add.append(dates.strip())
-                self.log_message(f"Added date {dates.strip()} to add list", messages)
+                self.log_message(messages, logging.DEBUG, "Added date %s to add list", dates.strip())
             except ValueError:
                 raise ValueError(f"Invalid date: {dates.strip()}")
             
         
             
-        threads = []
-        message_queue = queue.Queue()
-        
-        for date in dates_to_add:
-            thread = threading.Thread(target=self.__add_date, args=("https://xoyondo.com/pc/poll-change-poll", date, message_queue))
-            threads.append(thread)
-            thread.start()
-            
-        for thread in threads:
-            thread.join()
-            
-        while not message_queue.empty():
-            messages.extend(message_queue.get())
+        _messages, failed = self.__run_mutations(self.__add_date, f"{self.base_url}/pc/poll-change-poll", dates_to_add, 'date_add', progress)
+        messages.extend(_messages)
+        self._after_write(failed, lambda snapshot: snapshot.with_dates(dates_to_add))
 
         return messages
         
@@ -392,7 +406,7 @@ class Xoyondo:
         # if user wanted to add every date give hint, that the last date could not be added due to xoyondo restrictions
         
     def __add_date(self, add_url, date, message_queue):
-        messages = []
+        messages = self.new_messages()
         
         form_data = {
             'newdates': date,
@@ -402,16 +416,17 @@ class Xoyondo:
             'pass': self.password,
             'times_selected': 0
         }
-        add_response = requests.post(add_url, headers=self.headers, data=form_data)
+        add_response = self.__post(add_url, form_data)
         if add_response.status_code == 200:
-            self.log_message(f'Successfully added date {date}', messages)
+            self.log_message(messages, logging.INFO, "Successfully added date %s", date)
         else:
-            self.log_message(f'Failed to add date {date}: HTTP {add_response.status_code}', messages)
+            self.log_message(messages, logging.WARNING, "Failed to add date %s: HTTP %s", date, add_response.status_code)
                 
         message_queue.put(messages)
+        return add_response.status_code == 200
         
     def get_dates(self):
-        messages = []
+        messages = self.new_messages()
         dates = []
         
         html, _messages = self.__get_webpage(self.url, self.headers)
@@ -420,21 +435,34 @@ class Xoyondo:
         date_to_id = {el['data-date']: el['data-dateid'] for el in date_elements}
         
         dates = list(date_to_id.keys())
-        self.log_message(f"Found dates: {dates}", messages)
+        self.log_message(messages, logging.DEBUG, "Found dates: %s", dates)
         
         return dates, messages
         
         # get all dates
         
-    def delete_users(self, users: str = None):
-        messages = []
+    @writes_poll
+    def delete_users(self, users: str = None, progress=None):
+        messages = self.new_messages()
         user_ids_to_delete = []
-    
-        html, _messages = self.__get_webpage(self.url, self.headers)
-        messages.extend(_messages)
-        user_elements = html.find_all('tr', {'class': 'js-user-rows'})
         
-        if users:  # If usernames are provided
+        snapshot = self._snapshot if self.in_batch() else None
+        if snapshot is not None:
+            # The users of the snapshot shared by the batch are known, no need to read the page
+            names = None if not users else [username.strip() for username in users.split(',')]
+            user_ids_to_delete = [user_id for user_id, name in zip(snapshot.user_ids, snapshot.users) if names is None or name in names]
+            self.log_message(messages, logging.DEBUG, "Added %s users of the snapshot shared by the batch to deletion list", len(user_ids_to_delete))
+        elif not users:  # If no username is provided, delete all users
+            # Only the IDs are needed, so the page is searched without parsing it
+            html, _messages = self.__get_webpage(self.url, self.headers, features=None)
+            messages.extend(_messages)
+            user_ids_to_delete = find_user_ids(html)
+            self.log_message(messages, logging.DEBUG, "Added all users to deletion list")
+        else:
+            html, _messages = self.__get_webpage(self.url, self.headers)
+            messages.extend(_messages)
+            user_elements = html.find_all('tr', {'class': 'js-user-rows'})
+            
             user_names_to_delete = [username.strip() for username in users.split(',')]  # Split the usernames string into a list
 
             # Find the corresponding user ids for the usernames provided
@@ -445,34 +473,22 @@ class Xoyondo:
                     user_name = user_elems[-1]
                     if user_name in user_names_to_delete:
                         user_ids_to_delete.append(user_element['data-userid'])
-                        self.log_message(f"Added user with name {user_name} to deletion list", messages)
-        else:  # If no username is provided, delete all users
-            user_ids_to_delete = [el['data-userid'] for el in user_elements]
-            self.log_message(f"Added all users to deletion list", messages)
+                        self.log_message(messages, logging.DEBUG, "Added user with name %s to deletion list", user_name)
         
         if len(user_ids_to_delete) < 1:
-            self.log_message("Deletion not possible as there is no user registered.", messages)
+            self.log_message(messages, logging.WARNING, "Deletion not possible as there is no user registered.")
         
         # Delete each user
-        threads = []
-        message_queue = queue.Queue()
-        for user_id in user_ids_to_delete:
-            thread = threading.Thread(target=self.__delete_user, args=("https://xoyondo.com/pc/poll-change-poll-ajax", user_id, message_queue))
-            threads.append(thread)
-            thread.start()
-            
-        for thread in threads:
-            thread.join()
-            
-        while not message_queue.empty():
-            messages.extend(message_queue.get())
+        _messages, failed = self.__run_mutations(self.__delete_user, f"{self.base_url}/pc/poll-change-poll-ajax", user_ids_to_delete, 'user_delete', progress)
+        messages.extend(_messages)
+        self._after_write(failed, lambda snapshot: snapshot.without_users(user_ids_to_delete))
         
         return messages
     
         # delete every user
         
     def __delete_user(self, delete_url, user_id, message_queue):
-        messages = []
+        messages = self.new_messages()
         
         form_data = {
             'u': user_id,
@@ -481,16 +497,17 @@ class Xoyondo:
             'operation': 'delete-user',
             'pass': self.password
         }
-        delete_response = requests.post(delete_url, headers=self.headers, data=form_data)
+        delete_response = self.__post(delete_url, form_data)
         if delete_response.status_code == 200:
-            self.log_message(f'Successfully deleted user with ID {user_id}', messages)
+            self.log_message(messages, logging.INFO, "Successfully deleted user with ID %s", user_id)
         else:
-            self.log_message(f'Failed to delete user with ID {user_id}: HTTP {delete_response.status_code}', messages)
+            self.log_message(messages, logging.WARNING, "Failed to delete user with ID %s: HTTP %s", user_id, delete_response.status_code)
         
         message_queue.put(messages)
+        return delete_response.status_code == 200
     
     def get_users(self):
-        messages = []
+        messages = self.new_messages()
         users = []
         
         html, _messages = self.__get_webpage(self.url, self.headers)
@@ -503,14 +520,14 @@ class Xoyondo:
                 user_elems = list(user_name_element.stripped_strings)
                 user_name = user_elems[-1]
                 users.append(user_name)
-                self.log_message(f"Found user with name {user_name}", messages)
+                self.log_message(messages, logging.DEBUG, "Found user with name %s", user_name)
         
         return users, messages
         
         # get all users
     
     def get_votes_by_index(self, index=None):
-        messages = []
+        messages = self.new_messages()
         date_results = {}
         filtered_results = {}
         
@@ -564,14 +581,14 @@ class Xoyondo:
                     
                     if start <= end:
                         indices.extend(range(start, end + 1))
-                        self.log_message(f"Added indices from {start} to {end} to index list", messages)
+                        self.log_message(messages, logging.DEBUG, "Added indices from %s to %s to index list", start, end)
                     else:
                         raise ValueError(f"Start index must be less than or equal to end index: {start}:{end}")
 
                 else:
                     try:
                         indices.append(int(part))
-                        self.log_message(f"A: Added index {part} to index list", messages)
+                        self.log_message(messages, logging.DEBUG, "A: Added index %s to index list", part)
                     except ValueError:
                         raise ValueError(f"Invalid index: {part}")
             indices = [(i + len(date_results)) if i < 0 else i for i in indices]
@@ -580,7 +597,7 @@ class Xoyondo:
         else:
             filtered_results = date_results
             
-        self.log_message(f"Found votes: {filtered_results}", messages)
+        self.log_message(messages, logging.DEBUG, "Found votes: %s", filtered_results)
             
         
         formatted_results = []
@@ -597,43 +614,8 @@ class Xoyondo:
         
         # if specific date or dates or range of dates given, give the count of yes, no and maybe of all users for this date
     
-    def get_votes_by_date(self, dates = None):
-        messages = []
-        votes = []
-        
-        if dates:
-            indices, _messages = self.get_index_for_date(dates)
-            messages.extend(_messages)
-            votes, _messages = self.get_votes_by_index(",".join(str(index) for index in indices))
-            messages.extend(_messages)
-            
-            dates = self.get_date_list(dates)
-        else:
-            dates = []
-            
-            votes, _messages = self.get_votes_by_index()
-            messages.extend(_messages)
-            for vote in votes:
-                date, _message = self.get_date_for_index(vote['date_index'])
-                dates.append(date[0])
-                messages.extend(_message)
-                
-        formatted_results = []
-
-        for idx, vote in enumerate(votes):
-            # Replace the date_index with the corresponding date
-            formatted_results.append({
-                'date': dates[idx],
-                'yes_count': vote['yes_count'],
-                'no_count': vote['no_count'],
-                'maybe_count': vote['maybe_count'],
-                'question_count': vote['question_count']
-            })
-            
-        return formatted_results, messages
-    
     def get_user_votes(self, user:str = None):
-        messages = []
+        messages = self.new_messages()
         user_votes = {}
         
         html, _messages = self.__get_webpage(self.url, self.headers)
@@ -667,16 +649,16 @@ class Xoyondo:
                     user_votes[user_name][idx] = vote
                 
         if len(user_votes) < 1:
-            self.log_message(f"No user found for given name {user}", messages)
+            self.log_message(messages, logging.WARNING, "No user found for given name %s", user)
             
-        self.log_message(f"Found votes: {user_votes}", messages)
+        self.log_message(messages, logging.DEBUG, "Found votes: %s", user_votes)
         
         return user_votes, messages
         
         # if specific user or users or range of users given, give the vote of this user for all dates
     
     def get_date_for_index(self, index:str = None):
-        messages = []
+        messages = self.new_messages()
         dates_for_indices = []
         html, _messages = self.__get_webpage(self.url, self.headers)
         messages.extend(_messages)
@@ -713,7 +695,7 @@ class Xoyondo:
                     
                     if start <= end:
                         indices.extend(range(start, end + 1))
-                        self.log_message(f"Added indices from {start} to {end} to index list", messages)
+                        self.log_message(messages, logging.DEBUG, "Added indices from %s to %s to index list", start, end)
                     else:
                         raise ValueError(f"Start index must be less than or equal to end index. Given: {start}:{end}")
                     
@@ -725,7 +707,7 @@ class Xoyondo:
                         
                         if 0 <= idx < len(date_to_id):
                             indices.append(idx)
-                            self.log_message(f"B: Added index {idx} to index list", messages)
+                            self.log_message(messages, logging.DEBUG, "B: Added index %s to index list", idx)
                         else:
                             raise ValueError(f"Index {idx} out of range.")
                     
@@ -739,7 +721,7 @@ class Xoyondo:
         return dates_for_indices, messages
     
     def get_index_for_date(self, dates:str):
-        messages = []
+        messages = self.new_messages()
         indices_to_return = []
         
         html, _messages = self.__get_webpage(self.url, self.headers)
@@ -757,17 +739,17 @@ class Xoyondo:
                     messages.extend(_messages)
                     valid_dates = [date for date in dates if date in date_to_id]
                     indices_to_return.extend(list(date_to_id.keys()).index(date) for date in valid_dates)
-                    self.log_message(f"Added indices from {start} to {end} to index list", messages)
+                    self.log_message(messages, logging.DEBUG, "Added indices from %s to %s to index list", start, end)
                 else:
                     if part.strip() in date_to_id:
                         indices_to_return.append(list(date_to_id.keys()).index(part.strip()))
-                        self.log_message(f"C: Added index {part.strip()} to index list", messages)
+                        self.log_message(messages, logging.DEBUG, "C: Added index %s to index list", part.strip())
                     else:
                         raise ValueError(f"Invalid date: {part.strip()}")
         else:
             if dates.strip() in date_to_id:
                 indices_to_return.append(list(date_to_id.keys()).index(dates.strip()))
-                self.log_message(f"C: Added index {dates.strip()} to index list", messages)
+                self.log_message(messages, logging.DEBUG, "C: Added index %s to index list", dates.strip())
             else:
                 raise ValueError(f"Invalid date: {dates.strip()}")
         
@@ -1,21 +1,39 @@
 import datetime
+import asyncio
 import calendar
 import io
-import matplotlib.pyplot as plt
-from operator import add
+import logging
+import sqlite3
 from urllib.error import HTTPError
 
+import charts
+import local_poll
+from poll_backend import writes_poll
+import poll_stats
+import recommender
+from reset_scheduler import ResetPlan
+import tracing
 import xoyondo as xy
 
-class Xoyondo_Wrapper(xy.Xoyondo):
+class PollWrapper:
+    """The commands of the bot on top of a poll backend (see poll_backend.PollBackend).
+    
+    Only uses the methods of the backend interface, so it is combined with any backend, e.g. Xoyondo_Wrapper.
+    """
+    
+    _user_stats = None  # ((snapshot digest, weights), poll_stats.UserStats) of the last computation
+    _recommender = None
+    archive = None  # vote_archive.VoteArchive that keeps the votes of every reset poll
+    chart_renderer = None  # one of charts.RENDERERS, None selects charts.DEFAULT_RENDERER
+    chart_cache = None  # charts.ChartCache that keeps rendered charts, None renders every chart
+    
     def get_dates_for_week(self, week):
         # Assuming week is a string in the format 'YYYY/WW'
-        messages = []
+        messages = self.new_messages()
         date_range = ""
         
         if isinstance(week, str) and '/' in week:
             year, week_number = [x.strip() for x in week.split('/')]
-            print(year, week_number)
             try:
                 year = int(year)
             except ValueError:
@@ -25,11 +43,12 @@ class Xoyondo_Wrapper(xy.Xoyondo):
             except ValueError:
                 raise ValueError(f'Week number {week_number} is not a valid number.')
             try:
-                first_day_of_week = datetime.datetime.strptime(f'{year}-W{week_number} -1', "%Y-W%W -%w")
+                # ISO weeks, like get_current_week in bot.py
+                first_day_of_week = datetime.datetime.strptime(f'{year}-W{week_number}-1', "%G-W%V-%u")
                 last_day_of_week = first_day_of_week + datetime.timedelta(days=6)
                 date_range = f"{first_day_of_week.strftime('%Y/%m/%d')}:{last_day_of_week.strftime('%Y/%m/%d')}"
                 
-                self.log_message(f'{week} corresponds to {date_range}', messages)
+                self.log_message(messages, logging.DEBUG, "%s corresponds to %s", week, date_range)
                 
                 return date_range, messages
             except ValueError:
@@ -42,7 +61,7 @@ class Xoyondo_Wrapper(xy.Xoyondo):
 
     def get_dates_for_month(self, month):
         # Assuming month is a string in the format 'YYYY/MM'
-        messages = []
+        messages = self.new_messages()
         date_range = ""
         
         if isinstance(month, str) and '/' in month:
@@ -66,7 +85,7 @@ class Xoyondo_Wrapper(xy.Xoyondo):
                 last_day_of_month = f'{year}/{month_number}/{last_day}'
                 date_range = f"{first_day_of_month}:{last_day_of_month}"
                 
-                self.log_message(f'{month} corresponds to {date_range}', messages)
+                self.log_message(messages, logging.DEBUG, "%s corresponds to %s", month, date_range)
                 
                 return date_range, messages
             else:
@@ -75,58 +94,209 @@ class Xoyondo_Wrapper(xy.Xoyondo):
         else:
             raise ValueError(f'Invalid input: {month}')
     
-    def reset_poll(self, add_dates):
+    def plan_reset(self, add_dates, snapshot=None):
+        """Works out which dates a reset to `add_dates` adds and deletes, without changing the poll.
+
+        Args:
+            add_dates (str): The dates of the new poll, in the format accepted by `reset_poll`.
+            snapshot (PollSnapshot, optional): The poll the plan is based on. Defaults to a fresh snapshot.
+
+        Raises:
+            ValueError: If `add_dates` is not valid.
+
+        Returns:
+            tuple: The ResetPlan and the messages.
+        """
+        messages = self.new_messages()
+        if snapshot is None:
+            snapshot, _messages = self.get_snapshot(max_age=0)
+            messages.extend(_messages)
+        existing_dates = list(snapshot.dates)
+        
+        new_dates = []
+        add_dates = str(add_dates)
+        
+        if "," in add_dates or ":" in add_dates:
+            parts = add_dates.split(",")
+            for part in parts:
+                if ":" in part:
+                    start, end = [x.strip() for x in part.split(":")]
+                    dates, _messages = self.get_date_list(start, end)
+                    new_dates.extend(dates)
+                    messages.extend(_messages)
+                else:
+                    new_dates.append(part.strip())
+        else:
+            new_dates.append(add_dates.strip())
+        
+        to_add = [date for date in new_dates if date not in existing_dates]
+        to_delete = [date for date in existing_dates if date not in new_dates]
+        plan = ResetPlan(add_dates, to_add, to_delete, len(snapshot.users), snapshot.dates_digest().hex())
+        self.log_message(messages, logging.DEBUG, "Planned reset: %s", plan)
         
-        messages = []
+        return plan, messages
+    
+    @tracing.traced()
+    @writes_poll
+    def reset_poll(self, add_dates, progress=None, plan=None, window=None):
+        """Resets the poll to new dates: adds the missing dates, deletes the others and deletes all users.
+
+        Args:
+            add_dates (str): The dates of the new poll (dates and ranges separated by commas).
+            progress (callable, optional): Called as progress(operation, done, total) for every request. Defaults to None.
+            plan (ResetPlan, optional): A plan from `plan_reset`. It is used if the dates of the poll did not change since it was made. Defaults to None.
+            window (float, optional): Seconds the requests are spread over to stay below rate limits. Defaults to None, which sends them as fast as the concurrency limit allows.
+
+        Returns:
+            Messages: The messages of the reset.
+        """
+        messages = self.new_messages()
         
         try:
-            # Get existing dates
-            existing_dates, _messages = self.get_dates()
+            # Read the poll once: archive the votes before they are deleted and reuse the existing dates
+            snapshot, _messages = self.get_snapshot(max_age=0)
             messages.extend(_messages)
             
-            new_dates = []
-            add_dates = str(add_dates)
+            if self.archive is not None and snapshot.users:
+                snapshot_id = self.archive.archive(snapshot, self.id)
+                self.log_message(messages, logging.INFO, "Archived votes of %s users as snapshot %s", len(snapshot.users), snapshot_id)
             
-            if "," in add_dates or ":" in add_dates:
-                parts = add_dates.split(",")
-                for part in parts:
-                    if ":" in part:
-                        start, end = [x.strip() for x in part.split(":")]
-                        dates, _messages = self.get_date_list(start, end)
-                        new_dates.extend(dates)
-                        messages.extend(_messages)
-                    else:
-                        new_dates.append(part.strip())
+            if plan is not None and plan.add_dates == str(add_dates) and plan.digest == snapshot.dates_digest().hex():
+                self.log_message(messages, logging.DEBUG, "Using the precomputed plan")
             else:
-                new_dates.append(add_dates.strip())
-
-            # Add new dates
-            to_add = []
-            
-            for date in new_dates:
-                if date not in existing_dates:
-                    to_add.append(date)
-            if to_add:
-                _messages = self.add_dates(",".join(to_add))
+                plan, _messages = self.plan_reset(add_dates, snapshot)
                 messages.extend(_messages)
+            
+            pacing = window / plan.requests if window and plan.requests else 0.0
+            with self.concurrency.paced(pacing):
+                # Add new dates
+                if plan.to_add:
+                    _messages = self.add_dates(",".join(plan.to_add), progress)
+                    messages.extend(_messages)
 
-            # Delete all remaining existing dates
-            to_delete = []
-            for date in existing_dates:
-                if date not in new_dates:
-                    to_delete.append(date)
-            if to_delete:
-                _messages = self.delete_dates(",".join(to_delete))
+                # Delete all remaining existing dates
+                if plan.to_delete:
+                    _messages = self.delete_dates(",".join(plan.to_delete), progress)
+                    messages.extend(_messages)
+                            
+                # Delete existing users
+                _messages = self.delete_users(progress=progress)
                 messages.extend(_messages)
-                        
-            # Delete existing users
-            _messages = self.delete_users()
-            messages.extend(_messages)
-        except (ValueError, HTTPError) as e:
-            messages.append(str(e))
+        except (ValueError, HTTPError, sqlite3.Error) as e:
+            messages.append(str(e), logging.WARNING)
 
         return messages
     
+    @tracing.traced()
+    def get_user_stats(self, weights=None, snapshot=None):
+        """Computes per-user vote rates, the best dates and a set of dates covering every user.
+        
+        The statistics are computed once per poll snapshot and reused as long as the snapshot is cached.
+
+        Args:
+            weights (dict, optional): The weight of each vote for the date score. Defaults to poll_stats.DEFAULT_WEIGHTS.
+            snapshot (PollSnapshot, optional): The poll the statistics are computed for. Defaults to the cached or a fresh snapshot.
+
+        Returns:
+            tuple: The poll_stats.UserStats and the messages.
+        """
+        if snapshot is None:
+            snapshot, messages = self.get_snapshot()
+        else:
+            messages = self.new_messages()
+        
+        # Keyed by content, so the statistics do not keep a dropped snapshot alive
+        key = (snapshot.digest(), tuple(sorted((weights or {}).items())))
+        cached = self._user_stats
+        if cached is not None and cached[0] == key:
+            self.log_message(messages, logging.DEBUG, "Using cached user statistics")
+            return cached[1], messages
+        
+        stats = poll_stats.compute_user_stats(snapshot, weights)
+        self._user_stats = (key, stats)
+        self.log_message(messages, logging.DEBUG, "Computed user statistics for %s users", len(stats.rates))
+        
+        return stats, messages
+    
+    @tracing.traced()
+    def create_history_plot(self, start=None, end=None):
+        """Creates a chart of the attendance per calendar week from the vote archive. No request to Xoyondo is needed.
+
+        Args:
+            start (str, optional): The first date in the format '%Y/%m/%d'. Defaults to None.
+            end (str, optional): The last date in the format '%Y/%m/%d'. Defaults to None.
+
+        Raises:
+            ValueError: If there is no archive or no archived votes in the given range.
+
+        Returns:
+            tuple: The chart as a BytesIO object and the messages.
+        """
+        from matplotlib.figure import Figure  # imported on first use, as matplotlib is slow to import
+        
+        messages = self.new_messages()
+        
+        if self.archive is None:
+            raise ValueError('No vote archive configured.')
+        weeks = self.archive.weekly_attendance(start, end)
+        if not weeks:
+            raise ValueError('No archived votes found.')
+        self.log_message(messages, logging.DEBUG, "Found %s archived weeks", len(weeks))
+        
+        labels = [week for week, _, _ in weeks]
+        yes_count = [counts['yes'] for _, _, counts in weeks]
+        maybe_count = [counts['maybe'] for _, _, counts in weeks]
+        
+        fig = Figure(figsize=(10, 5))
+        ax = fig.subplots()
+        ax.bar(labels, yes_count, color='g', label='Ja')
+        ax.bar(labels, maybe_count, color='y', bottom=yes_count, label='Vielleicht')
+        ax.set_ylabel("Stimmen (bester Termin der Woche)")
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.legend()
+        fig.tight_layout()
+        
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        buf.seek(0)
+        
+        return buf, messages
+    
+    @tracing.traced()
+    def get_best_dates(self, n=3, quorum=0, weights=None, prefer='earliest', snapshot=None):
+        """Recommends the best dates of the poll.
+        
+        The recommender is kept between calls, so a poll that only changed in a few votes is not scored again from scratch.
+
+        Args:
+            n (int, optional): The number of dates. Defaults to 3.
+            quorum (int, optional): The number of 'yes' votes a date needs. Defaults to 0.
+            weights (dict, optional): The weight of each vote. Defaults to poll_stats.DEFAULT_WEIGHTS.
+            prefer (str, optional): 'earliest' or 'latest', decides between otherwise tied dates. Defaults to 'earliest'.
+            snapshot (PollSnapshot, optional): The poll the dates are recommended from. Defaults to the cached or a fresh snapshot.
+
+        Returns:
+            tuple: A list of up to `n` recommender.Recommendation objects and the messages.
+        """
+        if snapshot is None:
+            snapshot, messages = self.get_snapshot()
+        else:
+            messages = self.new_messages()
+        
+        settings = (dict(poll_stats.DEFAULT_WEIGHTS, **(weights or {})), quorum, prefer)
+        # Commands run this concurrently; keep the recommender they use even if another one replaces it
+        engine = self._recommender
+        if engine is None or (engine.weights, engine.quorum, engine.prefer) != settings:
+            engine = self._recommender = recommender.DateRecommender(weights, quorum, prefer)
+        
+        incremental, best = engine.recommend(snapshot, n)
+        if incremental:
+            self.log_message(messages, logging.DEBUG, "Updated date scores incrementally")
+        else:
+            self.log_message(messages, logging.DEBUG, "Scored all %s dates", len(snapshot.dates))
+        
+        return best, messages
+    
     def __calculate_combination_of_votes(self, votes_for_specific_date, *args):
         count = 0
         for arg in args:
@@ -134,47 +304,140 @@ class Xoyondo_Wrapper(xy.Xoyondo):
         return count
             
 
-    def create_plot(self, dates=None):
-        messages = []
-        
-        votes, _messages = self.get_votes_by_date(dates)
+    def __chart_chunks(self, dates, messages, snapshot=None):
+        votes, _messages = self.get_votes_by_date(dates, snapshot)
         messages.extend(_messages)
 
-        # Function to split the data into chunks of 7
-        def chunk_data(data, size):
-            for i in range(0, len(data), size):
-                yield data[i:i + size]
-
         # Splitting the votes data into chunks of 7
-        vote_chunks = list(chunk_data(votes, 7))
+        return [votes[i:i + 7] for i in range(0, len(votes), 7)]
+    
+    @tracing.traced()
+    def create_plot(self, dates=None, renderer=None):
+        plots, messages = self.iter_plots(dates, renderer)
+        plots = list(plots)
+        self.log_message(messages, logging.DEBUG, "Rendered %s charts with %s", len(plots), renderer or self.chart_renderer or charts.DEFAULT_RENDERER)
 
-        plots = []
-        for chunk in vote_chunks:
-            labels = [vote['date'] for vote in chunk]
-            yes_count = [int(vote['yes_count']) for vote in chunk]
-            no_count = [int(vote['no_count']) for vote in chunk]
-            maybe_count = [int(vote['maybe_count']) for vote in chunk]
-            question_count = [int(vote['question_count']) for vote in chunk]
+        return plots, messages
+    
+    def iter_plots(self, dates=None, renderer=None):
+        """Reads the votes and returns a generator that renders one chart per week chunk when it is asked for the next one.
 
-            _, ax = plt.subplots(figsize=(10, 5))
+        Args:
+            dates (str, optional): The dates to be shown. Defaults to all dates of the poll.
+            renderer (str, optional): One of charts.RENDERERS. Defaults to `chart_renderer`.
 
-            colors = {'Ja': 'g', 'Vielleicht': 'y', 'Nein': 'r', 'Keine Angabe': 'grey'}
+        Returns:
+            tuple: A generator of BytesIO objects and the messages.
+        """
+        messages = self.new_messages()
+        renderer = renderer or self.chart_renderer
+        vote_chunks = self.__chart_chunks(dates, messages)
+        
+        return (charts.render_chart(chunk, renderer, self.chart_cache) for chunk in vote_chunks), messages
+    
+    async def stream_plots(self, dates=None, renderer=None):
+        """Reads the votes without blocking the event loop and returns an async iterator that yields every chart as soon as it is rendered.
+        
+        The next chart is already rendered while the previous one is consumed, so at most two charts are held at once.
 
-            ax.bar(labels, question_count, color=colors['Keine Angabe'], label='Keine Angabe')
-            ax.bar(labels, no_count, color=colors['Nein'], bottom=question_count, label='Nein')
-            ax.bar(labels, maybe_count, color=colors['Vielleicht'], bottom=list(map(add, question_count, no_count)), label='Vielleicht')
-            ax.bar(labels, yes_count, color=colors['Ja'], bottom=list(map(add, question_count, list(map(add, no_count, maybe_count)))), label='Ja')
+        Args:
+            dates (str, optional): The dates to be shown. Defaults to all dates of the poll.
+            renderer (str, optional): One of charts.RENDERERS. Defaults to `chart_renderer`.
 
-            ax.set_ylabel("Stimmen")
-            ax.legend()
+        Returns:
+            tuple: An async iterator of BytesIO objects and the messages.
+        """
+        messages = self.new_messages()
+        renderer = renderer or self.chart_renderer
+        with tracing.span('PollWrapper.stream_plots'):
+            # Concurrent chart requests share one read of the poll
+            snapshot, _messages = await self.get_snapshot_async()
+            messages.extend(_messages)
+            vote_chunks = await asyncio.to_thread(self.__chart_chunks, dates, messages, snapshot)
+        
+        async def plots():
+            pending = None
+            try:
+                for chunk in vote_chunks:
+                    task = asyncio.ensure_future(asyncio.to_thread(charts.render_chart, chunk, renderer, self.chart_cache))
+                    if pending is not None:
+                        yield await pending
+                    pending = task
+                if pending is not None:
+                    yield await pending
+                    pending = None
+            finally:
+                if pending is not None:
+                    pending.cancel()
+        
+        return plots(), messages
+            
+    @tracing.traced(background=True)
+    def prefetch(self, renderer=None):
+        """Reads the poll and renders its charts into `chart_cache`, so the next charts are served from the caches.
 
-            # Save the chart as a BytesIO object and add it to the plots list
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png')
-            buf.seek(0)
-            plots.append(buf)
+        Args:
+            renderer (str, optional): One of charts.RENDERERS. Defaults to `chart_renderer`.
 
-            plt.close()  # Close the plot to free up memory
+        Returns:
+            tuple: The number of charts rendered (or found in the cache) and the messages.
+        """
+        # Not needed right away, so its requests must not raise the concurrency limit
+        with self.concurrency.background():
+            snapshot, messages = self.get_snapshot(max_age=0)
+            if self.chart_cache is None:
+                return 0, messages
 
-        return plots, messages
-        
\ No newline at end of file
+            plots, _messages = self.iter_plots(renderer=renderer)
+            messages.extend(_messages)
+            count = sum(1 for _ in plots)
+        self.log_message(messages, logging.DEBUG, "Prefetched %s dates and %s charts", len(snapshot.dates), count)
+
+        return count, messages
+
+    def cache_usage(self):
+        """Returns the memory held by the caches of the wrapper.
+
+        Returns:
+            dict: Bytes of the cached snapshot and its budget, and number, bytes and budget of the cached charts.
+        """
+        snapshot = self._snapshot
+        cache = self.chart_cache
+        return {
+            'snapshot': snapshot.nbytes() if snapshot is not None else 0,
+            'snapshot_budget': self.snapshot_budget,
+            'charts': len(cache) if cache is not None else 0,
+            'charts_bytes': cache.nbytes if cache is not None else 0,
+            'charts_budget': cache.max_bytes if cache is not None else 0,
+        }
+    
+    def clear_caches(self):
+        """Drops the cached snapshot, charts and statistics."""
+        self.invalidate_snapshot()
+        if self.chart_cache is not None:
+            self.chart_cache.clear()
+        self._user_stats = None
+        self._recommender = None
+
+class Xoyondo_Wrapper(PollWrapper, xy.Xoyondo):
+    pass
+
+class LocalPoll_Wrapper(PollWrapper, local_poll.LocalPoll):
+    pass
+
+def open_poll(url, **kwargs):
+    """Opens the poll at `url` with the backend that serves it.
+
+    Args:
+        url (str): A Xoyondo URL, or 'sqlite:///<path>#<poll>' for a local poll.
+        **kwargs: Passed on to the backend, e.g. print_messages.
+
+    Raises:
+        ValueError: If `url` is not valid for its backend.
+
+    Returns:
+        PollWrapper: The wrapped poll.
+    """
+    if url.startswith('sqlite:'):
+        return LocalPoll_Wrapper(url, **kwargs)
+    return Xoyondo_Wrapper(url, **kwargs)